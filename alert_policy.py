@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, or_, select, update
+
+from models import AlertState
+from planning import SEVERITY_LEVELS
+
+# Alert channel -> cooldown before the same level may be sent again
+COOLDOWNS = {
+    'Citizen': timedelta(hours=12),
+    'Hospital': timedelta(hours=6),
+}
+
+# Levels below this never alert; risk categories and spike severities share the scale
+MIN_LEVEL = 'Moderate'
+
+LEVEL_RANKS = {level: rank for rank, level in enumerate(SEVERITY_LEVELS)}
+LEVEL_RANKS['Critical'] = len(SEVERITY_LEVELS)
+
+CLAIM_CHUNK = 1000
+
+SEND_ACTIONS = ('new', 'escalate', 'repeat')
+
+
+def level_rank(level):
+    """Rank of a level label; an unknown label raises instead of ranking lowest"""
+    try:
+        return LEVEL_RANKS[level]
+    except KeyError:
+        raise ValueError(f"Unknown alert level: {level!r}") from None
+
+
+def _decide(state, rank, now, cooldown, min_rank):
+    """(action, send) for one city/channel given its stored state"""
+    if state is None:
+        return ('new', True) if rank >= min_rank else ('below_threshold', False)
+    previous_rank, last_sent_at = state[1], state[2]
+    if rank > previous_rank:
+        return ('escalate', True) if rank >= min_rank else ('raised', False)
+    if rank < previous_rank:
+        return 'deescalate', False
+    if rank < min_rank:
+        return 'below_threshold', False
+    if last_sent_at is None or now - last_sent_at >= cooldown:
+        return 'repeat', True
+    return 'suppressed', False
+
+
+class AlertPolicy:
+    """Decides which alerts to send for a batch of cities in one pass.
+
+    A city/channel alerts the first time it reaches MIN_LEVEL, immediately when
+    its level rises, and otherwise at most once per cooldown. Levels that fall
+    are recorded without sending, so the next rise escalates again.
+    """
+
+    def __init__(self, cooldowns=None, min_level=MIN_LEVEL):
+        self.cooldowns = dict(COOLDOWNS, **(cooldowns or {}))
+        self.min_rank = level_rank(min_level)
+
+    def _states(self, db, alert_types, cities=None):
+        query = select(AlertState.alert_type, AlertState.city, AlertState.level, AlertState.level_rank,
+                       AlertState.last_sent_at).where(AlertState.alert_type.in_(alert_types))
+        if cities is not None and len(cities) <= CLAIM_CHUNK:
+            query = query.where(AlertState.city.in_(cities))
+        return {
+            (row.alert_type, row.city): (row.level, row.level_rank, row.last_sent_at)
+            for row in db.execute(query)
+        }
+
+    def evaluate(self, db, signals, now=None, min_rank=None):
+        """signals: iterable of (city, alert_type, level[, rank]). Returns one decision dict each.
+
+        rank defaults to level_rank(level). min_rank overrides the MIN_LEVEL
+        threshold, e.g. 0 for a manual send; cooldowns still apply.
+        """
+        now = now or datetime.utcnow()
+        min_rank = self.min_rank if min_rank is None else min_rank
+        signals = list(signals)
+        if not signals:
+            return []
+        alert_types = {signal[1] for signal in signals}
+        cities = {signal[0] for signal in signals}
+        states = self._states(db, alert_types, cities)
+
+        decisions = []
+        for signal in signals:
+            city, alert_type, level = signal[:3]
+            rank = signal[3] if len(signal) > 3 else level_rank(level)
+            state = states.get((alert_type, city))
+            cooldown = self.cooldowns[alert_type]
+            action, send = _decide(state, rank, now, cooldown, min_rank)
+            decisions.append({
+                'city': city,
+                'alert_type': alert_type,
+                'level': level,
+                'level_rank': rank,
+                'previous_level': state[0] if state else None,
+                'previous_rank': state[1] if state else None,
+                'last_sent_at': state[2] if state else None,
+                'next_allowed_at': state[2] + cooldown if state and state[2] and action == 'suppressed' else None,
+                'action': action,
+                'send': send,
+            })
+        return decisions
+
+    def _insert(self, db):
+        if db.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert
+
+    def claim(self, db, decisions, now=None):
+        """Atomically record the decisions that send; returns those this caller won.
+
+        The upsert only overwrites a state whose level is lower or whose cooldown
+        has passed, so concurrent sessions sending the same alert see one winner.
+        Falling levels are written without touching last_sent_at, and only over
+        the rank they were decided against, so a concurrent claim is not undone.
+        """
+        now = now or datetime.utcnow()
+        insert = self._insert(db)
+        claimed = set()
+        sends = [d for d in decisions if d['send']]
+        for alert_type in {d['alert_type'] for d in sends}:
+            cutoff = now - self.cooldowns[alert_type]
+            rows = [{
+                'alert_type': alert_type,
+                'city': d['city'],
+                'level': d['level'],
+                'level_rank': d['level_rank'],
+                'last_sent_at': now,
+                'updated_at': now,
+            } for d in sends if d['alert_type'] == alert_type]
+            for start in range(0, len(rows), CLAIM_CHUNK):
+                statement = insert(AlertState).values(rows[start:start + CLAIM_CHUNK])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[AlertState.alert_type, AlertState.city],
+                    set_={
+                        'level': statement.excluded.level,
+                        'level_rank': statement.excluded.level_rank,
+                        'last_sent_at': statement.excluded.last_sent_at,
+                        'updated_at': statement.excluded.updated_at,
+                    },
+                    where=or_(
+                        AlertState.level_rank < statement.excluded.level_rank,
+                        AlertState.last_sent_at.is_(None),
+                        AlertState.last_sent_at <= cutoff
+                    )
+                ).returning(AlertState.city)
+                claimed.update((alert_type, city) for city in db.execute(statement).scalars())
+
+        lowered = [{'t': d['alert_type'], 'c': d['city'], 'l': d['level'], 'r': d['level_rank'], 'p': d['previous_rank']}
+                   for d in decisions if d['action'] in ('deescalate', 'raised')]
+        if lowered:
+            db.connection().execute(
+                update(AlertState)
+                .where(AlertState.alert_type == bindparam('t'), AlertState.city == bindparam('c'),
+                       AlertState.level_rank == bindparam('p'))
+                .values(level=bindparam('l'), level_rank=bindparam('r'), updated_at=now),
+                lowered
+            )
+        return [d for d in sends if (d['alert_type'], d['city']) in claimed]
+
+
+def city_signals(city, risk_info, spike_info):
+    """Policy inputs for one city from the risk and spike pipeline outputs"""
+    signals = []
+    if risk_info:
+        signals.append((city, 'Citizen', risk_info['category']))
+    if spike_info:
+        # Ranked on the spike agent's numeric level, which counts up from 0 like SEVERITY_LEVELS
+        signals.append((city, 'Hospital', spike_info['overall_severity'], int(spike_info['overall_level'])))
+    return signals
@@ -1,26 +1,15 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
+import streamlit.components.v1 as components
 from datetime import datetime, timedelta
-import folium
-from streamlit_folium import st_folium
 
-from agents.data_agent import DataAgent
-from agents.forecasting_agent import ForecastingAgent
-from agents.spike_detection_agent import SpikeDetectionAgent
-from agents.explanation_agent import ExplanationAgent
-from agents.planner_agent import PlannerAgent
-from agents.health_risk_index import HealthRiskIndex
+from lazy_imports import lazy_import
 
-from database import get_db, init_db
-from models import AcceptedPlan, RejectedPlan, AlertSent
-
-try:
-    init_db()
-except Exception as e:
-    st.error(f"Database initialization error: {e}")
+# Heavy modules are imported on first use so the page header paints before
+# pandas/plotly/folium and the ML stack finish loading.
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+go = lazy_import('plotly.graph_objects')
+px = lazy_import('plotly.express')
 
 st.set_page_config(
     page_title="Health Risk Prediction System",
@@ -30,55 +19,231 @@ st.set_page_config(
 )
 
 @st.cache_resource
+def _init_database():
+    from database import get_engine, init_db
+    import timebuckets
+    init_db()
+    if timebuckets.PARTITIONING_ENABLED:
+        timebuckets.PartitionMaintainer(get_engine('migrate')).start()
+
+try:
+    _init_database()
+except Exception as e:
+    st.error(f"Database initialization error: {e}")
+
+from database import get_db, get_db_session, get_read_db
+from models import AlertSent
+import heatmap
+from spatial import CityIndex
+from planning import generate_batch_plans
+from history import history_page, stream_csv
+from write_behind import WriteBehindQueue
+from reports import ReportWorker, available_formats
+from assistant import generate_health_response
+from chat_store import ChatHistory
+from pipeline import RecomputePipeline, ChangeWatcher, PollingChangeSource
+from result_cache import result_cache_from_env
+from alert_policy import AlertPolicy, city_signals
+from auth import LastLoginRecorder, UserDirectory, authenticate, issue_token, verify_token
+from regions import AggregateRefresher, reconcile_forecasts, refresh_aggregates, region_base_forecasts, region_summary, sync_hierarchy
+
+@st.cache_resource
+def get_data_agent():
+    from agents.data_agent import DataAgent
+    return DataAgent(use_local_data=True)
+
+@st.cache_resource
+def get_forecasting_agent():
+    from agents.forecasting_agent import ForecastingAgent
+    return ForecastingAgent()
+
+@st.cache_resource
+def get_spike_agent():
+    from agents.spike_detection_agent import SpikeDetectionAgent
+    return SpikeDetectionAgent()
+
+@st.cache_resource
+def get_explanation_agent():
+    from agents.explanation_agent import ExplanationAgent
+    return ExplanationAgent()
+
+@st.cache_resource
+def get_planner_agent():
+    from agents.planner_agent import PlannerAgent
+    return PlannerAgent()
+
+@st.cache_resource
+def get_health_index():
+    from agents.health_risk_index import HealthRiskIndex
+    return HealthRiskIndex()
+
+class _LazyAgent:
+    """Resolve a cached agent factory the first time the agent is used"""
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, attr):
+        return getattr(self._factory(), attr)
+
 def initialize_agents():
-    data_agent = DataAgent(use_local_data=True)
-    forecasting_agent = ForecastingAgent()
-    spike_agent = SpikeDetectionAgent()
-    explanation_agent = ExplanationAgent()
-    planner_agent = PlannerAgent()
-    health_index = HealthRiskIndex()
-    return data_agent, forecasting_agent, spike_agent, explanation_agent, planner_agent, health_index
-
-def generate_health_response(user_input, current_data):
-    """Generate healthcare guidance based on user input"""
-    user_input_lower = user_input.lower()
-    
-    # Symptom-based responses
-    symptoms_responses = {
-        "fever": "Fever can indicate infection. Monitor your temperature regularly. Stay hydrated and rest. If fever persists >3 days or >101°F, consult a doctor. Current AQI: " + str(int(current_data.get('aqi', 0))),
-        "headache": "Headaches can be triggered by stress, dehydration, or air quality. Drink water, rest in a dark room, and avoid screens. High AQI (>100) can worsen symptoms.",
-        "cough": "Cough might indicate respiratory issues. Avoid air pollution, use masks outdoors, stay hydrated. If persistent >2 weeks, seek medical advice.",
-        "cold": "Common cold typically improves in 7-10 days. Rest, hydrate, use saline drops, and avoid spreading to others. Boost immunity with vitamin C.",
-        "allergy": "Allergies worsen with high air pollution. Stay indoors on bad air days, use HEPA filters, and take antihistamines as needed.",
-        "covid": "COVID symptoms vary. Get tested if symptomatic. Stay isolated for 5-10 days. Seek emergency care if shortness of breath occurs.",
-        "flu": "Flu is serious - get vaccinated annually. Rest, hydrate, and antiviral drugs help. Avoid others for 5 days.",
-        "pollution": f"Current AQI is {int(current_data.get('aqi', 0))}. Wear N95 masks outdoors, keep windows closed, use air purifiers, and reduce outdoor activities.",
-        "aqi": f"Current AQI in your area: {int(current_data.get('aqi', 0))}. Healthy level is <50. Limit outdoor activities if AQI >100.",
-    }
-    
-    for symptom, response in symptoms_responses.items():
-        if symptom in user_input_lower:
-            return response
-    
-    # General health questions
-    general_responses = {
-        "sleep": "Get 7-8 hours of quality sleep daily. Maintain consistent sleep schedule, avoid screens 1 hour before bed.",
-        "exercise": "Aim for 150 mins moderate activity weekly. Avoid outdoor exercise on high pollution days. Indoor workouts are safer alternatives.",
-        "diet": "Eat balanced meals: fruits, vegetables, lean proteins. Limit processed foods. Stay hydrated with 2-3 liters water daily.",
-        "doctor": "See a doctor for: persistent symptoms >2 weeks, high fever, severe pain, breathing issues, or chronic conditions.",
-        "vaccine": "Vaccinations protect you and community. Get annual flu shots and recommended vaccines. Consult your doctor for personalized advice.",
-        "prevent": "Prevention tips: wash hands regularly, wear masks in crowds, avoid touching face, maintain distance from sick people, boost immunity.",
-    }
-    
-    for keyword, response in general_responses.items():
-        if keyword in user_input_lower:
-            return response
-    
-    # Default response
-    return "🤔 I'm here to help with health-related questions! Ask about symptoms, prevention, vaccines, air quality, or general wellness. What's your concern?"
+    return (
+        get_data_agent(),
+        _LazyAgent(get_forecasting_agent),
+        _LazyAgent(get_spike_agent),
+        _LazyAgent(get_explanation_agent),
+        _LazyAgent(get_planner_agent),
+        _LazyAgent(get_health_index),
+    )
 
 data_agent, forecasting_agent, spike_agent, explanation_agent, planner_agent, health_index = initialize_agents()
 
+@st.cache_resource
+def get_write_queue():
+    return WriteBehindQueue().start()
+
+write_queue = get_write_queue()
+
+@st.cache_resource
+def get_snapshot_history():
+    from timeseries import SnapshotHistory
+    return SnapshotHistory(lambda: get_db_session('history'))
+
+@st.cache_resource
+def get_pipeline():
+    from ensemble import EnsembleForecaster
+    pipeline = RecomputePipeline(
+        data_agent, forecasting_agent, spike_agent, planner_agent, health_index,
+        cache=result_cache_from_env(), ensemble_forecaster=EnsembleForecaster(),
+        timeseries=_LazyAgent(get_snapshot_history)
+    )
+    refresher = AggregateRefresher(lambda: get_db_session('background')).start()
+    ChangeWatcher(
+        pipeline, PollingChangeSource(lambda: get_db_session('background')), listeners=(refresher.mark_recent,)
+    ).start()
+    return pipeline
+
+pipeline = get_pipeline()
+
+@st.cache_resource
+def get_user_directory():
+    return UserDirectory()
+
+@st.cache_resource
+def get_login_recorder():
+    return LastLoginRecorder(write_queue)
+
+def current_user():
+    """Profile for this session's signed token; the token check itself never hits the database"""
+    claims = verify_token(st.session_state.get('auth_token'))
+    if claims is None:
+        return None
+    profile = get_user_directory().get(claims['uid'])
+    if profile is None or not profile['is_active']:
+        st.session_state.pop('auth_token', None)
+        return None
+    get_login_recorder().touch(claims['uid'])
+    return profile
+
+@st.cache_resource
+def get_alert_policy():
+    return AlertPolicy()
+
+def send_policy_alert(alert_type, city, level, message, recipients_count, rank=None):
+    """Send through the alert policy; returns the decision, sent only if this session claimed it.
+
+    A manual send skips the minimum level but still honours cooldowns and escalation.
+    """
+    policy = get_alert_policy()
+    signal = (city, alert_type, level) if rank is None else (city, alert_type, level, rank)
+    with get_db() as db:
+        decisions = policy.evaluate(db, [signal], min_rank=0)
+        claimed = policy.claim(db, decisions)
+    if claimed:
+        write_queue.enqueue_alert(
+            alert_type=alert_type,
+            city=city,
+            severity=level,
+            message=message,
+            recipients_count=recipients_count,
+            delivery_status='simulated'
+        )
+    return dict(decisions[0], send=bool(claimed))
+
+def show_suppressed(decision):
+    if decision['action'] == 'suppressed':
+        st.info(
+            f"Duplicate suppressed: {decision['alert_type']} alert at {decision['level']} already sent "
+            f"{decision['last_sent_at']:%Y-%m-%d %H:%M} UTC; next allowed after {decision['next_allowed_at']:%H:%M} UTC"
+        )
+    elif decision['action'] in ('below_threshold', 'deescalate', 'raised'):
+        st.info(f"No alert needed: level {decision['level']} is below the alert threshold or lower than the last alert")
+    else:
+        st.info("Another session just sent this alert")
+
+@st.cache_resource
+def get_report_worker():
+    return ReportWorker(pipeline)
+
+@st.fragment(run_every=1.0)
+def report_progress(report_job):
+    """Re-runs only itself while the job runs, then the whole page once it is done"""
+    if report_job.finished.is_set():
+        st.rerun()
+    st.progress(report_job.progress, text=f"Generating report ({report_job.done}/{report_job.total} cities)")
+
+def paginated_history(source, limit):
+    """Render newer/older buttons for a keyset-paginated history; returns (rows, offset)"""
+    cursors_key = f"{source}_history_cursors"
+    if cursors_key not in st.session_state:
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state[cursors_key]
+    
+    with get_read_db('history') as db:
+        rows, next_cursor = history_page(db, source, limit=limit, cursor=cursors[-1])
+    
+    col_newer, col_older = st.columns(2)
+    if len(cursors) > 1 and col_newer.button("⬅️ Newer", key=f"{source}_newer"):
+        cursors.pop()
+        st.rerun()
+    if next_cursor is not None and col_older.button("Older ➡️", key=f"{source}_older"):
+        cursors.append(next_cursor)
+        st.rerun()
+    return rows, (len(cursors) - 1) * limit
+
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
+
+def export_history_csv(source, **filters):
+    """Stream a history export to a temp file on disk; returns its path, or None past EXPORT_MAX_BYTES"""
+    import os
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    size = 0
+    with os.fdopen(fd, 'wb') as export_file, get_read_db('history') as db:
+        for chunk in stream_csv(db, source, **filters):
+            data = chunk.encode('utf-8')
+            size += len(data)
+            if size > EXPORT_MAX_BYTES:
+                break
+            export_file.write(data)
+    if size > EXPORT_MAX_BYTES:
+        os.remove(path)
+        return None
+    return path
+
+@st.cache_resource
+def get_city_index(city_names):
+    records = []
+    for city in city_names:
+        current = data_agent.get_current_data(city)
+        if current:
+            records.append({
+                'city': city,
+                'latitude': current.get('latitude'),
+                'longitude': current.get('longitude')
+            })
+    return CityIndex.from_records(records)
+
 st.markdown("""
     <style>
     * {
@@ -282,10 +447,33 @@ with st.sidebar:
     st.image("https://img.icons8.com/clouds/200/hospital.png", width=150)
     st.header("⚙️ Control Panel")
     
+    user = current_user()
+    with st.expander(f"🔐 {user['full_name'] or user['username']}" if user else "🔐 Sign in"):
+        if user:
+            st.caption(f"Role: {user['role']}" + (f" · {user['hospital_name']}" if user['hospital_name'] else ""))
+            if st.button("Sign out"):
+                st.session_state.pop('auth_token', None)
+                st.rerun()
+        else:
+            with st.form("login_form"):
+                username = st.text_input("Username")
+                password = st.text_input("Password", type="password")
+                if st.form_submit_button("Sign in"):
+                    with get_db() as db:
+                        profile = authenticate(db, username, password)
+                    if profile:
+                        get_user_directory().put(profile)
+                        get_login_recorder().touch(profile['id'], force=True)
+                        st.session_state.auth_token = issue_token(profile)
+                        st.rerun()
+                    else:
+                        st.error("Invalid username or password")
+    user_id = user['id'] if user else None
+    
     selected_city = st.selectbox(
         "🏙️ Select City",
         cities,
-        index=0
+        index=list(cities).index(user['city']) if user and user['city'] in cities else 0
     )
     
     st.divider()
@@ -297,29 +485,59 @@ with st.sidebar:
         value=7
     )
     
+    forecast_mode = 'ensemble' if st.toggle(
+        "🧪 Ensemble forecast",
+        help="Combine trend, Holt, Random Forest and Prophet models with p10-p90 bands"
+    ) else 'single'
+    
     st.divider()
     
     st.subheader("📊 Quick Stats")
-    current_data = data_agent.get_current_data(selected_city)
+    current_data = pipeline.get('current', selected_city)
     if current_data:
         st.metric("Current AQI", f"{current_data.get('aqi', 0):.0f}")
         st.metric("Active Cases", f"{current_data.get('total_cases', 0):.0f}")
         st.metric("Temperature", f"{current_data.get('temperature', 0):.1f}°C")
+    
+    with st.expander("🗄️ Write Queue"):
+        queue_metrics = write_queue.metrics()
+        st.metric("Pending Writes", queue_metrics['pending'])
+        st.caption(
+            f"Flushed {queue_metrics['flushed']} records in {queue_metrics['batches']} batches · "
+            f"last flush {queue_metrics['last_flush_seconds'] * 1000:.0f} ms"
+        )
+        if queue_metrics['dead_lettered']:
+            st.warning(f"{queue_metrics['dead_lettered']} records could not be saved (see {write_queue.dead_letter_path})")
+        if queue_metrics['last_error']:
+            st.error(f"Last flush failed: {queue_metrics['last_error']}")
+
+    cache_stats = getattr(pipeline.cache, 'stats', None)
+    if cache_stats is not None:
+        with st.expander("🧮 Result Cache"):
+            st.caption(
+                f"Shared hits {cache_stats['shared_hits']} · misses {cache_stats['shared_misses']} · "
+                f"lock waits {cache_stats['lock_waits']} · errors {cache_stats['shared_errors']}"
+            )
+
+TABS = ["👥 Citizen Dashboard", "🏥 Hospital Dashboard", "🗺️ City Heatmap", "📱 Alerts & Notifications", "🤖 Health Assistant"]
 
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["👥 Citizen Dashboard", "🏥 Hospital Dashboard", "🗺️ City Heatmap", "📱 Alerts & Notifications", "🤖 Health Assistant"])
+# st.tabs runs every tab body on every rerun; only the selected view is rendered here
+active_tab = st.segmented_control(
+    "View", TABS, default=TABS[0], key='active_tab', label_visibility='collapsed'
+) or TABS[0]
 
-with tab1:
+if active_tab == TABS[0]:
     st.header(f"👥 Citizen Dashboard - {selected_city}")
     
-    current_data = data_agent.get_current_data(selected_city)
-    historical_df = data_agent.get_historical_data(selected_city, days=14)
+    current_data = pipeline.get('current', selected_city)
+    historical_df = pipeline.get('history', selected_city, history_days=14)
     events_df = data_agent.fetch_events_data(selected_city)
     
     if not current_data:
         st.error("No data available for selected city")
     else:
-        risk_info = health_index.calculate_health_risk_index(current_data, historical_df)
-        spike_info = spike_agent.detect_all_spikes(historical_df)
+        risk_info = pipeline.get('risk', selected_city, history_days=14)
+        spike_info = pipeline.get('spike', selected_city, history_days=14)
         explanation = explanation_agent.generate_comprehensive_explanation(
             current_data, historical_df, events_df, spike_info
         )
@@ -375,8 +593,9 @@ with tab1:
         with col1:
             st.subheader("📈 7-Day Health Weather Forecast")
             
-            forecast_df = forecasting_agent.generate_comprehensive_forecast(historical_df, forecast_days)
-            forecast_status = forecasting_agent.get_forecast_status()
+            forecast_result = pipeline.get('forecast', selected_city, history_days=14, forecast_days=forecast_days, forecast_mode=forecast_mode)
+            forecast_df = forecast_result['forecast']
+            forecast_status = forecast_result['status']
             
             if forecast_status == "Fallback":
                 st.warning("⚠️ Using simplified forecast model. Prophet ML model unavailable or insufficient data.")
@@ -392,6 +611,17 @@ with tab1:
                     mode='lines+markers'
                 ))
                 
+                if 'aqi_forecast_p10' in forecast_df.columns:
+                    fig.add_trace(go.Scatter(
+                        x=pd.concat([forecast_df['date'], forecast_df['date'][::-1]]),
+                        y=pd.concat([forecast_df['aqi_forecast_p90'], forecast_df['aqi_forecast_p10'][::-1]]),
+                        name='AQI p10-p90',
+                        fill='toself',
+                        fillcolor='rgba(220, 38, 38, 0.15)',
+                        line=dict(width=0),
+                        hoverinfo='skip'
+                    ))
+                
                 fig.add_trace(go.Scatter(
                     x=forecast_df['date'],
                     y=forecast_df['cases_forecast'],
@@ -462,23 +692,23 @@ with tab1:
             fig.update_traces(line_color='#2563EB')
             st.plotly_chart(fig, width='stretch')
 
-with tab2:
+if active_tab == TABS[1]:
     st.header(f"🏥 Hospital Dashboard - {selected_city}")
     
-    current_data = data_agent.get_current_data(selected_city)
-    historical_df = data_agent.get_historical_data(selected_city, days=14)
+    current_data = pipeline.get('current', selected_city)
     
     if not current_data:
         st.error("No data available for selected city")
     else:
-        spike_info = spike_agent.detect_all_spikes(historical_df)
-        forecast_df = forecasting_agent.generate_comprehensive_forecast(historical_df, forecast_days)
-        forecast_status = forecasting_agent.get_forecast_status()
+        spike_info = pipeline.get('spike', selected_city, history_days=14)
+        forecast_result = pipeline.get('forecast', selected_city, history_days=14, forecast_days=forecast_days, forecast_mode=forecast_mode)
+        forecast_df = forecast_result['forecast']
+        forecast_status = forecast_result['status']
         
         if forecast_status == "Fallback":
             st.warning("⚠️ Using simplified forecast model. Predictions may have limited accuracy.")
         
-        hospital_plan = planner_agent.generate_hospital_plan(spike_info['overall_severity'], forecast_df)
+        hospital_plan = pipeline.get('plan', selected_city, history_days=14, forecast_days=forecast_days, forecast_mode=forecast_mode)
         
         col1, col2, col3 = st.columns(3)
         
@@ -631,54 +861,94 @@ with tab2:
             
             with col1:
                 if st.button("✅ Accept Plan", type="primary", width='stretch'):
-                    with get_db() as db:
-                        new_plan = AcceptedPlan(
-                            city=selected_city,
-                            severity=hospital_plan['severity'],
-                            plan_data=hospital_plan
-                        )
-                        db.add(new_plan)
-                    st.success("✅ Plan accepted and saved to database!")
+                    write_queue.enqueue_accepted_plan(selected_city, hospital_plan, user_id=user_id)
+                    st.success("✅ Plan accepted and queued for saving")
                     st.balloons()
             
             with col2:
                 if st.button("❌ Reject Plan", width='stretch'):
-                    with get_db() as db:
-                        new_rejection = RejectedPlan(
-                            city=selected_city,
-                            severity=hospital_plan['severity'],
-                            reason="Manual rejection"
-                        )
-                        db.add(new_rejection)
+                    write_queue.enqueue_rejected_plan(
+                        selected_city,
+                        hospital_plan['severity'],
+                        reason="Manual rejection",
+                        user_id=user_id
+                    )
                     st.warning("❌ Plan rejected and logged")
             
             with col3:
                 if st.button("📥 Download Report", width='stretch'):
-                    st.info("Report download feature - Coming soon!")
+                    st.session_state.show_report_options = True
+            
+            if st.session_state.get('show_report_options'):
+                report_col1, report_col2, report_col3 = st.columns([2, 1, 1])
+                report_scope = report_col1.radio(
+                    "Report scope", [selected_city, "All cities"], horizontal=True
+                )
+                report_format = report_col2.selectbox("Format", available_formats())
+                if report_col3.button("Generate", type="primary", width='stretch'):
+                    report_cities = cities if report_scope == "All cities" else [selected_city]
+                    previous_job = st.session_state.get('report_job')
+                    if previous_job is not None:
+                        get_report_worker().discard(previous_job.id)
+                    st.session_state.report_job = get_report_worker().submit(
+                        report_cities, report_format, forecast_days, forecast_mode
+                    )
+                
+                report_job = st.session_state.get('report_job')
+                if report_job is not None and report_job.id not in get_report_worker().jobs:
+                    # Pruned by the worker; its file is gone
+                    st.session_state.pop('report_job')
+                elif report_job is not None:
+                    if not report_job.finished.is_set():
+                        report_progress(report_job)
+                    elif report_job.status == 'done':
+                        with report_job.open() as report_file:
+                            st.download_button(
+                                f"⬇️ Download {report_job.file_name}",
+                                report_file,
+                                file_name=report_job.file_name,
+                                mime=report_job.mime_type
+                            )
+                    else:
+                        st.error(f"Report generation failed: {report_job.error}")
             
             st.divider()
             st.subheader("✅ Accepted Plans History")
-            with get_db() as db:
-                recent_plans = db.query(AcceptedPlan).order_by(AcceptedPlan.timestamp.desc()).limit(10).all()
-                if recent_plans:
-                    for i, plan in enumerate(recent_plans):
-                        st.success(f"{i+1}. {plan.city} - {plan.severity} - {plan.timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-                else:
-                    st.info("No plans accepted yet")
+            recent_plans, plans_offset = paginated_history('plans', limit=10)
+            if recent_plans:
+                for i, plan in enumerate(recent_plans, plans_offset + 1):
+                    st.success(f"{i}. {plan.city} - {plan.severity} - {plan.timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
+            else:
+                st.info("No plans accepted yet")
 
-with tab3:
+if active_tab == TABS[2]:
     st.header("🗺️ City Health Risk Heatmap")
     
     st.info("Interactive map showing health risk levels across multiple cities")
     
+    city_index = get_city_index(tuple(cities))
+    region_col1, region_col2 = st.columns([2, 1])
+    with region_col1:
+        map_scope = st.radio(
+            "Map scope",
+            ["All cities", f"Near {selected_city}"],
+            horizontal=True
+        )
+    with region_col2:
+        radius_km = st.slider("Radius (km)", min_value=50, max_value=1500, value=500, step=50)
+    
+    if map_scope == "All cities" or selected_city not in city_index:
+        map_cities = cities
+    else:
+        map_cities = [city for city, _ in city_index.near_city(selected_city, radius_km)]
+    
     try:
         all_cities_data = []
-        for city in cities:
-            current_data = data_agent.get_current_data(city)
-            historical_df = data_agent.get_historical_data(city, days=7)
+        for city in map_cities:
+            current_data = pipeline.get('current', city)
             
             if current_data:
-                risk_info = health_index.calculate_health_risk_index(current_data, historical_df)
+                risk_info = pipeline.get('risk', city, history_days=7)
                 all_cities_data.append({
                     'city': city,
                     'lat': current_data.get('latitude', 0),
@@ -693,28 +963,20 @@ with tab3:
         if all_cities_data:
             df_map = pd.DataFrame(all_cities_data)
             
+            map_version = heatmap.data_version(all_cities_data)
+
             try:
-                m = folium.Map(
-                    location=[df_map['lat'].mean(), df_map['lon'].mean()],
-                    zoom_start=5,
-                    tiles='OpenStreetMap'
-                )
-                
-                for _, row in df_map.iterrows():
-                    folium.CircleMarker(
-                        location=[row['lat'], row['lon']],
-                        radius=max(3, row['risk_index'] / 5),
-                        popup=f"<b>{row['city']}</b><br>Risk: {row['risk_index']:.0f}/100<br>AQI: {row['aqi']:.0f}<br>Cases: {row['cases']:.0f}",
-                        color=row['color'],
-                        fill=True,
-                        fillColor=row['color'],
-                        fillOpacity=0.6,
-                        weight=2
-                    ).add_to(m)
-                
-                st_folium(m, width='stretch', height=600)
+                map_html = heatmap.render_map_html(all_cities_data, version=map_version)
+                components.html(map_html, height=600)
             except Exception as e:
                 st.error(f"Map rendering error: {str(e)}")
+
+            st.download_button(
+                "🌐 Download GeoJSON",
+                heatmap.heatmap_geojson(all_cities_data, version=map_version),
+                file_name=f"city_risk_{map_version[:8]}.geojson",
+                mime='application/geo+json'
+            )
             
             st.divider()
             
@@ -740,20 +1002,73 @@ with tab3:
             
             st.subheader("📋 City Data Table")
             st.dataframe(df_map[['city', 'risk_index', 'category', 'aqi', 'cases']], width='stretch')
+            
+            st.divider()
+            
+            st.subheader("🏥 Regional Surge Capacity")
+            if st.button("Compute surge plan for mapped cities"):
+                region_severities = {}
+                region_forecasts = {}
+                for city in df_map['city']:
+                    region_severities[city] = pipeline.get('spike', city, history_days=14)['overall_severity']
+                    region_forecasts[city] = pipeline.get('forecast', city, history_days=14, forecast_days=forecast_days, forecast_mode=forecast_mode)['forecast']
+                st.session_state.region_plan = generate_batch_plans(region_severities, region_forecasts)
+                st.session_state.region_forecasts = region_forecasts
+            
+            region_plan = st.session_state.get('region_plan')
+            if region_plan is not None and len(region_plan):
+                totals = region_plan.region_totals()
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Extra Beds", f"+{totals['beds']:,}")
+                col2.metric("Extra Nurses", f"+{totals['nurses']:,}")
+                col3.metric("Oxygen Cylinders", f"+{totals['oxygen_cylinders']:,}")
+                col4.metric("Total Estimated Cost", f"₹{totals['total_estimated_cost_inr']:,}")
+                st.dataframe(region_plan.surge_capacity(), width='stretch')
+            
+            region_forecasts = st.session_state.get('region_forecasts')
+            if region_forecasts:
+                st.markdown("#### 🏛️ State-level Hospitalization Forecast (reconciled)")
+                city_hosp = {
+                    city: df['hosp_forecast'].to_numpy() for city, df in region_forecasts.items() if not df.empty
+                }
+                with get_read_db() as db:
+                    region_bases = region_base_forecasts(
+                        db, list(city_hosp), horizon=max((len(v) for v in city_hosp.values()), default=0)
+                    )
+                reconciled = reconcile_forecasts(city_hosp, region_forecasts=region_bases)
+                state_rows = [{
+                    'State': region,
+                    'Peak Daily Admissions': int(round(values.max())),
+                    'Total Admissions': int(round(values.sum()))
+                } for (level, region), values in reconciled.items() if level == 'state']
+                st.dataframe(pd.DataFrame(state_rows), width='stretch')
+            
+            with st.expander("📊 State & District Aggregates"):
+                aggregate_level = st.radio("Level", ['state', 'district'], horizontal=True)
+                if st.button("🔄 Refresh aggregates"):
+                    with get_db('background') as db:
+                        sync_hierarchy(db, cities)
+                        db.flush()
+                        refresh_aggregates(db)
+                with get_read_db() as db:
+                    aggregates = [row.to_dict() for row in region_summary(db, level=aggregate_level)]
+                if aggregates:
+                    st.dataframe(pd.DataFrame(aggregates), width='stretch')
+                else:
+                    st.info("No aggregates yet - refresh to build them")
         else:
             st.warning("No city data available to display")
     except Exception as e:
         st.error(f"Error loading heatmap: {str(e)}")
 
-with tab4:
+if active_tab == TABS[3]:
     st.header("📱 Alerts & Notifications")
     
-    current_data = data_agent.get_current_data(selected_city)
-    historical_df = data_agent.get_historical_data(selected_city, days=7)
+    current_data = pipeline.get('current', selected_city)
     
     if current_data:
-        risk_info = health_index.calculate_health_risk_index(current_data, historical_df)
-        spike_info = spike_agent.detect_all_spikes(historical_df)
+        risk_info = pipeline.get('risk', selected_city, history_days=7)
+        spike_info = pipeline.get('spike', selected_city, history_days=7)
         
         col1, col2 = st.columns([1, 1])
         
@@ -783,23 +1098,17 @@ Stay safe!
             st.text_area("Alert Message", citizen_alert, height=300)
             
             if st.button("📤 Send to Citizens", type="primary"):
-                with get_db() as db:
-                    new_alert = AlertSent(
-                        alert_type='Citizen',
-                        city=selected_city,
-                        severity=risk_info['category'],
-                        message=citizen_alert,
-                        recipients_count=50000,
-                        delivery_status='simulated'
-                    )
-                    db.add(new_alert)
-                st.success(f"✅ Alert sent to 50,000+ citizens in {selected_city}!")
-                st.balloons()
+                decision = send_policy_alert('Citizen', selected_city, risk_info['category'], citizen_alert, 50000)
+                if decision['send']:
+                    st.success(f"✅ Alert sent to 50,000+ citizens in {selected_city}!")
+                    st.balloons()
+                else:
+                    show_suppressed(decision)
         
         with col2:
             st.subheader("🏥 Hospital Alert")
             
-            forecast_df = forecasting_agent.generate_comprehensive_forecast(historical_df, 3)
+            forecast_df = pipeline.get('forecast', selected_city, history_days=7, forecast_days=3)['forecast']
             next_24h_cases = int(forecast_df.iloc[0]['cases_forecast']) if not forecast_df.empty else 0
             next_24h_hosp = int(forecast_df.iloc[0]['hosp_forecast']) if not forecast_df.empty else 0
             
@@ -825,17 +1134,40 @@ Report generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             st.text_area("Hospital Alert", hospital_alert, height=300)
             
             if st.button("📤 Send to Hospitals"):
+                decision = send_policy_alert('Hospital', selected_city, spike_info['overall_severity'], hospital_alert, 20,
+                                             rank=int(spike_info['overall_level']))
+                if decision['send']:
+                    st.success(f"✅ Alert sent to all hospitals in {selected_city}!")
+                else:
+                    show_suppressed(decision)
+        
+        with st.expander("🛰️ Alert Policy Sweep (all cities)"):
+            st.caption("Evaluates every city's risk category and spike severity in one pass; sends only new levels, escalations and expired cooldowns")
+            if st.button("Run sweep"):
+                signals = []
+                for city in cities:
+                    signals.extend(city_signals(
+                        city,
+                        pipeline.get('risk', city, history_days=7),
+                        pipeline.get('spike', city, history_days=7)
+                    ))
+                policy = get_alert_policy()
                 with get_db() as db:
-                    new_alert = AlertSent(
-                        alert_type='Hospital',
-                        city=selected_city,
-                        severity=spike_info['overall_severity'],
-                        message=hospital_alert,
-                        recipients_count=20,
+                    decisions = policy.evaluate(db, signals)
+                    claimed = policy.claim(db, decisions)
+                for decision in claimed:
+                    write_queue.enqueue_alert(
+                        alert_type=decision['alert_type'],
+                        city=decision['city'],
+                        severity=decision['level'],
+                        message=f"{decision['alert_type'].upper()} ALERT - {decision['city']}: level {decision['level']}"
+                                + (f" (up from {decision['previous_level']})" if decision['action'] == 'escalate' else ""),
+                        recipients_count=50000 if decision['alert_type'] == 'Citizen' else 20,
                         delivery_status='simulated'
                     )
-                    db.add(new_alert)
-                st.success(f"✅ Alert sent to all hospitals in {selected_city}!")
+                actions = pd.Series([d['action'] for d in decisions]).value_counts()
+                st.success(f"Sent {len(claimed)} alerts across {len(cities)} cities")
+                st.dataframe(actions.rename('count').to_frame(), width='stretch')
         
         st.divider()
         
@@ -843,7 +1175,7 @@ Report generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         
         col1, col2, col3 = st.columns(3)
         
-        with get_db() as db:
+        with get_read_db() as db:
             total_alerts = db.query(AlertSent).count()
             citizen_alerts = db.query(AlertSent).filter(AlertSent.alert_type == 'Citizen').count()
             hospital_alerts = db.query(AlertSent).filter(AlertSent.alert_type == 'Hospital').count()
@@ -856,25 +1188,50 @@ Report generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             st.divider()
             st.subheader("📜 Alert History")
             
-            with get_db() as db:
-                alerts = db.query(AlertSent).order_by(AlertSent.timestamp.desc()).limit(20).all()
-                alerts_data = [{
-                    'Type': a.alert_type,
-                    'City': a.city,
-                    'Severity': a.severity,
-                    'Timestamp': a.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    'Recipients': a.recipients_count,
-                    'Status': a.delivery_status
-                } for a in alerts]
-                alerts_df = pd.DataFrame(alerts_data)
-                st.dataframe(alerts_df, width='stretch')
-
-with tab5:
+            alerts, _ = paginated_history('alerts', limit=20)
+            alerts_data = [{
+                'Type': a.alert_type,
+                'City': a.city,
+                'Severity': a.severity,
+                'Timestamp': a.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'Recipients': a.recipients_count,
+                'Status': a.delivery_status
+            } for a in alerts]
+            alerts_df = pd.DataFrame(alerts_data)
+            st.dataframe(alerts_df, width='stretch')
+            
+            with st.expander("📤 Export Alert History"):
+                export_col1, export_col2 = st.columns(2)
+                export_start = export_col1.date_input("From", value=datetime.now().date() - timedelta(days=90))
+                export_end = export_col2.date_input("To", value=datetime.now().date())
+                if st.button("Prepare CSV export"):
+                    import os
+                    export_path = export_history_csv(
+                        'alerts',
+                        start=datetime.combine(export_start, datetime.min.time()),
+                        end=datetime.combine(export_end + timedelta(days=1), datetime.min.time())
+                    )
+                    if export_path is None:
+                        st.warning(f"Export exceeds {EXPORT_MAX_BYTES // (1024 * 1024)} MB - narrow the date range")
+                    else:
+                        # The file is handed over from disk and removed once Streamlit has taken it
+                        try:
+                            with open(export_path, 'rb') as export_file:
+                                st.download_button(
+                                    "⬇️ Download CSV",
+                                    export_file,
+                                    file_name=f"alerts_{export_start}_{export_end}.csv",
+                                    mime='text/csv'
+                                )
+                        finally:
+                            os.remove(export_path)
+
+if active_tab == TABS[4]:
     st.header("🤖 Health Assistant Bot")
     st.markdown("**Get personalized health guidance from our AI health assistant**")
     
     # Get current data for this tab
-    tab5_current_data = data_agent.get_current_data(selected_city)
+    tab5_current_data = pipeline.get('current', selected_city)
     
     st.markdown("""
     <style>
@@ -905,15 +1262,26 @@ with tab5:
         
         # Initialize chat history
         if "chat_history" not in st.session_state:
-            st.session_state.chat_history = []
+            st.session_state.chat_history = ChatHistory(write_queue)
+        chat_history = st.session_state.chat_history
         
-        # Display chat history in a scrollable area
-        if len(st.session_state.chat_history) > 0:
-            for msg in st.session_state.chat_history:
-                if msg["role"] == "bot":
-                    st.markdown(f'<div class="chat-message bot-message">🤖 {msg["content"]}</div>', unsafe_allow_html=True)
-                else:
-                    st.markdown(f'<div class="chat-message user-message">👤 {msg["content"]}</div>', unsafe_allow_html=True)
+        # Older messages are only fetched on request, one page at a time; the live window is bounded
+        col_older, col_newer = st.columns(2)
+        if chat_history.has_older and col_older.button("⬆️ Load older messages"):
+            with get_read_db('history') as db:
+                chat_history.load_older(db)
+        if chat_history.has_newer_page and col_newer.button("⬇️ Newer messages"):
+            with get_read_db('history') as db:
+                chat_history.load_newer(db)
+        
+        if chat_history.older:
+            with st.expander(f"Earlier messages ({len(chat_history.older)})", expanded=True):
+                for msg in chat_history.older:
+                    st.markdown(msg["html"], unsafe_allow_html=True)
+        
+        if len(chat_history) > 0:
+            for msg in chat_history.messages:
+                st.markdown(msg["html"], unsafe_allow_html=True)
         else:
             st.info("👋 Start by typing a health question or clicking quick questions on the right!")
         
@@ -926,14 +1294,14 @@ with tab5:
         with col_send:
             if st.button("📤 Send", width='stretch'):
                 if user_input.strip():
-                    st.session_state.chat_history.append({"role": "user", "content": user_input})
+                    chat_history.append("user", user_input)
                     bot_response = generate_health_response(user_input, tab5_current_data if tab5_current_data else {})
-                    st.session_state.chat_history.append({"role": "bot", "content": bot_response})
+                    chat_history.append("bot", bot_response)
                     st.rerun()
         
         with col_clear:
             if st.button("🗑️", width='stretch'):
-                st.session_state.chat_history = []
+                chat_history.clear()
                 st.rerun()
     
     with col2:
@@ -950,9 +1318,9 @@ with tab5:
         
         for q in quick_questions:
             if st.button(q, width='stretch'):
-                st.session_state.chat_history.append({"role": "user", "content": q})
+                chat_history.append("user", q)
                 bot_response = generate_health_response(q, tab5_current_data if tab5_current_data else {})
-                st.session_state.chat_history.append({"role": "bot", "content": bot_response})
+                chat_history.append("bot", bot_response)
                 st.rerun()
         
         st.divider()
@@ -0,0 +1,119 @@
+import re
+from functools import lru_cache
+
+# intent -> (trigger phrases, response template). Order decides the order
+# responses appear in when a message mentions several topics.
+SYMPTOM_KNOWLEDGE = {
+    "fever": (
+        ("fever", "feverish", "high temperature"),
+        "Fever can indicate infection. Monitor your temperature regularly. Stay hydrated and rest. If fever persists >3 days or >101°F, consult a doctor. Current AQI: {aqi}"
+    ),
+    "headache": (
+        ("headache", "head ache", "migraine", "head pain"),
+        "Headaches can be triggered by stress, dehydration, or air quality. Drink water, rest in a dark room, and avoid screens. High AQI (>100) can worsen symptoms."
+    ),
+    "cough": (
+        ("cough", "coughing"),
+        "Cough might indicate respiratory issues. Avoid air pollution, use masks outdoors, stay hydrated. If persistent >2 weeks, seek medical advice."
+    ),
+    "cold": (
+        ("cold", "runny nose", "sneezing", "blocked nose"),
+        "Common cold typically improves in 7-10 days. Rest, hydrate, use saline drops, and avoid spreading to others. Boost immunity with vitamin C."
+    ),
+    "allergy": (
+        ("allergy", "allergies", "allergic", "hay fever"),
+        "Allergies worsen with high air pollution. Stay indoors on bad air days, use HEPA filters, and take antihistamines as needed."
+    ),
+    "covid": (
+        ("covid", "coronavirus", "sars-cov-2"),
+        "COVID symptoms vary. Get tested if symptomatic. Stay isolated for 5-10 days. Seek emergency care if shortness of breath occurs."
+    ),
+    "flu": (
+        ("flu", "influenza"),
+        "Flu is serious - get vaccinated annually. Rest, hydrate, and antiviral drugs help. Avoid others for 5 days."
+    ),
+    "pollution": (
+        ("pollution", "polluted", "smog"),
+        "Current AQI is {aqi}. Wear N95 masks outdoors, keep windows closed, use air purifiers, and reduce outdoor activities."
+    ),
+    "aqi": (
+        ("aqi", "air quality"),
+        "Current AQI in your area: {aqi}. Healthy level is <50. Limit outdoor activities if AQI >100."
+    ),
+}
+
+GENERAL_KNOWLEDGE = {
+    "sleep": (
+        ("sleep", "insomnia"),
+        "Get 7-8 hours of quality sleep daily. Maintain consistent sleep schedule, avoid screens 1 hour before bed."
+    ),
+    "exercise": (
+        ("exercise", "workout", "work out"),
+        "Aim for 150 mins moderate activity weekly. Avoid outdoor exercise on high pollution days. Indoor workouts are safer alternatives."
+    ),
+    "diet": (
+        ("diet", "nutrition", "what to eat"),
+        "Eat balanced meals: fruits, vegetables, lean proteins. Limit processed foods. Stay hydrated with 2-3 liters water daily."
+    ),
+    "doctor": (
+        ("doctor", "physician"),
+        "See a doctor for: persistent symptoms >2 weeks, high fever, severe pain, breathing issues, or chronic conditions."
+    ),
+    "vaccine": (
+        ("vaccine", "vaccination", "vaccinated"),
+        "Vaccinations protect you and community. Get annual flu shots and recommended vaccines. Consult your doctor for personalized advice."
+    ),
+    "prevent": (
+        ("prevent", "prevention"),
+        "Prevention tips: wash hands regularly, wear masks in crowds, avoid touching face, maintain distance from sick people, boost immunity."
+    ),
+}
+
+DEFAULT_RESPONSE = "🤔 I'm here to help with health-related questions! Ask about symptoms, prevention, vaccines, air quality, or general wellness. What's your concern?"
+
+
+def _compile(*knowledge_bases):
+    phrase_to_intent = {}
+    for knowledge in knowledge_bases:
+        for intent, (phrases, _) in knowledge.items():
+            for phrase in phrases:
+                phrase_to_intent.setdefault(phrase, intent)
+    # Longest phrases first so "hay fever" wins over "fever" at the same position
+    alternation = '|'.join(re.escape(p) for p in sorted(phrase_to_intent, key=len, reverse=True))
+    return re.compile(rf'\b(?:{alternation})', re.IGNORECASE), phrase_to_intent
+
+
+_PATTERN, _PHRASE_TO_INTENT = _compile(SYMPTOM_KNOWLEDGE, GENERAL_KNOWLEDGE)
+_TEMPLATES = {intent: template for intent, (_, template) in {**SYMPTOM_KNOWLEDGE, **GENERAL_KNOWLEDGE}.items()}
+_INTENT_ORDER = {intent: i for i, intent in enumerate(_TEMPLATES)}
+_AQI_INTENTS = frozenset(intent for intent, template in _TEMPLATES.items() if '{aqi}' in template)
+
+
+@lru_cache(maxsize=4096)
+def match_intents(text):
+    """All intents mentioned in the text, in knowledge-base order"""
+    found = {_PHRASE_TO_INTENT[m.lower()] for m in _PATTERN.findall(text)}
+    if len(found) < 2:
+        return tuple(found)
+    return tuple(sorted(found, key=_INTENT_ORDER.__getitem__))
+
+
+def aqi_bucket(current_data):
+    # Responses show the AQI as an integer, so that is the coarsest safe bucket
+    return int(current_data.get('aqi', 0) or 0)
+
+
+@lru_cache(maxsize=4096)
+def render_response(intents, aqi):
+    if not intents:
+        return DEFAULT_RESPONSE
+    symptoms = [i for i in intents if i in SYMPTOM_KNOWLEDGE]
+    selected = symptoms or list(intents)
+    return '\n\n'.join(_TEMPLATES[i].format(aqi=aqi) for i in selected)
+
+
+def generate_health_response(user_input, current_data):
+    """Generate healthcare guidance based on user input"""
+    intents = match_intents(user_input)
+    aqi = aqi_bucket(current_data) if _AQI_INTENTS.intersection(intents) else None
+    return render_response(intents, aqi)
@@ -0,0 +1,212 @@
+import csv
+import io
+import threading
+from contextlib import asynccontextmanager
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from database import DATABASE_READ_URL, DATABASE_URL, workload_config
+from history import csv_header, history_statement, split_page
+from models import AlertSent, ChatMessage, RegionAggregate
+
+# Sync URL backend -> async driver
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.Lock()
+
+
+def async_url(url):
+    """Rewrite a sync database URL for its async driver"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == 'postgresql' and 'sslmode' in url.query:
+        # asyncpg takes ssl=, not libpq's sslmode=
+        query = dict(url.query)
+        query['ssl'] = query.pop('sslmode')
+        url = url.set(query=query)
+    return url
+
+
+def _asyncio():
+    """sqlalchemy.ext.asyncio, which needs greenlet and an async driver from the async extra"""
+    try:
+        from sqlalchemy.ext import asyncio
+    except ImportError:
+        raise RuntimeError("Async database access requires greenlet and asyncpg or aiosqlite (pip install '.[async]')")
+    return asyncio
+
+
+def _create_async_engine(url, pool_size, max_overflow, timeout_ms):
+    create_async_engine = _asyncio().create_async_engine
+    url = async_url(url)
+    kwargs = {'pool_pre_ping': True}
+    if url.get_backend_name() == 'postgresql':
+        kwargs['pool_size'] = pool_size
+        kwargs['max_overflow'] = max_overflow
+        kwargs['connect_args'] = {'server_settings': {'statement_timeout': str(int(timeout_ms))}}
+    try:
+        return create_async_engine(url, **kwargs)
+    except ImportError:
+        raise RuntimeError("Async database access requires asyncpg or aiosqlite (pip install '.[async]')")
+
+
+def get_async_engine(workload='write'):
+    """Async engine for a workload class; same routing and pool settings as get_engine()"""
+    if workload not in _engines:
+        with _engines_lock:
+            if workload not in _engines:
+                config = workload_config(workload)
+                url = DATABASE_URL if config['target'] == 'primary' else DATABASE_READ_URL
+                _engines[workload] = _create_async_engine(url, config['pool_size'], config['max_overflow'], config['timeout_ms'])
+                _session_factories[workload] = _asyncio().async_sessionmaker(
+                    _engines[workload], autoflush=False, expire_on_commit=False
+                )
+    return _engines[workload]
+
+
+def get_async_session_factory(workload='write'):
+    get_async_engine(workload)
+    return _session_factories[workload]
+
+
+@asynccontextmanager
+async def get_async_db(workload='write'):
+    """Async counterpart of get_db(): commit on success, roll back on error"""
+    db = get_async_session_factory(workload)()
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+@asynccontextmanager
+async def get_async_read_db(workload='dashboard'):
+    db = get_async_session_factory(workload)()
+    try:
+        yield db
+    finally:
+        await db.rollback()
+        await db.close()
+
+
+async def dispose_async_engines():
+    for engine in list(_engines.values()):
+        await engine.dispose()
+    _engines.clear()
+    _session_factories.clear()
+
+
+# Repository functions: the queries app.py runs, for an AsyncSession
+
+async def history_page(db, source, limit=20, cursor=None, **filters):
+    result = await db.execute(history_statement(source, limit=limit, cursor=cursor, **filters))
+    return split_page(result.all(), limit)
+
+
+async def iter_history(db, source, batch_size=1000, **filters):
+    cursor = None
+    while True:
+        rows, cursor = await history_page(db, source, limit=batch_size, cursor=cursor, **filters)
+        for row in rows:
+            yield row
+        if cursor is None:
+            break
+
+
+async def stream_csv(db, source, batch_size=1000, **filters):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(csv_header(source))
+    i = 0
+    async for row in iter_history(db, source, batch_size=batch_size, **filters):
+        i += 1
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def alert_counts(db):
+    """{'total': n, 'Citizen': n, 'Hospital': n, ...} in one grouped query"""
+    result = await db.execute(
+        select(AlertSent.alert_type, func.count()).group_by(AlertSent.alert_type)
+    )
+    counts = {alert_type: count for alert_type, count in result.all()}
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+async def region_summary(db, level='state', date=None):
+    if date is None:
+        date = await db.scalar(select(func.max(RegionAggregate.date)).where(RegionAggregate.level == level))
+        if date is None:
+            return []
+    result = await db.scalars(
+        select(RegionAggregate)
+        .where(RegionAggregate.level == level, RegionAggregate.date == date)
+        .order_by(RegionAggregate.hospitalizations.desc())
+    )
+    return result.all()
+
+
+async def chat_page(db, session_id, before_seq, floor_seq=0, limit=20):
+    """Persisted messages older than before_seq, oldest first"""
+    result = await db.execute(
+        select(ChatMessage.seq, ChatMessage.role, ChatMessage.content)
+        .where(
+            ChatMessage.session_id == session_id,
+            ChatMessage.seq < before_seq,
+            ChatMessage.seq >= floor_seq
+        )
+        .order_by(ChatMessage.seq.desc())
+        .limit(limit)
+    )
+    return list(reversed(result.all()))
+
+
+async def load_older_messages(db, chat_history, limit=20):
+    return await db.run_sync(lambda session: chat_history.load_older(session, limit=limit))
+
+
+async def load_newer_messages(db, chat_history, limit=20):
+    return await db.run_sync(lambda session: chat_history.load_newer(session, limit=limit))
+
+
+async def refresh_regions(db, cities):
+    """sync_hierarchy + refresh_aggregates; both are bulk SQL, so they run as-is"""
+    from regions import refresh_aggregates, sync_hierarchy
+
+    def refresh(session):
+        sync_hierarchy(session, cities)
+        session.flush()
+        refresh_aggregates(session)
+
+    await db.run_sync(refresh)
+
+
+async def write_records(db, kind, payloads):
+    """Write a batch of write-behind records (accepted_plan, alert_sent, ...) in this session"""
+    from write_behind import WRITERS
+
+    await db.run_sync(lambda session: WRITERS[kind](session, payloads))
+
+
+async def save_accepted_plan(db, city, plan, user_id=None):
+    from plan_store import save_accepted_plan as save
+
+    return await db.run_sync(lambda session: save(session, city, plan, user_id=user_id))
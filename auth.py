@@ -0,0 +1,228 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import bindparam, update
+
+from models import User
+
+# scrypt cost; raise AUTH_SCRYPT_N as hardware allows. Stored hashes carry their
+# own parameters, so old hashes keep verifying and are upgraded on next login.
+SCRYPT_N = int(os.environ.get('AUTH_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('AUTH_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('AUTH_SCRYPT_P', 1))
+PBKDF2_ITERATIONS = int(os.environ.get('AUTH_PBKDF2_ITERATIONS', 600000))
+
+TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 12 * 3600))
+PROFILE_TTL = 300.0
+LAST_LOGIN_INTERVAL = 15 * 60
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem has to cover 128 * n * r bytes plus slack
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, dklen=32, maxmem=256 * n * r + 1024 * 1024)
+
+
+def hash_password(password, algorithm='scrypt'):
+    salt = secrets.token_bytes(16)
+    if algorithm == 'scrypt':
+        digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(digest)}"
+    if algorithm == 'pbkdf2_sha256':
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, PBKDF2_ITERATIONS)
+        return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64encode(salt)}${_b64encode(digest)}"
+    raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+
+
+def verify_password(password, stored):
+    try:
+        algorithm, *fields = stored.split('$')
+        if algorithm == 'scrypt':
+            n, r, p, salt, expected = fields
+            digest = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+        elif algorithm == 'pbkdf2_sha256':
+            iterations, salt, expected = fields
+            digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), _b64decode(salt), int(iterations))
+        else:
+            return False
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(digest, _b64decode(expected))
+
+
+def needs_rehash(stored):
+    return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash():
+    """Verified against when the username does not exist, so timing does not reveal it.
+
+    Built on first login rather than at import, which would cost a full scrypt run.
+    """
+    return hash_password(secrets.token_hex(8))
+
+
+@lru_cache(maxsize=1)
+def _secret_key():
+    """Token signing key, read on first use so modules that never sign can import auth"""
+    # A per-process random key would split tokens between replicas and drop them on restart
+    secret = os.environ.get('AUTH_SECRET_KEY')
+    if not secret:
+        raise ValueError("AUTH_SECRET_KEY environment variable is not set; it is required to issue and verify login tokens")
+    return secret.encode('utf-8')
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_secret_key(), payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def issue_token(user, ttl=TOKEN_TTL):
+    """Signed session token carrying the claims a page needs (id, role, city)"""
+    now = int(time.time())
+    claims = {
+        'uid': user['id'],
+        'usr': user['username'],
+        'role': user['role'],
+        'city': user['city'],
+        'iat': now,
+        'exp': now + ttl,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token):
+    """Claims dict for a valid, unexpired token, else None; no database access"""
+    if not token or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    try:
+        if not hmac.compare_digest(signature.encode('ascii'), _sign(payload).encode('ascii')):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+
+def _profile(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'full_name': user.full_name,
+        'hospital_name': user.hospital_name,
+        'city': user.city,
+        'role': user.role,
+        'is_active': user.is_active,
+    }
+
+
+def create_user(db, username, email, password, role='hospital_admin', city=None, full_name=None, hospital_name=None):
+    user = User(
+        username=username,
+        email=email,
+        password_hash=hash_password(password),
+        role=role,
+        city=city,
+        full_name=full_name,
+        hospital_name=hospital_name
+    )
+    db.add(user)
+    db.flush()
+    return _profile(user)
+
+
+def authenticate(db, username, password):
+    """Profile dict for valid credentials, else None. Upgrades outdated hashes."""
+    user = db.query(User).filter(User.username == username).first()
+    if user is None or not user.is_active:
+        # Same work as a real check, so timing reveals neither unknown nor disabled accounts
+        verify_password(password, _dummy_hash())
+        return None
+    if not verify_password(password, user.password_hash):
+        return None
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return _profile(user)
+
+
+def write_last_logins(db, payloads):
+    """Write-behind writer: one executemany UPDATE, latest timestamp per user"""
+    latest = {}
+    for payload in payloads:
+        user_id = payload['user_id']
+        if user_id not in latest or payload['timestamp'] > latest[user_id]:
+            latest[user_id] = payload['timestamp']
+    statement = update(User).where(User.id == bindparam('uid')).values(last_login=bindparam('ts'))
+    db.connection().execute(statement, [{'uid': uid, 'ts': ts} for uid, ts in latest.items()])
+
+
+class UserDirectory:
+    """TTL cache of user profiles (role, city, ...) so reruns skip the users table"""
+
+    def __init__(self, session_factory=None, ttl=PROFILE_TTL):
+        if session_factory is None:
+            from database import get_read_db
+            session_factory = get_read_db
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._profiles.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        with self.session_factory() as db:
+            user = db.get(User, user_id)
+            profile = _profile(user) if user is not None else None
+        with self._lock:
+            self._profiles[user_id] = (now + self.ttl, profile)
+        return profile
+
+    def put(self, profile):
+        with self._lock:
+            self._profiles[profile['id']] = (time.monotonic() + self.ttl, profile)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._profiles.pop(user_id, None)
+
+
+class LastLoginRecorder:
+    """Records activity through the write-behind queue, at most once per interval per user"""
+
+    def __init__(self, write_queue, interval=LAST_LOGIN_INTERVAL):
+        self.write_queue = write_queue
+        self.interval = interval
+        self._recorded = {}
+        self._lock = threading.Lock()
+
+    def touch(self, user_id, force=False):
+        now = time.monotonic()
+        with self._lock:
+            last = self._recorded.get(user_id)
+            if not force and last is not None and now - last < self.interval:
+                return False
+            self._recorded[user_id] = now
+        self.write_queue.enqueue_last_login(user_id)
+        return True
@@ -0,0 +1,57 @@
+"""Alert policy sweep over many cities against the DATABASE_URL database.
+
+    python benchmarks/bench_alert_policy.py [cities]
+
+Round 1 sends every city (no state yet), round 2 is all duplicates inside the
+cooldown, round 3 escalates one city in ten.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_policy import AlertPolicy
+from database import get_db, init_db
+from models import AlertState
+
+LEVELS = ('Moderate', 'High')
+
+
+def sweep(policy, signals):
+    started = time.perf_counter()
+    with get_db() as db:
+        decisions = policy.evaluate(db, signals)
+        evaluated = time.perf_counter()
+        claimed = policy.claim(db, decisions)
+    finished = time.perf_counter()
+    return len(claimed), (evaluated - started) * 1000, (finished - evaluated) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    init_db()
+    cities = [f"Bench-City-{i}" for i in range(count)]
+    with get_db() as db:
+        db.query(AlertState).filter(AlertState.city.like('Bench-City-%')).delete(synchronize_session=False)
+
+    rng = random.Random(0)
+    levels = {city: rng.choice(LEVELS) for city in cities}
+    policy = AlertPolicy()
+
+    escalated = {city: ('Severe' if i % 10 == 0 else level) for i, (city, level) in enumerate(levels.items())}
+    rounds = [('first sweep', levels), ('duplicates', levels), ('10% escalate', escalated)]
+
+    print(f"{'round':<14}{'sent':>8}{'evaluate ms':>14}{'claim ms':>12}")
+    for name, round_levels in rounds:
+        signals = [(city, 'Citizen', level) for city, level in round_levels.items()]
+        sent, evaluate_ms, claim_ms = sweep(policy, signals)
+        print(f"{name:<14}{sent:>8}{evaluate_ms:>14.1f}{claim_ms:>12.1f}")
+
+    with get_db() as db:
+        db.query(AlertState).filter(AlertState.city.like('Bench-City-%')).delete(synchronize_session=False)
+
+
+if __name__ == '__main__':
+    main()
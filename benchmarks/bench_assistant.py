@@ -0,0 +1,64 @@
+"""Health Assistant throughput in messages/sec: baseline linear scan vs compiled matcher.
+
+    python benchmarks/bench_assistant.py [messages]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import assistant
+
+MESSAGES = [
+    "What are common COVID symptoms?",
+    "How to protect from air pollution?",
+    "When should I see a doctor?",
+    "What's a healthy AQI level?",
+    "Tips for flu prevention?",
+    "How to manage allergies?",
+    "I have a headache and fever since yesterday",
+    "my kid has a runny nose and is coughing a lot",
+    "Is it safe to do a workout outside today?",
+    "hello there",
+]
+
+
+def baseline_response(user_input, current_data):
+    # Pre-compiler implementation: rebuild dicts, first substring match wins
+    text = user_input.lower()
+    symptoms = {k: t.format(aqi=int(current_data.get('aqi', 0))) for k, (_, t) in assistant.SYMPTOM_KNOWLEDGE.items()}
+    for keyword, response in symptoms.items():
+        if keyword in text:
+            return response
+    general = {k: t for k, (_, t) in assistant.GENERAL_KNOWLEDGE.items()}
+    for keyword, response in general.items():
+        if keyword in text:
+            return response
+    return assistant.DEFAULT_RESPONSE
+
+
+def run(label, fn, messages, data):
+    start = time.perf_counter()
+    for message, current in zip(messages, data):
+        fn(message, current)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{len(messages) / elapsed:>14,.0f} msg/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = random.Random(0)
+    messages = [rng.choice(MESSAGES) for _ in range(count)]
+    data = [{'aqi': rng.uniform(20, 400)} for _ in range(count)]
+    run('baseline linear scan', baseline_response, messages, data)
+    assistant.render_response.cache_clear()
+    assistant.match_intents.cache_clear()
+    run('compiled matcher + cache', assistant.generate_health_response, messages, data)
+    info = assistant.render_response.cache_info()
+    print(f"cache hits {info.hits:,} / misses {info.misses:,}")
+
+
+if __name__ == '__main__':
+    main()
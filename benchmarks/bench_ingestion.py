@@ -0,0 +1,69 @@
+"""Streaming ingestion throughput from a replay file.
+
+    python benchmarks/bench_ingestion.py [readings] [--db]
+
+Without --db rows go to a NullSink, which measures the clean/dedupe/buffer
+path. With --db they are written to the DATABASE_URL database.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion import IngestionPipeline, NullSink, ReplaySource
+
+CITIES = [f"City-{i}" for i in range(500)]
+
+
+def write_capture(path, count):
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1)
+    with open(path, 'w', encoding='utf-8') as handle:
+        for i in range(count):
+            reading = {
+                'city': CITIES[i % len(CITIES)],
+                'date': (start + timedelta(minutes=15 * (i // len(CITIES)))).isoformat(),
+                'aqi': round(rng.uniform(20, 450), 1),
+                'pm25': round(rng.uniform(5, 300), 1),
+                'pm10': round(rng.uniform(10, 500), 1),
+                'temperature': round(rng.uniform(5, 45), 1),
+                'humidity': round(rng.uniform(10, 95), 1),
+                'wind_speed': round(rng.uniform(0, 30), 1),
+                'total_cases': rng.randint(0, 500),
+                'respiratory_cases': rng.randint(0, 200),
+                'hospitalizations': rng.randint(0, 50),
+            }
+            # ~2% duplicates and ~1% faulty readings
+            if i % 50 == 0 and (i // len(CITIES)) % 2 == 1:
+                reading['date'] = (start + timedelta(minutes=15 * ((i - len(CITIES)) // len(CITIES)))).isoformat()
+            if i % 100 == 7:
+                reading['aqi'] = -1
+                reading['pm25'] = reading['pm10'] = reading['temperature'] = None
+                reading['humidity'] = reading['wind_speed'] = None
+                reading['total_cases'] = reading['respiratory_cases'] = reading['hospitalizations'] = None
+            handle.write(json.dumps(reading) + '\n')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 200000
+    use_db = '--db' in sys.argv
+    fd, path = tempfile.mkstemp(suffix='.jsonl')
+    os.close(fd)
+    try:
+        write_capture(path, count)
+        sink = None if use_db else NullSink()
+        pipeline = IngestionPipeline(ReplaySource(path), sink=sink)
+        stats = pipeline.run()
+        print(f"readings/sec  {pipeline.throughput:,.0f}")
+        for key, value in stats.items():
+            print(f"{key:<20}{value:>12,}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
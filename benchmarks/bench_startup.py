@@ -0,0 +1,93 @@
+"""Cold-start import cost per module, and app.py's time to first paint.
+
+Each module is imported in a fresh interpreter so shared dependencies are
+not hidden by an earlier import. First paint runs app.py, outside the
+Streamlit server, up to and including the page header. It needs
+DATABASE_URL like the app does. Run from the repository root:
+
+    python benchmarks/bench_startup.py
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'streamlit',
+    'pandas',
+    'numpy',
+    'plotly.graph_objects',
+    'plotly.express',
+    'folium',
+    'streamlit_folium',
+    'sqlalchemy',
+    'sklearn.ensemble',
+    'prophet',
+    'agents.data_agent',
+    'agents.forecasting_agent',
+    'agents.spike_detection_agent',
+    'agents.explanation_agent',
+    'agents.planner_agent',
+    'agents.health_risk_index',
+    'lazy_imports',
+]
+
+SNIPPET = (
+    "import time, importlib\n"
+    "t = time.perf_counter()\n"
+    "importlib.import_module({name!r})\n"
+    "print(time.perf_counter() - t)\n"
+)
+
+
+# Last statement of app.py that counts towards first paint
+HEADER_MARKER = '<div class="sub-header">'
+
+FIRST_PAINT_SNIPPET = (
+    "import sys, time\n"
+    "sys.path.insert(0, '.')\n"
+    "source = open('app.py', encoding='utf-8').read()\n"
+    "cut = source.index('\\n', source.index({marker!r})) + 1\n"
+    "code = compile(source[:cut], 'app.py', 'exec')\n"
+    "t = time.perf_counter()\n"
+    "exec(code, {{'__name__': '__main__'}})\n"
+    "print(time.perf_counter() - t)\n"
+)
+
+
+def measure(name, repeat=3, snippet=None):
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', snippet or SNIPPET.format(name=name)],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(samples)
+
+
+def main():
+    print(f"{'module':<32}{'import (ms)':>14}")
+    print('-' * 46)
+    total = 0.0
+    for name in MODULES:
+        seconds = measure(name)
+        if seconds is None:
+            print(f"{name:<32}{'unavailable':>14}")
+            continue
+        total += seconds
+        print(f"{name:<32}{seconds * 1000:>14.1f}")
+    print('-' * 46)
+    print(f"{'sum (eager app.py upper bound)':<32}{total * 1000:>14.1f}")
+    first_paint = measure('app.py', snippet=FIRST_PAINT_SNIPPET.format(marker=HEADER_MARKER))
+    if first_paint is None:
+        print(f"{'app.py to header':<32}{'unavailable':>14}")
+    else:
+        print(f"{'app.py to header':<32}{first_paint * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Memory footprint of recent city history: dicts vs DataFrames vs ring buffers.
+
+    python benchmarks/bench_timeseries_memory.py [cities] [days]
+"""
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from timeseries import DEFAULT_METRICS, TimeSeriesStore
+
+
+def make_rows(cities, days):
+    rng = np.random.default_rng(0)
+    start = datetime(2025, 1, 1)
+    for c in range(cities):
+        for d in range(days):
+            row = {m: float(rng.uniform(0, 400)) for m in DEFAULT_METRICS}
+            row.update({
+                'id': c * days + d,
+                'city': f"City-{c}",
+                'date': start + timedelta(days=d),
+                'weather_condition': 'Clear',
+                'data_source': 'csv',
+                'created_at': start,
+            })
+            yield row
+
+
+def measure(label, build, rows):
+    tracemalloc.start()
+    obj = build(rows)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28}{current / 1024 / 1024:>10.2f} MiB")
+    return obj
+
+
+def as_dicts(rows):
+    # Shape produced by DataSnapshot.to_dict(): 15 keys per row
+    return [dict(r) for r in rows]
+
+
+def as_frames(rows):
+    by_city = {}
+    for r in rows:
+        by_city.setdefault(r['city'], []).append(r)
+    return {city: pd.DataFrame(records) for city, records in by_city.items()}
+
+
+def as_store(rows, capacity):
+    store = TimeSeriesStore(capacity=capacity)
+    for r in rows:
+        store.append(r['city'], r['date'], r)
+    return store
+
+
+def main():
+    cities = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    rows = list(make_rows(cities, days))
+    print(f"{cities} cities x {days} days ({len(rows)} readings)")
+    print('-' * 38)
+    measure('list of to_dict() rows', as_dicts, rows)
+    measure('DataFrame per city', as_frames, rows)
+    store = measure('TimeSeriesStore', lambda r: as_store(r, days), rows)
+    print(f"{'  (array payload)':<28}{store.nbytes / 1024 / 1024:>10.2f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import html
+import uuid
+from collections import deque
+
+from models import ChatMessage
+
+ROLE_CLASSES = {
+    'bot': ('bot-message', '🤖'),
+    'user': ('user-message', '👤'),
+}
+
+
+def render_message_html(role, content):
+    css_class, icon = ROLE_CLASSES.get(role, ROLE_CLASSES['user'])
+    body = html.escape(content) if role == 'user' else content
+    return f'<div class="chat-message {css_class}">{icon} {body.replace(chr(10), "<br>")}</div>'
+
+
+class ChatHistory:
+    """Bounded in-memory chat window backed by the chat_messages table.
+
+    Only the newest ``window`` messages stay in memory. New messages go to the
+    write-behind queue, which inserts them in batches. Older messages are read
+    back one page at a time with load_older() and load_newer(); only that page
+    is kept.
+    """
+
+    def __init__(self, write_queue, session_id=None, window=50):
+        self.write_queue = write_queue
+        self.session_id = session_id or uuid.uuid4().hex
+        self.window = window
+        self.messages = deque(maxlen=window)
+        self.older = []
+        self._next_seq = 0
+        self._floor_seq = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, role, content):
+        seq = self._next_seq
+        self._next_seq += 1
+        message = {
+            'seq': seq,
+            'role': role,
+            'content': content,
+            'html': render_message_html(role, content)
+        }
+        self.messages.append(message)
+        self.write_queue.enqueue_chat_message(self.session_id, seq, role, content)
+        return message
+
+    @property
+    def oldest_loaded_seq(self):
+        if self.older:
+            return self.older[0]['seq']
+        return self.window_start_seq
+
+    @property
+    def window_start_seq(self):
+        if self.messages:
+            return self.messages[0]['seq']
+        return self._next_seq
+
+    @property
+    def has_older(self):
+        return self.oldest_loaded_seq > self._floor_seq
+
+    @property
+    def has_newer_page(self):
+        """True when persisted messages lie between the loaded page and the live window"""
+        return bool(self.older) and self.older[-1]['seq'] + 1 < self.window_start_seq
+
+    def _page(self, db, limit, before=None, after=None):
+        query = db.query(ChatMessage.seq, ChatMessage.role, ChatMessage.content).filter(
+            ChatMessage.session_id == self.session_id,
+            ChatMessage.seq >= self._floor_seq
+        )
+        if after is not None:
+            rows = (
+                query.filter(ChatMessage.seq > after, ChatMessage.seq < self.window_start_seq)
+                .order_by(ChatMessage.seq)
+                .limit(limit)
+                .all()
+            )
+        else:
+            rows = list(reversed(
+                query.filter(ChatMessage.seq < before).order_by(ChatMessage.seq.desc()).limit(limit).all()
+            ))
+        return [{
+            'seq': row.seq,
+            'role': row.role,
+            'content': row.content,
+            'html': render_message_html(row.role, row.content)
+        } for row in rows]
+
+    def load_older(self, db, limit=20):
+        """Replace the loaded page with the one before it; returns how many were loaded.
+
+        Only one page is held at a time, so paging back through a long
+        transcript does not grow memory.
+        """
+        page = self._page(db, limit, before=self.oldest_loaded_seq)
+        if page:
+            self.older = page
+        return len(page)
+
+    def load_newer(self, db, limit=20):
+        """Replace the loaded page with the next one towards the live window"""
+        if not self.older:
+            return 0
+        self.older = self._page(db, limit, after=self.older[-1]['seq'])
+        return len(self.older)
+
+    def clear(self):
+        """Hide everything so far; persisted transcripts are kept"""
+        self.messages.clear()
+        self.older = []
+        self._floor_seq = self._next_seq
@@ -1,32 +1,171 @@
+import logging
 import os
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
 from contextlib import contextmanager
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
-)
+# Falls back to the primary when no replica is configured
+DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL') or DATABASE_URL
+
+# Workload class -> target database, pool sizing and statement timeout.
+# Override per workload with e.g. DB_DASHBOARD_POOL_SIZE, DB_HISTORY_TIMEOUT_MS.
+# 'migrate' runs schema DDL and partition maintenance; timeout 0 disables it,
+# since index builds and partition moves on large tables outlast any request budget.
+WORKLOADS = {
+    'write': {'target': 'primary', 'pool_size': 5, 'max_overflow': 10, 'timeout_ms': 5000},
+    'dashboard': {'target': 'replica', 'pool_size': 10, 'max_overflow': 20, 'timeout_ms': 3000},
+    'history': {'target': 'replica', 'pool_size': 4, 'max_overflow': 4, 'timeout_ms': 30000},
+    'background': {'target': 'primary', 'pool_size': 3, 'max_overflow': 2, 'timeout_ms': 120000},
+    'migrate': {'target': 'primary', 'pool_size': 1, 'max_overflow': 0, 'timeout_ms': 0},
+}
+
+def workload_config(workload):
+    if workload not in WORKLOADS:
+        raise ValueError(f"Unknown database workload: {workload}")
+    config = dict(WORKLOADS[workload])
+    prefix = f"DB_{workload.upper()}_"
+    for key, env_name in (('pool_size', 'POOL_SIZE'), ('max_overflow', 'MAX_OVERFLOW'), ('timeout_ms', 'TIMEOUT_MS')):
+        if os.environ.get(prefix + env_name):
+            config[key] = int(os.environ[prefix + env_name])
+    return config
+
+def _create_engine(url, pool_size, max_overflow, timeout_ms):
+    kwargs = {'pool_pre_ping': True}
+    if url.startswith('postgresql'):
+        kwargs['pool_size'] = pool_size
+        kwargs['max_overflow'] = max_overflow
+        kwargs['connect_args'] = {'options': f'-c statement_timeout={int(timeout_ms)}'}
+    return create_engine(url, **kwargs)
+
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.Lock()
+
+def get_engine(workload='write'):
+    """Engine for a workload class, created on first use"""
+    if workload not in _engines:
+        with _engines_lock:
+            if workload not in _engines:
+                config = workload_config(workload)
+                url = DATABASE_URL if config['target'] == 'primary' else DATABASE_READ_URL
+                _engines[workload] = _create_engine(url, config['pool_size'], config['max_overflow'], config['timeout_ms'])
+                _session_factories[workload] = sessionmaker(autocommit=False, autoflush=False, bind=_engines[workload])
+    return _engines[workload]
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_session_factory(workload='write'):
+    get_engine(workload)
+    return _session_factories[workload]
+
+engine = get_engine('write')
+
+SessionLocal = get_session_factory('write')
 
 Base = declarative_base()
 
+# Indexes superseded by a model change; upgrade_schema() drops them
+RETIRED_INDEXES = ('ix_data_snapshots_city_date',)
+
+# Opt-in: let upgrade_schema() delete duplicate rows that block a new unique index
+SCHEMA_DEDUPE = os.environ.get('SCHEMA_DEDUPE', '').lower() in ('1', 'true', 'yes')
+
 def init_db():
     import models
-    Base.metadata.create_all(bind=engine)
+    import timebuckets
+    ddl_engine = get_engine('migrate')
+    if timebuckets.PARTITIONING_ENABLED:
+        timebuckets.create_partitioned_snapshots(ddl_engine)
+        timebuckets.ensure_partitions(ddl_engine)
+    Base.metadata.create_all(bind=ddl_engine)
+    upgrade_schema(ddl_engine)
+    if timebuckets.PARTITIONING_ENABLED:
+        timebuckets.drop_skipped_indexes(ddl_engine)
+
+def upgrade_schema(engine=None, dedupe=None):
+    """Bring existing tables up to the models; create_all() only creates missing tables.
+
+    A new unique index is not built over duplicate keys: the upgrade fails and
+    names them, unless dedupe (or SCHEMA_DEDUPE) allows keeping the latest row.
+    """
+    import timebuckets
+    engine = engine or get_engine('migrate')
+    dedupe = SCHEMA_DEDUPE if dedupe is None else dedupe
+    # Checked before begin(): the migrate pool holds a single connection
+    skipped_indexes = set(timebuckets.PARTITIONED_SKIP_INDEXES) if timebuckets.is_partitioned(engine) else set()
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {c['name']: c for c in inspector.get_columns(table.name)}
+            relaxed = []
+            for column in table.columns:
+                current = columns.get(column.name)
+                if current is None and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                elif current is not None and column.nullable and not current['nullable']:
+                    relaxed.append(column.name)
+            if relaxed and engine.dialect.name == 'postgresql':
+                for name in relaxed:
+                    conn.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {name} DROP NOT NULL'))
+            elif relaxed and engine.dialect.name == 'sqlite':
+                _rebuild_sqlite_table(conn, table, [c.name for c in table.columns if c.name in columns or c.nullable])
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes and index.name not in skipped_indexes:
+                    if index.unique:
+                        _resolve_duplicates(conn, table, index, dedupe)
+                    index.create(bind=conn)
+        for name in RETIRED_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+def _rebuild_sqlite_table(conn, table, column_names):
+    """Recreate a table from its model; SQLite cannot drop NOT NULL in place.
+
+    Copies the existing columns into a fresh table, then swaps it in. Indexes are
+    dropped with the old table and rebuilt by upgrade_schema().
+    """
+    rebuilt = f'_rebuild_{table.name}'
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect))
+    conn.execute(text(ddl.replace(f'CREATE TABLE {table.name} (', f'CREATE TABLE {rebuilt} (', 1)))
+    names = ', '.join(column_names)
+    conn.execute(text(f'INSERT INTO {rebuilt} ({names}) SELECT {names} FROM {table.name}'))
+    conn.execute(text(f'DROP TABLE {table.name}'))
+    conn.execute(text(f'ALTER TABLE {rebuilt} RENAME TO {table.name}'))
+
+def _resolve_duplicates(conn, table, index, dedupe):
+    """Refuse, or with dedupe keep the latest-inserted row per key, before a unique index is built"""
+    keys = ', '.join(column.name for column in index.columns)
+    duplicates = conn.execute(text(
+        f'SELECT {keys}, COUNT(*) FROM {table.name} GROUP BY {keys} HAVING COUNT(*) > 1 LIMIT 10'
+    )).all()
+    if not duplicates:
+        return
+    if not dedupe or 'id' not in table.columns:
+        sample = '; '.join(', '.join(str(v) for v in row[:-1]) + f' ({row[-1]} rows)' for row in duplicates)
+        raise RuntimeError(
+            f"Cannot create {index.name}: {table.name} has duplicate ({keys}) keys, e.g. {sample}. "
+            f"Remove them, or rerun with SCHEMA_DEDUPE=1 to keep the latest row per key."
+        )
+    result = conn.execute(text(
+        f'DELETE FROM {table.name} WHERE id NOT IN (SELECT MAX(id) FROM {table.name} GROUP BY {keys})'
+    ))
+    logger.warning("Removed %d duplicate %s rows before creating %s", result.rowcount, table.name, index.name)
 
 @contextmanager
-def get_db():
-    db = SessionLocal()
+def get_db(workload='write'):
+    db = get_session_factory(workload)()
     try:
         yield db
         db.commit()
@@ -36,5 +175,15 @@ def get_db():
     finally:
         db.close()
 
-def get_db_session():
-    return SessionLocal()
+@contextmanager
+def get_read_db(workload='dashboard'):
+    """Read-only session, routed to the replica for replica-backed workloads"""
+    db = get_session_factory(workload)()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.close()
+
+def get_db_session(workload='write'):
+    return get_session_factory(workload)()
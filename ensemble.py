@@ -0,0 +1,208 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from lazy_imports import lazy_import
+
+logger = logging.getLogger(__name__)
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+prophet = lazy_import('prophet')
+
+# history column -> forecast column prefix
+TARGETS = {
+    'aqi': 'aqi_forecast',
+    'total_cases': 'cases_forecast',
+    'hospitalizations': 'hosp_forecast',
+}
+
+QUANTILES = (0.1, 0.5, 0.9)
+MIN_HISTORY = 6
+RF_LAGS = 3
+
+
+def _linear_trend(series, horizon):
+    window = series[-min(len(series), 14):]
+    x = np.arange(len(window))
+    slope, intercept = np.polyfit(x, window, 1)
+    future = np.arange(len(window), len(window) + horizon)
+    return intercept + slope * future
+
+
+def _holt(series, horizon, alpha=0.5, beta=0.3):
+    level, trend = series[0], series[1] - series[0]
+    for value in series[1:]:
+        previous = level
+        level = alpha * value + (1 - alpha) * (level + trend)
+        trend = beta * (level - previous) + (1 - beta) * trend
+    return level + trend * np.arange(1, horizon + 1)
+
+
+def _random_forest(series, horizon):
+    from sklearn.ensemble import RandomForestRegressor
+
+    lags = min(RF_LAGS, len(series) - 2)
+    X = np.column_stack([series[i:len(series) - lags + i] for i in range(lags)])
+    y = series[lags:]
+    model = RandomForestRegressor(n_estimators=60, max_depth=6, random_state=0, n_jobs=1)
+    model.fit(X, y)
+    window = list(series[-lags:])
+    predictions = []
+    for _ in range(horizon):
+        value = float(model.predict(np.asarray(window[-lags:]).reshape(1, -1))[0])
+        predictions.append(value)
+        window.append(value)
+    return np.asarray(predictions)
+
+
+def _prophet(series, horizon, dates):
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    frame = pd.DataFrame({'ds': pd.to_datetime(dates), 'y': series})
+    model = prophet.Prophet(daily_seasonality=False, yearly_seasonality=False, weekly_seasonality=len(series) >= 14)
+    model.fit(frame)
+    future = model.make_future_dataframe(periods=horizon, include_history=False)
+    return model.predict(future)['yhat'].to_numpy()
+
+
+MODELS = {
+    'trend': lambda series, horizon, dates: _linear_trend(series, horizon),
+    'holt': lambda series, horizon, dates: _holt(series, horizon),
+    'random_forest': lambda series, horizon, dates: _random_forest(series, horizon),
+    'prophet': _prophet,
+}
+
+
+def _run_model(name, history, horizon):
+    """Backtest on a held-out tail, then fit on the full history.
+
+    Returns {target: (forecast, backtest_actual, backtest_prediction)}.
+    """
+    fit = MODELS[name]
+    dates = history['date'].to_numpy()
+    holdout = max(1, min(horizon, len(history) // 4))
+    results = {}
+    for column in TARGETS:
+        series = history[column].to_numpy(dtype=float)
+        backtest = fit(series[:-holdout], holdout, dates[:-holdout])
+        forecast = fit(series, horizon, dates)
+        results[column] = (np.asarray(forecast, dtype=float), series[-holdout:], np.asarray(backtest, dtype=float))
+    return results
+
+
+class EnsembleForecaster:
+    """CPU-only model ensemble with backtest-weighted combination and quantile bands.
+
+    Exposes the same generate_comprehensive_forecast / get_forecast_status
+    interface as ForecastingAgent; forecast() returns the status with the
+    frame, so concurrent callers need no lock. Models run concurrently in a
+    shared worker pool. Any model still running when the latency budget expires
+    is left out of the combination. A running thread cannot be cancelled, so
+    such a straggler keeps its worker until it finishes. While a model has
+    max_stragglers of them outstanding it is skipped, which keeps slow models
+    from filling the pool.
+    """
+
+    def __init__(self, models=tuple(MODELS), latency_budget=8.0, max_workers=None, max_stragglers=1):
+        self.models = tuple(models)
+        self.latency_budget = latency_budget
+        self.max_stragglers = max_stragglers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or min(8, (os.cpu_count() or 2)),
+            thread_name_prefix='ensemble'
+        )
+        self._stragglers = {}
+        self._stragglers_lock = threading.Lock()
+        self._status = 'Ensemble'
+        self.last_models = ()
+        self.last_weights = {}
+
+    def get_forecast_status(self):
+        return self._status
+
+    def stragglers(self):
+        """{model: runs still going after their caller gave up on them}"""
+        with self._stragglers_lock:
+            return {name: count for name, count in self._stragglers.items() if count}
+
+    def _straggler_done(self, name):
+        with self._stragglers_lock:
+            self._stragglers[name] -= 1
+
+    def _collect(self, history, horizon):
+        started = time.monotonic()
+        with self._stragglers_lock:
+            models = [name for name in self.models if self._stragglers.get(name, 0) < self.max_stragglers]
+        if len(models) < len(self.models):
+            logger.info("Ensemble skipping models with stragglers: %s", sorted(set(self.models) - set(models)))
+        futures = {self._executor.submit(_run_model, name, history, horizon): name for name in models}
+        done, pending = wait(futures, timeout=self.latency_budget)
+        for future in pending:
+            # cancel() only stops futures still queued; running ones are tracked until they end
+            if not future.cancel():
+                name = futures[future]
+                with self._stragglers_lock:
+                    self._stragglers[name] = self._stragglers.get(name, 0) + 1
+                future.add_done_callback(lambda _, name=name: self._straggler_done(name))
+        results = {}
+        for future in done:
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception:
+                logger.warning("Ensemble model %s failed", name, exc_info=True)
+        logger.debug("Ensemble collected %d/%d models in %.2fs", len(results), len(self.models), time.monotonic() - started)
+        return results
+
+    def _combine(self, results, column):
+        names = sorted(results)
+        errors = np.array([np.mean(np.abs(results[n][column][1] - results[n][column][2])) for n in names])
+        weights = 1.0 / np.maximum(errors, 1e-6)
+        weights /= weights.sum()
+
+        forecast = sum(w * results[n][column][0] for w, n in zip(weights, names))
+        backtest = sum(w * results[n][column][2] for w, n in zip(weights, names))
+        residuals = results[names[0]][column][1] - backtest
+        return forecast, residuals, dict(zip(names, weights.round(3).tolist()))
+
+    def forecast(self, historical_df, days=7):
+        """{'forecast': frame, 'status': str, 'models': names, 'weights': {column: {model: w}}}"""
+        history = historical_df.sort_values('date').reset_index(drop=True)
+        targets = list(TARGETS)
+        history[targets] = history[targets].astype(float).ffill().bfill().fillna(0.0)
+        if len(history) < MIN_HISTORY:
+            return {'forecast': pd.DataFrame(), 'status': 'Fallback', 'models': (), 'weights': {}}
+
+        results = self._collect(history, days)
+        if not results:
+            results = {'trend': _run_model('trend', history, days)}
+            status = 'Fallback'
+        else:
+            status = 'Ensemble' if len(results) == len(self.models) else 'Ensemble (partial)'
+
+        last_date = pd.to_datetime(history['date'].iloc[-1])
+        frame = pd.DataFrame({'date': pd.date_range(last_date + pd.Timedelta(days=1), periods=days, freq='D')})
+        steps = np.sqrt(np.arange(1, days + 1))
+        all_weights = {}
+
+        for column, prefix in TARGETS.items():
+            forecast, residuals, weights = self._combine(results, column)
+            all_weights[column] = weights
+            # Residual spread from the backtest, widened with the horizon
+            spread = np.quantile(residuals, QUANTILES) - np.median(residuals)
+            scale = steps / np.sqrt(np.mean(np.arange(1, len(residuals) + 1)))
+            p50 = np.clip(forecast, 0, None)
+            frame[prefix] = p50
+            frame[f'{prefix}_p10'] = np.clip(p50 + spread[0] * scale, 0, None)
+            frame[f'{prefix}_p50'] = p50
+            frame[f'{prefix}_p90'] = np.clip(p50 + spread[2] * scale, 0, None)
+        return {'forecast': frame, 'status': status, 'models': tuple(sorted(results)), 'weights': all_weights}
+
+    def generate_comprehensive_forecast(self, historical_df, days=7):
+        result = self.forecast(historical_df, days)
+        self._status = result['status']
+        self.last_models = result['models']
+        self.last_weights = result['weights']
+        return result['forecast']
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+CLUSTER_THRESHOLD = 200
+CACHE_SIZE = 8
+COORD_PRECISION = 4
+
+_html_cache = OrderedDict()
+_geojson_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+VERSION_FIELDS = ('city', 'lat', 'lon', 'risk_index', 'category', 'aqi', 'cases', 'color')
+
+
+def data_version(rows):
+    """Stable hash of the values that affect what the heatmap shows"""
+    digest = hashlib.sha1()
+    for row in sorted(rows, key=lambda r: r['city']):
+        values = []
+        for field in VERSION_FIELDS:
+            value = row.get(field)
+            if isinstance(value, float):
+                value = round(value, 2)
+            values.append(value)
+        digest.update(repr(values).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _cache_get(cache, key):
+    with _cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    return None
+
+
+def _cache_put(cache, key, value):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _popup(row):
+    return (
+        f"<b>{row['city']}</b><br>Risk: {row['risk_index']:.0f}/100"
+        f"<br>AQI: {row['aqi']:.0f}<br>Cases: {row['cases']:.0f}"
+    )
+
+
+def _city_feature(row):
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': [
+                round(float(row['lon']), COORD_PRECISION),
+                round(float(row['lat']), COORD_PRECISION)
+            ]
+        },
+        'properties': {
+            'city': row['city'],
+            'risk_index': round(float(row['risk_index']), 1),
+            'category': row['category'],
+            'aqi': round(float(row['aqi'])),
+            'cases': round(float(row['cases'])),
+            'color': row['color']
+        }
+    }
+
+
+def _cell_size(zoom):
+    return 360.0 / (2 ** (zoom + 2))
+
+
+def cluster_rows(rows, zoom):
+    """Group rows into grid cells sized for the given zoom level"""
+    size = _cell_size(zoom)
+    cells = {}
+    for row in rows:
+        key = (int(row['lat'] // size), int(row['lon'] // size))
+        cells.setdefault(key, []).append(row)
+    return list(cells.values())
+
+
+def _cluster_feature(members):
+    count = len(members)
+    lat = sum(float(m['lat']) for m in members) / count
+    lon = sum(float(m['lon']) for m in members) / count
+    worst = max(members, key=lambda m: m['risk_index'])
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': [round(lon, COORD_PRECISION), round(lat, COORD_PRECISION)]
+        },
+        'properties': {
+            'cluster': True,
+            'count': count,
+            'mean_risk_index': round(sum(float(m['risk_index']) for m in members) / count, 1),
+            'max_risk_index': round(float(worst['risk_index']), 1),
+            'category': worst['category'],
+            'color': worst['color'],
+            'total_cases': round(sum(float(m['cases']) for m in members))
+        }
+    }
+
+
+def build_feature_collection(rows, zoom=5, cluster_threshold=CLUSTER_THRESHOLD):
+    """GeoJSON FeatureCollection, clustered on a grid when there are many cities"""
+    if len(rows) <= cluster_threshold:
+        features = [_city_feature(row) for row in rows]
+    else:
+        features = []
+        for members in cluster_rows(rows, zoom):
+            if len(members) == 1:
+                features.append(_city_feature(members[0]))
+            else:
+                features.append(_cluster_feature(members))
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def heatmap_geojson(rows, zoom=5, version=None):
+    """Compact GeoJSON payload for the heatmap, cached per data version and zoom"""
+    version = version or data_version(rows)
+    key = (version, zoom)
+    cached = _cache_get(_geojson_cache, key)
+    if cached is None:
+        collection = build_feature_collection(rows, zoom=zoom)
+        cached = json.dumps(collection, separators=(',', ':'))
+        _cache_put(_geojson_cache, key, cached)
+    return cached
+
+
+def build_map(rows, zoom_start=5, cluster_threshold=CLUSTER_THRESHOLD):
+    import folium
+
+    lat = sum(float(r['lat']) for r in rows) / len(rows)
+    lon = sum(float(r['lon']) for r in rows) / len(rows)
+    m = folium.Map(location=[lat, lon], zoom_start=zoom_start, tiles='OpenStreetMap')
+
+    layer = m
+    if len(rows) > cluster_threshold:
+        from folium.plugins import MarkerCluster
+        layer = MarkerCluster(name='Cities').add_to(m)
+
+    for row in rows:
+        folium.CircleMarker(
+            location=[row['lat'], row['lon']],
+            radius=max(3, row['risk_index'] / 5),
+            popup=_popup(row),
+            color=row['color'],
+            fill=True,
+            fillColor=row['color'],
+            fillOpacity=0.6,
+            weight=2
+        ).add_to(layer)
+    return m
+
+
+def render_map_html(rows, zoom_start=5, version=None):
+    """Rendered folium HTML, rebuilt only when the data version changes"""
+    version = version or data_version(rows)
+    key = (version, zoom_start)
+    cached = _cache_get(_html_cache, key)
+    if cached is None:
+        cached = build_map(rows, zoom_start=zoom_start).get_root().render()
+        _cache_put(_html_cache, key, cached)
+    return cached
+
+
+def clear_cache():
+    with _cache_lock:
+        _html_cache.clear()
+        _geojson_cache.clear()
@@ -0,0 +1,117 @@
+import csv
+import io
+
+from sqlalchemy import select, tuple_
+
+from models import AcceptedPlan, AlertSent
+
+ALERT_COLUMNS = (
+    AlertSent.id,
+    AlertSent.timestamp,
+    AlertSent.alert_type,
+    AlertSent.city,
+    AlertSent.severity,
+    AlertSent.recipients_count,
+    AlertSent.delivery_status,
+)
+
+PLAN_COLUMNS = (
+    AcceptedPlan.id,
+    AcceptedPlan.timestamp,
+    AcceptedPlan.city,
+    AcceptedPlan.severity,
+    AcceptedPlan.beds,
+    AcceptedPlan.nurses,
+    AcceptedPlan.doctors,
+    AcceptedPlan.total_cost_inr,
+)
+
+SOURCES = {
+    'alerts': (AlertSent, ALERT_COLUMNS),
+    'plans': (AcceptedPlan, PLAN_COLUMNS),
+}
+
+
+def keyset_after(timestamp_column, id_column, cursor):
+    """Filter for rows strictly older than cursor=(timestamp, id) in DESC order.
+
+    A row-value comparison, so Postgres uses it as an index condition on
+    (timestamp, id) and starts the scan at the cursor instead of filtering
+    from the newest row.
+    """
+    timestamp, row_id = cursor
+    return tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id)
+
+
+def history_statement(source, limit=20, cursor=None, city=None, start=None, end=None, alert_type=None):
+    """SELECT for one page of history; fetches limit + 1 rows to detect a next page"""
+    model, columns = SOURCES[source]
+    statement = select(*columns)
+    if city is not None:
+        statement = statement.where(model.city == city)
+    if start is not None:
+        statement = statement.where(model.timestamp >= start)
+    if end is not None:
+        statement = statement.where(model.timestamp < end)
+    if alert_type is not None and source == 'alerts':
+        statement = statement.where(AlertSent.alert_type == alert_type)
+    if cursor is not None:
+        statement = statement.where(keyset_after(model.timestamp, model.id, cursor))
+    return statement.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1)
+
+
+def split_page(rows, limit):
+    """(rows, next_cursor) from a limit + 1 fetch"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1].timestamp, rows[-1].id)
+    return rows, next_cursor
+
+
+def history_page(db, source, limit=20, cursor=None, **filters):
+    """One page of history rows, newest first.
+
+    Returns (rows, next_cursor). Pass next_cursor back for the following page;
+    it is None on the last page. Rows are column projections, not ORM objects.
+    """
+    rows = db.execute(history_statement(source, limit=limit, cursor=cursor, **filters)).all()
+    return split_page(rows, limit)
+
+
+def alert_history(db, limit=20, cursor=None, **filters):
+    return history_page(db, 'alerts', limit=limit, cursor=cursor, **filters)
+
+
+def plan_history(db, limit=10, cursor=None, **filters):
+    return history_page(db, 'plans', limit=limit, cursor=cursor, **filters)
+
+
+def iter_history(db, source, batch_size=1000, **filters):
+    """Yield every matching row page by page so memory stays bounded"""
+    cursor = None
+    while True:
+        rows, cursor = history_page(db, source, limit=batch_size, cursor=cursor, **filters)
+        yield from rows
+        if cursor is None:
+            break
+
+
+def csv_header(source):
+    _, columns = SOURCES[source]
+    return [column.key for column in columns]
+
+
+def stream_csv(db, source, batch_size=1000, **filters):
+    """Yield CSV text chunks (header first) for a history export"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(csv_header(source))
+
+    for i, row in enumerate(iter_history(db, source, batch_size=batch_size, **filters), 1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,387 @@
+import abc
+import csv
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+FLOAT_FIELDS = ('aqi', 'pm25', 'pm10', 'temperature', 'humidity', 'wind_speed')
+INT_FIELDS = ('total_cases', 'respiratory_cases', 'hospitalizations')
+
+# Plausible ranges; readings outside them are sensor faults and are dropped
+VALID_RANGES = {
+    'aqi': (0, 1000),
+    'pm25': (0, 1500),
+    'pm10': (0, 2000),
+    'temperature': (-30, 60),
+    'humidity': (0, 100),
+    'wind_speed': (0, 150),
+}
+
+# Feeds that do not say otherwise are sensor streams reporting every 15 minutes
+DEFAULT_RESOLUTION_MINUTES = 15
+
+DEFAULT_DEAD_LETTER_PATH = '.ingestion.dead.jsonl'
+WRITE_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+_STOP = object()
+
+
+class ReadingSource(abc.ABC):
+    """Base class for feeds; iterate to receive raw reading dicts"""
+
+    name = 'source'
+    resolution_minutes = DEFAULT_RESOLUTION_MINUTES
+
+    @abc.abstractmethod
+    def __iter__(self):
+        """Yield raw reading dicts"""
+
+
+class IterableSource(ReadingSource):
+    def __init__(self, readings, name='memory', resolution_minutes=DEFAULT_RESOLUTION_MINUTES):
+        self.readings = readings
+        self.name = name
+        self.resolution_minutes = resolution_minutes
+
+    def __iter__(self):
+        return iter(self.readings)
+
+
+class ReplaySource(ReadingSource):
+    """Replays a CSV or JSON-lines capture, optionally paced by its timestamps.
+
+    speed=None replays as fast as possible; speed=60 plays an hour per minute.
+    """
+
+    def __init__(self, path, speed=None, time_field='date', name='replay',
+                 resolution_minutes=DEFAULT_RESOLUTION_MINUTES):
+        self.path = path
+        self.speed = speed
+        self.time_field = time_field
+        self.name = name
+        self.resolution_minutes = resolution_minutes
+
+    def _rows(self):
+        with open(self.path, 'r', encoding='utf-8', newline='') as handle:
+            if self.path.endswith(('.jsonl', '.ndjson')):
+                for line in handle:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(handle)
+
+    def __iter__(self):
+        if not self.speed:
+            yield from self._rows()
+            return
+        first_event = None
+        started = time.monotonic()
+        for row in self._rows():
+            event_time = _parse_time(row.get(self.time_field))
+            if event_time is not None:
+                if first_event is None:
+                    first_event = event_time
+                due = (event_time - first_event).total_seconds() / self.speed
+                delay = due - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield row
+
+
+def _parse_time(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _number(value, cast):
+    if value is None or value == '':
+        return None
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def clean_reading(raw, source_name='stream', resolution_minutes=DEFAULT_RESOLUTION_MINUTES):
+    """Normalise one raw reading into a data_snapshots row, or None if unusable.
+
+    A reading's own resolution_minutes field wins over the feed's.
+    """
+    city = raw.get('city')
+    if not city:
+        return None
+    city = str(city).strip()
+    date = _parse_time(raw.get('date') or raw.get('timestamp'))
+    if not city or date is None:
+        return None
+
+    row = {
+        'city': city,
+        'date': date,
+        'weather_condition': raw.get('weather_condition') or None,
+        'data_source': raw.get('data_source') or source_name,
+        'resolution_minutes': _number(raw.get('resolution_minutes'), int) or resolution_minutes,
+    }
+    for field in FLOAT_FIELDS:
+        value = _number(raw.get(field), float)
+        if value is not None:
+            low, high = VALID_RANGES[field]
+            if not low <= value <= high:
+                value = None
+        row[field] = value
+    for field in INT_FIELDS:
+        value = _number(raw.get(field), int)
+        row[field] = value if value is None or value >= 0 else None
+
+    if all(row[field] is None for field in FLOAT_FIELDS + INT_FIELDS):
+        return None
+    return row
+
+
+class RecentKeys:
+    """Bounded set of (city, date) keys already accepted"""
+
+    def __init__(self, capacity=500000):
+        self.capacity = capacity
+        self._keys = OrderedDict()
+
+    def discard(self, key):
+        self._keys.pop(key, None)
+
+    def add(self, key):
+        """True if the key is new"""
+        if key in self._keys:
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+        return True
+
+
+class DatabaseSink:
+    """Writes micro-batches into data_snapshots with one multi-row INSERT"""
+
+    def __init__(self, session_factory=None):
+        if session_factory is None:
+            from database import get_db_session
+            session_factory = lambda: get_db_session('background')
+        self.session_factory = session_factory
+
+    def _insert(self, db):
+        if db.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert
+
+    def write(self, rows):
+        """Insert rows, skipping (city, date) keys already stored; returns rows inserted"""
+        from models import DataSnapshot
+
+        db = self.session_factory()
+        try:
+            import timebuckets
+            if timebuckets.PARTITIONING_ENABLED:
+                from database import get_engine
+                # Backfills can reach months the scheduled maintenance never created
+                dates = [row['date'] for row in rows]
+                timebuckets.cover_range(get_engine('migrate'), min(dates), max(dates))
+            # The unique (city, date) index catches replays after a restart,
+            # which the in-memory key set cannot see
+            statement = self._insert(db)(DataSnapshot).values(rows).on_conflict_do_nothing(
+                index_elements=[DataSnapshot.city, DataSnapshot.date]
+            )
+            inserted = db.execute(statement).rowcount
+            db.commit()
+            return inserted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+class NullSink:
+    def __init__(self):
+        self.rows = 0
+
+    def write(self, rows):
+        self.rows += len(rows)
+        return len(rows)
+
+
+class IngestionPipeline:
+    """Source -> clean -> dedupe -> bounded buffer -> micro-batched writes.
+
+    The reader thread cleans readings in chunks and puts them on a bounded
+    queue. When the writer falls behind, put() blocks and the source stops
+    being read (backpressure). The writer flushes when it has batch_size rows
+    or when max_latency seconds have passed since the oldest unwritten row.
+    Failed batches are retried with backoff, then appended to a JSON-lines
+    dead-letter file that ReplaySource can re-ingest.
+    """
+
+    def __init__(self, source, sink=None, batch_size=1000, max_latency=1.0,
+                 buffer_chunks=64, chunk_size=256, dedupe_capacity=500000,
+                 retries=WRITE_RETRIES, retry_backoff=RETRY_BACKOFF, dead_letter_path=DEFAULT_DEAD_LETTER_PATH,
+                 aggregate_refresher=None):
+        self.source = source
+        self.aggregate_refresher = aggregate_refresher
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.dead_letter_path = dead_letter_path
+        self.sink = sink or DatabaseSink()
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.chunk_size = chunk_size
+        self.buffer = queue.Queue(maxsize=buffer_chunks)
+        self.seen = RecentKeys(dedupe_capacity)
+        self.stats = {
+            'received': 0,
+            'rejected': 0,
+            'duplicates': 0,
+            'written': 0,
+            'batches': 0,
+            'write_errors': 0,
+            'retries': 0,
+            'dead_lettered': 0,
+            'backpressure_waits': 0,
+        }
+        self._reader = None
+        self._writer = None
+        self._stopped = threading.Event()
+        self.started_at = None
+        self.finished_at = None
+
+    def _put(self, chunk):
+        try:
+            self.buffer.put_nowait(chunk)
+        except queue.Full:
+            self.stats['backpressure_waits'] += 1
+            self.buffer.put(chunk)
+
+    def _read(self):
+        source_name = getattr(self.source, 'name', 'stream')
+        resolution = getattr(self.source, 'resolution_minutes', DEFAULT_RESOLUTION_MINUTES)
+        chunk = []
+        try:
+            for raw in self.source:
+                if self._stopped.is_set():
+                    break
+                self.stats['received'] += 1
+                row = clean_reading(raw, source_name, resolution)
+                if row is None:
+                    self.stats['rejected'] += 1
+                    continue
+                if not self.seen.add((row['city'], row['date'])):
+                    self.stats['duplicates'] += 1
+                    continue
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self._put(chunk)
+                    chunk = []
+        finally:
+            if chunk:
+                self._put(chunk)
+            self.buffer.put(_STOP)
+
+    def _flush(self, batch):
+        """Write a batch, retrying with backoff; a batch that still fails is dead-lettered"""
+        for attempt in range(self.retries + 1):
+            try:
+                inserted = self.sink.write(batch)
+            except Exception as error:
+                self.stats['write_errors'] += 1
+                if attempt < self.retries and not self._stopped.is_set():
+                    self.stats['retries'] += 1
+                    logger.warning("Ingestion batch of %d rows failed, retrying: %s", len(batch), error)
+                    self._stopped.wait(self.retry_backoff * 2 ** attempt)
+                    continue
+                logger.exception("Ingestion batch of %d rows failed", len(batch))
+                self._dead_letter(batch, error)
+                return
+            inserted = len(batch) if inserted is None else inserted
+            self.stats['written'] += inserted
+            self.stats['duplicates'] += len(batch) - inserted
+            self.stats['batches'] += 1
+            if self.aggregate_refresher is not None and inserted:
+                dates = [row['date'] for row in batch]
+                self.aggregate_refresher.mark({row['city'] for row in batch}, min(dates), max(dates))
+            return
+
+    def _dead_letter(self, batch, error):
+        from plan_store import json_default
+
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as journal:
+            for row in batch:
+                journal.write(json.dumps(dict(row, error=str(error)), default=json_default) + '\n')
+        # Forget the keys, so a replay of the dead-letter file or source is not deduped away
+        for row in batch:
+            self.seen.discard((row['city'], row['date']))
+        self.stats['dead_lettered'] += len(batch)
+
+    def _write(self):
+        batch = []
+        oldest = None
+        while True:
+            timeout = None if oldest is None else max(0.0, self.max_latency - (time.monotonic() - oldest))
+            try:
+                item = self.buffer.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item:
+                if oldest is None:
+                    oldest = time.monotonic()
+                batch.extend(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() - oldest >= self.max_latency):
+                self._flush(batch)
+                batch = []
+                oldest = None
+        if batch:
+            self._flush(batch)
+        self.finished_at = time.monotonic()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._writer = threading.Thread(target=self._write, name='ingest-writer', daemon=True)
+        self._reader = threading.Thread(target=self._read, name='ingest-reader', daemon=True)
+        self._writer.start()
+        self._reader.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def join(self, timeout=None):
+        self._reader.join(timeout)
+        self._writer.join(timeout)
+        return self.stats
+
+    def run(self):
+        """Ingest until the source is exhausted; returns stats"""
+        self.start()
+        return self.join()
+
+    @property
+    def throughput(self):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or time.monotonic()
+        return self.stats['received'] / max(end - self.started_at, 1e-9)
@@ -0,0 +1,45 @@
+import importlib
+import time
+
+import_timings = {}
+
+
+class LazyModule:
+    """Module proxy that defers the real import until an attribute is used"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            import_timings.setdefault(self._name, time.perf_counter() - start)
+        return self._module
+
+    @property
+    def is_loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def lazy_attr(module_name, attr):
+    """Return a callable that resolves module_name.attr on first call"""
+    module = lazy_import(module_name)
+
+    def _resolve(*args, **kwargs):
+        return getattr(module, attr)(*args, **kwargs)
+
+    _resolve.__name__ = attr
+    return _resolve
@@ -1,15 +1,42 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Boolean, Float, LargeBinary, ForeignKey, Index
 from datetime import datetime
 from database import Base
 
+class PlanBlob(Base):
+    __tablename__ = 'plan_blobs'
+    
+    content_hash = Column(String(64), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class AcceptedPlan(Base):
     __tablename__ = 'accepted_plans'
+    __table_args__ = (
+        Index('ix_accepted_plans_city_timestamp', 'city', 'timestamp', 'id'),
+        Index('ix_accepted_plans_timestamp', 'timestamp', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     city = Column(String(100), nullable=False, index=True)
     severity = Column(String(50), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
-    plan_data = Column(JSON, nullable=False)
+    plan_data = Column(JSON, nullable=True)
+    plan_hash = Column(String(64), ForeignKey('plan_blobs.content_hash'), nullable=True)
+    nurses = Column(Integer)
+    doctors = Column(Integer)
+    support_staff = Column(Integer)
+    beds = Column(Integer)
+    oxygen_cylinders = Column(Integer)
+    ventilators = Column(Integer)
+    ppe_kits = Column(Integer)
+    staff_cost_inr = Column(Integer)
+    resource_cost_inr = Column(Integer)
+    total_cost_inr = Column(Integer)
+    respiratory_drugs = Column(Integer)
+    antibiotics = Column(Integer)
+    antivirals = Column(Integer)
+    general_medicines = Column(Integer)
+    period = Column(String(50))
     user_id = Column(Integer, nullable=True)
     
     def to_dict(self):
@@ -19,6 +46,8 @@ class AcceptedPlan(Base):
             'severity': self.severity,
             'timestamp': self.timestamp,
             'plan_data': self.plan_data,
+            'plan_hash': self.plan_hash,
+            'total_cost_inr': self.total_cost_inr,
             'user_id': self.user_id
         }
 
@@ -44,6 +73,10 @@ class RejectedPlan(Base):
 
 class AlertSent(Base):
     __tablename__ = 'alerts_sent'
+    __table_args__ = (
+        Index('ix_alerts_sent_city_timestamp', 'city', 'timestamp', 'id'),
+        Index('ix_alerts_sent_timestamp', 'timestamp', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     alert_type = Column(String(50), nullable=False)
@@ -66,6 +99,31 @@ class AlertSent(Base):
             'delivery_status': self.delivery_status
         }
 
+class AlertState(Base):
+    """Last alert level per city and channel; drives dedup and escalation"""
+    __tablename__ = 'alert_states'
+    __table_args__ = (
+        Index('ix_alert_states_type_city', 'alert_type', 'city', unique=True),
+        Index('ix_alert_states_type_rank', 'alert_type', 'level_rank'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    alert_type = Column(String(50), nullable=False)
+    city = Column(String(100), nullable=False)
+    level = Column(String(50), nullable=False)
+    level_rank = Column(Integer, nullable=False)
+    last_sent_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'alert_type': self.alert_type,
+            'city': self.city,
+            'level': self.level,
+            'last_sent_at': self.last_sent_at,
+            'updated_at': self.updated_at
+        }
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -97,10 +155,15 @@ class User(Base):
 
 class DataSnapshot(Base):
     __tablename__ = 'data_snapshots'
+    __table_args__ = (
+        Index('ux_data_snapshots_city_date', 'city', 'date', unique=True),
+        Index('ix_data_snapshots_date', 'date'),
+        Index('ix_data_snapshots_created_at', 'created_at', 'id'),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    city = Column(String(100), nullable=False, index=True)
-    date = Column(DateTime, nullable=False, index=True)
+    id = Column(Integer, primary_key=True)
+    city = Column(String(100), nullable=False)
+    date = Column(DateTime, nullable=False)
     aqi = Column(Float)
     pm25 = Column(Float)
     pm10 = Column(Float)
@@ -112,6 +175,7 @@ class DataSnapshot(Base):
     hospitalizations = Column(Integer)
     weather_condition = Column(String(100))
     data_source = Column(String(50), default='csv')
+    resolution_minutes = Column(Integer, default=1440)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -119,6 +183,7 @@ class DataSnapshot(Base):
             'id': self.id,
             'city': self.city,
             'date': self.date,
+            'resolution_minutes': self.resolution_minutes,
             'aqi': self.aqi,
             'pm25': self.pm25,
             'pm10': self.pm10,
@@ -132,3 +197,74 @@ class DataSnapshot(Base):
             'data_source': self.data_source,
             'created_at': self.created_at
         }
+
+class ChatMessage(Base):
+    __tablename__ = 'chat_messages'
+    __table_args__ = (
+        Index('ix_chat_messages_session_seq', 'session_id', 'seq'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(64), nullable=False)
+    seq = Column(Integer, nullable=False)
+    role = Column(String(20), nullable=False)
+    content = Column(Text, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'seq': self.seq,
+            'role': self.role,
+            'content': self.content,
+            'timestamp': self.timestamp
+        }
+
+class CityRegion(Base):
+    __tablename__ = 'city_regions'
+    
+    city = Column(String(100), primary_key=True)
+    district = Column(String(100), nullable=False, index=True)
+    state = Column(String(100), nullable=False, index=True)
+    
+    def to_dict(self):
+        return {
+            'city': self.city,
+            'district': self.district,
+            'state': self.state
+        }
+
+class RegionAggregate(Base):
+    __tablename__ = 'region_aggregates'
+    __table_args__ = (
+        Index('ix_region_aggregates_level_region_date', 'level', 'region', 'date', unique=True),
+        Index('ix_region_aggregates_level_date', 'level', 'date'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    level = Column(String(20), nullable=False)
+    region = Column(String(100), nullable=False)
+    date = Column(DateTime, nullable=False)
+    city_count = Column(Integer)
+    aqi_mean = Column(Float)
+    aqi_max = Column(Float)
+    pm25_mean = Column(Float)
+    total_cases = Column(Integer)
+    respiratory_cases = Column(Integer)
+    hospitalizations = Column(Integer)
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'level': self.level,
+            'region': self.region,
+            'date': self.date,
+            'city_count': self.city_count,
+            'aqi_mean': self.aqi_mean,
+            'aqi_max': self.aqi_max,
+            'pm25_mean': self.pm25_mean,
+            'total_cases': self.total_cases,
+            'respiratory_cases': self.respiratory_cases,
+            'hospitalizations': self.hospitalizations
+        }
@@ -0,0 +1,340 @@
+import hashlib
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, text
+
+from models import DataSnapshot
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'data_snapshots_changed'
+
+# How often a city's current reading is re-fetched to detect data the change feed cannot see
+SOURCE_TTL = 60.0
+
+
+class VersionedResultCache:
+    """In-process store of node results tagged with the input version they were built from"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return True, entry[1]
+        return False, None
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+
+    def discard_city(self, city):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == city]:
+                del self._entries[key]
+
+    def lock(self, key):
+        """Cross-process single-flight hook; the per-city lock already covers one process"""
+        return nullcontext()
+
+
+def _history(agents, city, deps, history_days=14, **_):
+    from timebuckets import ensure_daily
+
+    history = None
+    if agents.get('timeseries') is not None:
+        history = agents['timeseries'].history(city, days=history_days)
+    if history is None:
+        history = agents['data'].get_historical_data(city, days=history_days)
+    # Sub-daily snapshots roll up to the one-row-per-day frame the agents expect
+    return ensure_daily(history)
+
+
+def _current(agents, city, deps, **_):
+    return agents['data'].get_current_data(city)
+
+
+def _spike(agents, city, deps, **_):
+    return agents['spike'].detect_all_spikes(deps['history'])
+
+
+def _risk(agents, city, deps, **_):
+    if not deps['current']:
+        return None
+    return agents['health_index'].calculate_health_risk_index(deps['current'], deps['history'])
+
+
+def _forecast(agents, city, deps, forecast_days=7, forecast_mode='single', **_):
+    if forecast_mode == 'ensemble' and agents.get('ensemble'):
+        result = agents['ensemble'].forecast(deps['history'], forecast_days)
+        return {'forecast': result['forecast'], 'status': result['status']}
+    forecaster = agents['forecasting']
+    with agents['_forecast_lock']:
+        # get_forecast_status() reports on the last call, so read it under the same lock
+        forecast_df = forecaster.generate_comprehensive_forecast(deps['history'], forecast_days)
+        status = forecaster.get_forecast_status()
+    return {'forecast': forecast_df, 'status': status}
+
+
+def _plan(agents, city, deps, **_):
+    return agents['planner'].generate_hospital_plan(
+        deps['spike']['overall_severity'], deps['forecast']['forecast']
+    )
+
+
+# node -> (dependencies, compute function, parameters the node reads)
+NODES = {
+    'current': ((), _current, ()),
+    'history': ((), _history, ('history_days',)),
+    'spike': (('history',), _spike, ()),
+    'risk': (('current', 'history'), _risk, ()),
+    'forecast': (('history',), _forecast, ('forecast_days', 'forecast_mode')),
+    'plan': (('spike', 'forecast'), _plan, ()),
+}
+
+
+class RecomputePipeline:
+    """Per-city dependency graph over agent outputs.
+
+    Results are cached against a per-city data version. invalidate(city) bumps
+    that city's version, so only its spike, risk, forecast and plan results are
+    rebuilt, and only when next requested or warmed.
+
+    The data agent does not necessarily read data_snapshots, so the change feed
+    alone cannot see every update. At most every source_ttl seconds per city the
+    current reading is re-fetched and fingerprinted; a different fingerprint (or
+    a new UTC day) invalidates the city as well.
+    """
+
+    def __init__(self, data_agent, forecasting_agent, spike_agent, planner_agent, health_index,
+                 cache=None, ensemble_forecaster=None, source_ttl=SOURCE_TTL, timeseries=None):
+        self.agents = {
+            'data': data_agent,
+            'timeseries': timeseries,
+            'forecasting': forecasting_agent,
+            'ensemble': ensemble_forecaster,
+            'spike': spike_agent,
+            'planner': planner_agent,
+            'health_index': health_index,
+            '_forecast_lock': threading.Lock(),
+        }
+        self.cache = cache or VersionedResultCache()
+        self._versions = defaultdict(int)
+        self._city_locks = defaultdict(threading.RLock)
+        self._locks_guard = threading.Lock()
+        self.source_ttl = source_ttl
+        self._checked_at = {}
+        self._fingerprints = {}
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def version(self, city):
+        return self._versions[city]
+
+    def _lock_for(self, city):
+        with self._locks_guard:
+            return self._city_locks[city]
+
+    def _params_for(self, node, params):
+        names = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            deps, _, reads = NODES[current]
+            names.update(reads)
+            stack.extend(deps)
+        return tuple(sorted((name, params[name]) for name in names if name in params))
+
+    def _check_sources(self, city):
+        if time.monotonic() - self._checked_at.get(city, float('-inf')) < self.source_ttl:
+            return
+        with self._lock_for(city):
+            if time.monotonic() - self._checked_at.get(city, float('-inf')) < self.source_ttl:
+                return
+            current = self.agents['data'].get_current_data(city)
+            raw = repr((datetime.utcnow().date(), sorted((current or {}).items())))
+            fingerprint = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+            previous = self._fingerprints.get(city)
+            self._fingerprints[city] = fingerprint
+            self._checked_at[city] = time.monotonic()
+            if previous is not None and previous != fingerprint:
+                self.invalidate(city)
+            # The reading just fetched is the current node's value for this version
+            self.cache.put(self._key('current', city, ()), self._versions[city], current)
+
+    def _key(self, node, city, params):
+        # The source fingerprint rides along so a shared cache only hands a result
+        # to replicas that fingerprinted the same data
+        return (city, node, params + (('source', self._fingerprints.get(city)),))
+
+    def get(self, node, city, **params):
+        self._check_sources(city)
+        version = self._versions[city]
+        key = self._key(node, city, self._params_for(node, params))
+        hit, value = self.cache.get(key, version)
+        if hit:
+            self.stats['hits'] += 1
+            return value
+
+        with self._lock_for(city), self.cache.lock(key):
+            hit, value = self.cache.get(key, version)
+            if hit:
+                self.stats['hits'] += 1
+                return value
+            self.stats['misses'] += 1
+            deps, compute, _ = NODES[node]
+            inputs = {dep: self.get(dep, city, **params) for dep in deps}
+            value = compute(self.agents, city, inputs, **params)
+            self.cache.put(key, version, value)
+            return value
+
+    def invalidate(self, city):
+        self._versions[city] += 1
+        self.stats['invalidations'] += 1
+        self.cache.discard_city(city)
+
+    def warm(self, city, nodes=('risk', 'plan'), **params):
+        for node in nodes:
+            self.get(node, city, **params)
+
+
+class PollingChangeSource:
+    """Detects new snapshots from per-city row counts over a created_at lookback window.
+
+    created_at is set at insert time, not commit time, so a transaction that
+    commits late can surface rows older than the newest one already seen. Each
+    poll counts rows per city from the previous poll's floor and reports cities
+    whose count moved; only one row per city comes back.
+    The floor trails the high-water created_at by lookback, so transactions
+    that commit more than lookback seconds late are still missed.
+    """
+
+    def __init__(self, session_factory, since=None, lookback=120.0):
+        self.session_factory = session_factory
+        self.lookback = timedelta(seconds=lookback)
+        self.high_water = since or datetime.utcnow()
+        self._floor = self.high_water - self.lookback
+        self._counts = {}
+
+    def poll(self):
+        floor = self._floor
+        next_floor = max(floor, self.high_water - self.lookback)
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(
+                    DataSnapshot.city,
+                    func.count().label('count'),
+                    func.max(DataSnapshot.created_at).label('latest'),
+                    func.sum(case((DataSnapshot.created_at >= next_floor, 1), else_=0)).label('retained'),
+                )
+                .filter(DataSnapshot.created_at >= floor)
+                .group_by(DataSnapshot.city)
+                .all()
+            )
+        finally:
+            db.close()
+        changed = {row.city for row in rows if row.count != self._counts.get(row.city, 0)}
+        for row in rows:
+            self.high_water = max(self.high_water, row.latest)
+        # Counts kept from next_floor up, the range the next poll compares against
+        self._counts = {row.city: int(row.retained) for row in rows if row.retained}
+        self._floor = next_floor
+        return changed
+
+
+class PgNotifyChangeSource:
+    """LISTEN/NOTIFY change feed; install_trigger() adds the notifying trigger"""
+
+    def __init__(self, engine, channel=NOTIFY_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._conn = None
+
+    def install_trigger(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+                CREATE OR REPLACE FUNCTION notify_data_snapshot() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM pg_notify('{self.channel}', NEW.city);
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """))
+            conn.execute(text("DROP TRIGGER IF EXISTS data_snapshots_notify ON data_snapshots"))
+            conn.execute(text("""
+                CREATE TRIGGER data_snapshots_notify
+                AFTER INSERT OR UPDATE ON data_snapshots
+                FOR EACH ROW EXECUTE FUNCTION notify_data_snapshot()
+            """))
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self.engine.raw_connection()
+            raw = self._conn.driver_connection
+            raw.set_isolation_level(0)
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+        return self._conn.driver_connection
+
+    def poll(self, timeout=1.0):
+        raw = self._connection()
+        if select.select([raw], [], [], timeout) == ([], [], []):
+            return set()
+        raw.poll()
+        cities = set()
+        while raw.notifies:
+            cities.add(raw.notifies.pop(0).payload)
+        return cities
+
+
+class ChangeWatcher:
+    """Background thread that invalidates (and optionally re-warms) changed cities"""
+
+    def __init__(self, pipeline, source, interval=5.0, warm_params=None, listeners=()):
+        self.pipeline = pipeline
+        self.source = source
+        self.listeners = tuple(listeners)
+        self.interval = interval
+        self.warm_params = warm_params
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='change-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def check(self):
+        changed = self.source.poll()
+        for city in changed:
+            self.pipeline.invalidate(city)
+            if self.warm_params is not None:
+                self.pipeline.warm(city, **self.warm_params)
+        if changed:
+            # Listeners receive the changed cities, e.g. AggregateRefresher.mark_recent
+            for listener in self.listeners:
+                listener(changed)
+        return changed
+
+    def _run(self):
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Change watcher poll failed")
+            self._stopped.wait(max(0.0, self.interval - (time.monotonic() - started)))
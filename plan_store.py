@@ -0,0 +1,95 @@
+import copy
+import hashlib
+import json
+import zlib
+
+from models import AcceptedPlan, PlanBlob
+
+# Typed column -> path inside the hospital_plan dict. Everything that varies per
+# forecast lives here, so the hashed remainder is shared by plans of one severity.
+PLAN_COLUMNS = {
+    'nurses': ('staff_requirements', 'nurses'),
+    'doctors': ('staff_requirements', 'doctors'),
+    'support_staff': ('staff_requirements', 'support_staff'),
+    'beds': ('resource_requirements', 'beds'),
+    'oxygen_cylinders': ('resource_requirements', 'oxygen_cylinders'),
+    'ventilators': ('resource_requirements', 'ventilators'),
+    'ppe_kits': ('resource_requirements', 'ppe_kits'),
+    'staff_cost_inr': ('estimated_costs', 'staff_cost_inr'),
+    'resource_cost_inr': ('estimated_costs', 'resource_cost_inr'),
+    'total_cost_inr': ('estimated_costs', 'total_estimated_cost_inr'),
+    'respiratory_drugs': ('resource_requirements', 'medicines', 'respiratory_drugs'),
+    'antibiotics': ('resource_requirements', 'medicines', 'antibiotics'),
+    'antivirals': ('resource_requirements', 'medicines', 'antivirals'),
+    'general_medicines': ('resource_requirements', 'medicines', 'general_medicines'),
+    'period': ('estimated_costs', 'period'),
+}
+
+TEXT_COLUMNS = ('period',)
+
+
+def json_default(value):
+    """json.dumps default: numpy scalars from agent output serialise as plain numbers"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _canonical_json(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), default=json_default).encode('utf-8')
+
+
+def split_plan(plan):
+    """Separate the typed column values from the remainder of the plan"""
+    remainder = copy.deepcopy(plan)
+    remainder.pop('severity', None)
+    remainder.pop('city', None)
+    columns = {}
+    for column, path in PLAN_COLUMNS.items():
+        values = remainder
+        for section in path[:-1]:
+            values = values.get(section) if isinstance(values, dict) else None
+        if isinstance(values, dict) and path[-1] in values:
+            value = values.pop(path[-1])
+            columns[column] = str(value) if column in TEXT_COLUMNS else int(value)
+    return columns, remainder
+
+
+def _store_blob(db, remainder):
+    raw = _canonical_json(remainder)
+    content_hash = hashlib.sha256(raw).hexdigest()
+    if db.get(PlanBlob, content_hash) is None:
+        db.add(PlanBlob(content_hash=content_hash, data=zlib.compress(raw, 6)))
+        db.flush()
+    return content_hash
+
+
+def save_accepted_plan(db, city, plan, user_id=None):
+    columns, remainder = split_plan(plan)
+    accepted = AcceptedPlan(
+        city=city,
+        severity=plan['severity'],
+        plan_hash=_store_blob(db, remainder),
+        user_id=user_id,
+        **columns
+    )
+    db.add(accepted)
+    return accepted
+
+
+def load_plan(db, accepted):
+    """Rebuild the full hospital_plan dict for an accepted plan row"""
+    if accepted.plan_hash is None:
+        return accepted.plan_data
+    blob = db.get(PlanBlob, accepted.plan_hash)
+    plan = json.loads(zlib.decompress(blob.data))
+    for column, path in PLAN_COLUMNS.items():
+        value = getattr(accepted, column)
+        if value is not None:
+            values = plan
+            for section in path[:-1]:
+                values = values.setdefault(section, {})
+            values[path[-1]] = value
+    plan['severity'] = accepted.severity
+    plan['city'] = accepted.city
+    return plan
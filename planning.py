@@ -0,0 +1,224 @@
+from functools import lru_cache
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+SEVERITY_LEVELS = ('Low', 'Moderate', 'High', 'Severe')
+
+STAFF_FIELDS = ('nurses', 'doctors', 'support_staff')
+RESOURCE_FIELDS = ('beds', 'oxygen_cylinders', 'ventilators', 'ppe_kits')
+MEDICINE_FIELDS = ('respiratory_drugs', 'antibiotics', 'antivirals', 'general_medicines')
+
+# Extra staff per forecast peak hospitalisation, by severity
+STAFF_PER_ADMISSION = {
+    'Low':      (0.10, 0.03, 0.05),
+    'Moderate': (0.20, 0.06, 0.10),
+    'High':     (0.35, 0.10, 0.18),
+    'Severe':   (0.50, 0.15, 0.25),
+}
+
+# Beds / oxygen / ventilators per peak admission, PPE kits per forecast case
+RESOURCES_PER_ADMISSION = {
+    'Low':      (0.50, 0.10, 0.01, 0.05),
+    'Moderate': (0.80, 0.25, 0.03, 0.10),
+    'High':     (1.00, 0.45, 0.06, 0.20),
+    'Severe':   (1.20, 0.70, 0.10, 0.35),
+}
+
+# Medicine units per forecast case over the planning period
+MEDICINES_PER_CASE = {
+    'Low':      (0.05, 0.03, 0.01, 0.10),
+    'Moderate': (0.10, 0.06, 0.02, 0.15),
+    'High':     (0.18, 0.10, 0.05, 0.20),
+    'Severe':   (0.25, 0.15, 0.08, 0.25),
+}
+
+# Per-day cost per extra staff member (INR)
+STAFF_DAILY_COST_INR = (2500, 8000, 1200)
+
+# One-off cost per unit (INR)
+RESOURCE_UNIT_COST_INR = (1500, 6000, 25000, 800)
+MEDICINE_UNIT_COST_INR = (450, 300, 1200, 150)
+
+RECOMMENDATIONS = {
+    'Low': [
+        "Maintain routine staffing and monitor daily admissions",
+        "Review stock levels of respiratory medicines",
+    ],
+    'Moderate': [
+        "Put on-call staff on standby for the forecast period",
+        "Reserve additional beds in respiratory wards",
+        "Top up oxygen and PPE stocks",
+    ],
+    'High': [
+        "Extend duty rosters and recall on-call staff",
+        "Open overflow wards and prepare triage areas",
+        "Pre-position oxygen cylinders and ventilators",
+        "Coordinate with nearby hospitals for referrals",
+    ],
+    'Severe': [
+        "Activate the hospital emergency response plan",
+        "Postpone elective procedures to free beds and staff",
+        "Request emergency oxygen and ventilator supply",
+        "Set up dedicated fever and respiratory clinics",
+        "Coordinate with district health authorities on surge capacity",
+    ],
+}
+
+TIMELINE = {
+    'Low': [
+        {'day': 'Day 1', 'action': 'Review forecast and stock levels'},
+        {'day': 'Day 3', 'action': 'Reassess admissions trend'},
+    ],
+    'Moderate': [
+        {'day': 'Day 1', 'action': 'Alert on-call staff and reserve beds'},
+        {'day': 'Day 2', 'action': 'Restock oxygen, PPE and medicines'},
+        {'day': 'Day 4', 'action': 'Reassess admissions trend'},
+    ],
+    'High': [
+        {'day': 'Day 1', 'action': 'Extend rosters and open overflow wards'},
+        {'day': 'Day 1', 'action': 'Order oxygen, ventilators and medicines'},
+        {'day': 'Day 2', 'action': 'Set up triage and referral coordination'},
+        {'day': 'Day 3', 'action': 'Review capacity against admissions'},
+    ],
+    'Severe': [
+        {'day': 'Day 0', 'action': 'Activate emergency response plan'},
+        {'day': 'Day 0', 'action': 'Request emergency supplies'},
+        {'day': 'Day 1', 'action': 'Postpone elective procedures'},
+        {'day': 'Day 1', 'action': 'Open fever and respiratory clinics'},
+        {'day': 'Day 2', 'action': 'Daily capacity review with district authorities'},
+    ],
+}
+
+
+def _table(mapping):
+    return np.array([mapping[level] for level in SEVERITY_LEVELS], dtype=float)
+
+
+@lru_cache(maxsize=1)
+def _tables():
+    """Per-severity and cost arrays, built on first plan so importing stays numpy-free"""
+    return {
+        'staff': _table(STAFF_PER_ADMISSION),
+        'resources': _table(RESOURCES_PER_ADMISSION),
+        'medicines': _table(MEDICINES_PER_CASE),
+        'staff_cost': np.array(STAFF_DAILY_COST_INR, dtype=float),
+        'resource_cost': np.array(RESOURCE_UNIT_COST_INR, dtype=float),
+        'medicine_cost': np.array(MEDICINE_UNIT_COST_INR, dtype=float),
+    }
+
+
+_SEVERITY_INDEX = {level: i for i, level in enumerate(SEVERITY_LEVELS)}
+
+
+def severity_codes(severities):
+    """Map severity labels to table rows; unknown labels fall back to Low"""
+    return np.array([_SEVERITY_INDEX.get(s, 0) for s in severities], dtype=np.intp)
+
+
+def forecast_matrix(forecasts):
+    """Stack per-city forecast DataFrames into (cities, cases, hospitalisations) arrays.
+
+    Shorter forecasts are padded with zeros so every row has the same horizon.
+    """
+    cities = list(forecasts)
+    horizon = max((len(df) for df in forecasts.values()), default=0)
+    cases = np.zeros((len(cities), horizon))
+    hosp = np.zeros((len(cities), horizon))
+    for i, city in enumerate(cities):
+        df = forecasts[city]
+        if df is None or df.empty:
+            continue
+        cases[i, :len(df)] = df['cases_forecast'].to_numpy(dtype=float)
+        hosp[i, :len(df)] = df['hosp_forecast'].to_numpy(dtype=float)
+    return cities, cases, hosp
+
+
+class BatchPlan:
+    """Hospital plans for many cities computed together"""
+
+    def __init__(self, cities, severities, cases, hosp):
+        self.cities = list(cities)
+        self.severities = list(severities)
+        self.period_days = cases.shape[1]
+        self._row = {city: i for i, city in enumerate(self.cities)}
+
+        codes = severity_codes(self.severities)
+        self.peak_cases = cases.max(axis=1, initial=0)
+        self.peak_hosp = hosp.max(axis=1, initial=0)
+        self.total_cases = cases.sum(axis=1)
+
+        tables = _tables()
+        self.staff = np.ceil(tables['staff'][codes] * self.peak_hosp[:, None]).astype(int)
+        resource_basis = np.column_stack([self.peak_hosp] * 3 + [self.total_cases])
+        self.resources = np.ceil(tables['resources'][codes] * resource_basis).astype(int)
+        self.medicines = np.ceil(tables['medicines'][codes] * self.total_cases[:, None]).astype(int)
+
+        self.staff_cost = (self.staff @ tables['staff_cost']) * max(self.period_days, 1)
+        self.resource_cost = self.resources @ tables['resource_cost'] + self.medicines @ tables['medicine_cost']
+        self.total_cost = self.staff_cost + self.resource_cost
+
+    def __len__(self):
+        return len(self.cities)
+
+    def plan(self, city):
+        """Plan for one city in the shape of PlannerAgent.generate_hospital_plan"""
+        i = self._row[city]
+        severity = self.severities[i]
+        level = severity if severity in _SEVERITY_INDEX else SEVERITY_LEVELS[0]
+        resources = dict(zip(RESOURCE_FIELDS, self.resources[i].tolist()))
+        resources['medicines'] = dict(zip(MEDICINE_FIELDS, self.medicines[i].tolist()))
+        return {
+            'city': city,
+            'severity': severity,
+            'staff_requirements': dict(zip(STAFF_FIELDS, self.staff[i].tolist())),
+            'resource_requirements': resources,
+            'recommendations': list(RECOMMENDATIONS[level]),
+            'timeline': [dict(step) for step in TIMELINE[level]],
+            'estimated_costs': {
+                'staff_cost_inr': int(self.staff_cost[i]),
+                'resource_cost_inr': int(self.resource_cost[i]),
+                'total_estimated_cost_inr': int(self.total_cost[i]),
+                'period': f"{self.period_days} days"
+            }
+        }
+
+    def surge_capacity(self):
+        """One row per city with requirements and costs, for region-wide views"""
+        import pandas as pd
+
+        frame = pd.DataFrame({
+            'city': self.cities,
+            'severity': self.severities,
+            'peak_cases': self.peak_cases.round().astype(int),
+            'peak_hospitalizations': self.peak_hosp.round().astype(int),
+        })
+        for j, field in enumerate(STAFF_FIELDS):
+            frame[field] = self.staff[:, j]
+        for j, field in enumerate(RESOURCE_FIELDS):
+            frame[field] = self.resources[:, j]
+        for j, field in enumerate(MEDICINE_FIELDS):
+            frame[field] = self.medicines[:, j]
+        frame['staff_cost_inr'] = self.staff_cost.astype(int)
+        frame['resource_cost_inr'] = self.resource_cost.astype(int)
+        frame['total_estimated_cost_inr'] = self.total_cost.astype(int)
+        return frame
+
+    def region_totals(self):
+        totals = {'cities': len(self.cities)}
+        totals.update(zip(STAFF_FIELDS, self.staff.sum(axis=0).tolist()))
+        totals.update(zip(RESOURCE_FIELDS, self.resources.sum(axis=0).tolist()))
+        totals.update(zip(MEDICINE_FIELDS, self.medicines.sum(axis=0).tolist()))
+        totals['total_estimated_cost_inr'] = int(self.total_cost.sum())
+        return totals
+
+
+def generate_batch_plans(severities, forecasts):
+    """Plans for every city in one pass.
+
+    severities: {city: overall_severity}
+    forecasts: {city: forecast_df with cases_forecast / hosp_forecast}
+    """
+    cities, cases, hosp = forecast_matrix(forecasts)
+    return BatchPlan(cities, [severities.get(city) for city in cities], cases, hosp)
@@ -0,0 +1,354 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, literal_column, select
+
+from lazy_imports import lazy_import
+from models import CityRegion, DataSnapshot, RegionAggregate
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ('district', 'state', 'country')
+COUNTRY = 'India'
+UNASSIGNED = 'Unassigned'
+
+REFRESH_INTERVAL = 60.0
+# The change feed reports cities, not dates; this many recent days are rebuilt
+CHANGE_WINDOW = timedelta(days=2)
+BASE_HISTORY_DAYS = 28
+
+# city -> (district, state); extend or override with REGION_HIERARCHY_FILE
+DEFAULT_HIERARCHY = {
+    'Delhi': ('New Delhi', 'Delhi'),
+    'New Delhi': ('New Delhi', 'Delhi'),
+    'Mumbai': ('Mumbai', 'Maharashtra'),
+    'Pune': ('Pune', 'Maharashtra'),
+    'Nagpur': ('Nagpur', 'Maharashtra'),
+    'Bangalore': ('Bengaluru Urban', 'Karnataka'),
+    'Bengaluru': ('Bengaluru Urban', 'Karnataka'),
+    'Chennai': ('Chennai', 'Tamil Nadu'),
+    'Coimbatore': ('Coimbatore', 'Tamil Nadu'),
+    'Kolkata': ('Kolkata', 'West Bengal'),
+    'Hyderabad': ('Hyderabad', 'Telangana'),
+    'Ahmedabad': ('Ahmedabad', 'Gujarat'),
+    'Surat': ('Surat', 'Gujarat'),
+    'Jaipur': ('Jaipur', 'Rajasthan'),
+    'Lucknow': ('Lucknow', 'Uttar Pradesh'),
+    'Kanpur': ('Kanpur Nagar', 'Uttar Pradesh'),
+    'Noida': ('Gautam Buddh Nagar', 'Uttar Pradesh'),
+    'Gurgaon': ('Gurugram', 'Haryana'),
+    'Gurugram': ('Gurugram', 'Haryana'),
+    'Chandigarh': ('Chandigarh', 'Chandigarh'),
+    'Patna': ('Patna', 'Bihar'),
+    'Bhopal': ('Bhopal', 'Madhya Pradesh'),
+    'Indore': ('Indore', 'Madhya Pradesh'),
+    'Kochi': ('Ernakulam', 'Kerala'),
+    'Thiruvananthapuram': ('Thiruvananthapuram', 'Kerala'),
+    'Visakhapatnam': ('Visakhapatnam', 'Andhra Pradesh'),
+    'Bhubaneswar': ('Khordha', 'Odisha'),
+    'Guwahati': ('Kamrup Metropolitan', 'Assam'),
+}
+
+
+def load_hierarchy(path=None):
+    hierarchy = dict(DEFAULT_HIERARCHY)
+    path = path or os.environ.get('REGION_HIERARCHY_FILE')
+    if path:
+        with open(path, 'r', encoding='utf-8') as handle:
+            for city, levels in json.load(handle).items():
+                hierarchy[city] = (levels['district'], levels['state'])
+    return hierarchy
+
+
+def regions_for(city, hierarchy):
+    district, state = hierarchy.get(city, (UNASSIGNED, UNASSIGNED))
+    return {'district': district, 'state': state, 'country': COUNTRY}
+
+
+def sync_hierarchy(db, cities, hierarchy=None):
+    """Make sure every city has a city_regions row"""
+    hierarchy = hierarchy or load_hierarchy()
+    existing = {row.city: row for row in db.query(CityRegion).all()}
+    for city in cities:
+        district, state = hierarchy.get(city, (UNASSIGNED, UNASSIGNED))
+        row = existing.get(city)
+        if row is None:
+            db.add(CityRegion(city=city, district=district, state=state))
+        elif (row.district, row.state) != (district, state):
+            row.district, row.state = district, state
+
+
+def _day(db, column):
+    if db.get_bind().dialect.name == 'postgresql':
+        # literal_column keeps the SELECT and GROUP BY expressions identical
+        return func.date_trunc(literal_column("'day'"), column)
+    # Same text format SQLAlchemy binds datetimes with, so date == :date matches
+    return func.strftime('%Y-%m-%d 00:00:00.000000', column)
+
+
+def refresh_aggregates(db, start=None, end=None):
+    """Recompute region_aggregates for [start, end) server-side; one pass per level"""
+    cleanup = delete(RegionAggregate)
+    if start is not None:
+        cleanup = cleanup.where(RegionAggregate.date >= start)
+    if end is not None:
+        cleanup = cleanup.where(RegionAggregate.date < end)
+    db.execute(cleanup)
+
+    # One row per city per day first: means over the day's readings and the
+    # latest reading of the stock counts, so sub-daily cities are not summed
+    # once per reading. Regions then sum the counts across their cities.
+    day = _day(db, DataSnapshot.date)
+    per_city_day = (DataSnapshot.city, day)
+    ranked = select(
+        DataSnapshot.city,
+        day.label('day'),
+        func.avg(DataSnapshot.aqi).over(partition_by=per_city_day).label('aqi_mean'),
+        func.max(DataSnapshot.aqi).over(partition_by=per_city_day).label('aqi_max'),
+        func.avg(DataSnapshot.pm25).over(partition_by=per_city_day).label('pm25_mean'),
+        DataSnapshot.total_cases,
+        DataSnapshot.respiratory_cases,
+        DataSnapshot.hospitalizations,
+        func.row_number().over(
+            partition_by=per_city_day, order_by=(DataSnapshot.date.desc(), DataSnapshot.id.desc())
+        ).label('day_rank')
+    )
+    if start is not None:
+        ranked = ranked.where(DataSnapshot.date >= start)
+    if end is not None:
+        ranked = ranked.where(DataSnapshot.date < end)
+    ranked = ranked.subquery()
+    city_days = select(ranked).where(ranked.c.day_rank == 1).subquery()
+
+    now = datetime.utcnow()
+    region_columns = {
+        'district': func.coalesce(CityRegion.district, UNASSIGNED),
+        'state': func.coalesce(CityRegion.state, UNASSIGNED),
+        'country': None,
+    }
+    target_columns = [
+        'level', 'region', 'date', 'city_count', 'aqi_mean', 'aqi_max', 'pm25_mean',
+        'total_cases', 'respiratory_cases', 'hospitalizations', 'refreshed_at'
+    ]
+    for level, region in region_columns.items():
+        group_by = [city_days.c.day] if region is None else [region, city_days.c.day]
+        if region is None:
+            region = literal(COUNTRY)
+        query = (
+            select(
+                literal(level), region, city_days.c.day,
+                func.count(city_days.c.city),
+                func.avg(city_days.c.aqi_mean),
+                func.max(city_days.c.aqi_max),
+                func.avg(city_days.c.pm25_mean),
+                func.sum(city_days.c.total_cases),
+                func.sum(city_days.c.respiratory_cases),
+                func.sum(city_days.c.hospitalizations),
+                literal(now)
+            )
+            .select_from(city_days)
+            .outerjoin(CityRegion, CityRegion.city == city_days.c.city)
+            .group_by(*group_by)
+        )
+        db.execute(insert(RegionAggregate).from_select(target_columns, query))
+
+
+def region_summary(db, level='state', date=None):
+    """Latest (or given) day for every region at a level; reads one row per region"""
+    if date is None:
+        date = db.query(func.max(RegionAggregate.date)).filter(RegionAggregate.level == level).scalar()
+        if date is None:
+            return []
+    return (
+        db.query(RegionAggregate)
+        .filter(RegionAggregate.level == level, RegionAggregate.date == date)
+        .order_by(RegionAggregate.hospitalizations.desc())
+        .all()
+    )
+
+
+def region_series(db, level, region, start=None, end=None):
+    query = db.query(RegionAggregate).filter(RegionAggregate.level == level, RegionAggregate.region == region)
+    if start is not None:
+        query = query.filter(RegionAggregate.date >= start)
+    if end is not None:
+        query = query.filter(RegionAggregate.date < end)
+    return query.order_by(RegionAggregate.date).all()
+
+
+def region_base_forecasts(db, cities, horizon, column='hospitalizations', history_days=BASE_HISTORY_DAYS,
+                          hierarchy=None, end=None):
+    """{(level, region): array} base forecasts from each region's own aggregate series.
+
+    For reconcile_forecasts(). A region only gets one when its latest
+    aggregate covers exactly the cities being reconciled and it has enough
+    history; the others start from the bottom-up sum.
+    """
+    from ensemble import MIN_HISTORY, MODELS
+
+    hierarchy = hierarchy or load_hierarchy()
+    members = defaultdict(set)
+    for city in cities:
+        for level, region in regions_for(city, hierarchy).items():
+            members[(level, region)].add(city)
+    if not members:
+        return {}
+    end = end or datetime.utcnow()
+    value = getattr(RegionAggregate, column)
+    rows = db.execute(
+        select(RegionAggregate.level, RegionAggregate.region, RegionAggregate.city_count, value)
+        .where(
+            RegionAggregate.region.in_({region for _, region in members}),
+            RegionAggregate.date >= end - timedelta(days=history_days),
+            RegionAggregate.date < end
+        )
+        .order_by(RegionAggregate.date)
+    ).all()
+
+    series = defaultdict(list)
+    city_counts = {}
+    for level, region, city_count, amount in rows:
+        if (level, region) in members:
+            series[(level, region)].append(float(amount or 0))
+            city_counts[(level, region)] = city_count
+    forecasts = {}
+    for key, values in series.items():
+        if len(values) < MIN_HISTORY or city_counts[key] != len(members[key]):
+            continue
+        forecasts[key] = np.clip(MODELS['holt'](np.asarray(values), horizon, None), 0, None)
+    return forecasts
+
+
+def summing_matrix(cities, hierarchy):
+    """Rows: every node (country, states, districts, cities); columns: cities"""
+    nodes = [('country', COUNTRY)]
+    membership = {('country', COUNTRY): set(range(len(cities)))}
+    for level in ('state', 'district'):
+        for i, city in enumerate(cities):
+            key = (level, regions_for(city, hierarchy)[level])
+            if key not in membership:
+                membership[key] = set()
+                nodes.append(key)
+            membership[key].add(i)
+    for i, city in enumerate(cities):
+        key = ('city', city)
+        nodes.append(key)
+        membership[key] = {i}
+
+    S = np.zeros((len(nodes), len(cities)))
+    for row, key in enumerate(nodes):
+        S[row, sorted(membership[key])] = 1.0
+    return nodes, S
+
+
+def reconcile_forecasts(city_forecasts, hierarchy=None, region_forecasts=None):
+    """OLS-reconciled hierarchical forecasts.
+
+    city_forecasts: {city: array of horizon values}
+    region_forecasts: optional {(level, region): array} base forecasts made at
+    aggregate level; nodes without one start from the bottom-up sum.
+    Returns {(level, region): array}, coherent so every parent equals the sum of
+    its children.
+    """
+    hierarchy = hierarchy or load_hierarchy()
+    region_forecasts = region_forecasts or {}
+    cities = list(city_forecasts)
+    if not cities:
+        return {}
+    bottom = np.vstack([np.asarray(city_forecasts[c], dtype=float) for c in cities])
+    nodes, S = summing_matrix(cities, hierarchy)
+
+    base = S @ bottom
+    for row, key in enumerate(nodes):
+        if key in region_forecasts:
+            base[row] = np.asarray(region_forecasts[key], dtype=float)
+
+    # b = (S'S)^-1 S' y, solved without forming the inverse
+    reconciled_bottom = np.linalg.lstsq(S, base, rcond=None)[0]
+    reconciled = S @ reconciled_bottom
+    return {key: reconciled[row] for row, key in enumerate(nodes)}
+
+
+class AggregateRefresher:
+    """Background thread that rebuilds region_aggregates for days touched by new data.
+
+    Ingestion batches and the change watcher mark(cities, start, end). Every
+    interval the marked cities are synced into the hierarchy, and the marked
+    days are rebuilt with one refresh_aggregates() call.
+    """
+
+    def __init__(self, session_factory=None, interval=REFRESH_INTERVAL, hierarchy=None):
+        if session_factory is None:
+            from database import get_db_session
+            session_factory = lambda: get_db_session('background')
+        self.session_factory = session_factory
+        self.interval = interval
+        self.hierarchy = hierarchy
+        self._cities = set()
+        self._range = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def mark(self, cities, start, end=None):
+        end = end or start
+        with self._lock:
+            self._cities.update(cities)
+            if self._range is None:
+                self._range = (start, end)
+            else:
+                self._range = (min(self._range[0], start), max(self._range[1], end))
+
+    def mark_recent(self, cities):
+        """Change watcher listener"""
+        now = datetime.utcnow()
+        self.mark(cities, now - CHANGE_WINDOW, now)
+
+    def flush(self):
+        with self._lock:
+            cities, marked = self._cities, self._range
+            self._cities, self._range = set(), None
+        if marked is None:
+            return False
+        start = datetime(marked[0].year, marked[0].month, marked[0].day)
+        end = datetime(marked[1].year, marked[1].month, marked[1].day) + timedelta(days=1)
+        db = self.session_factory()
+        try:
+            sync_hierarchy(db, cities, self.hierarchy)
+            db.flush()
+            refresh_aggregates(db, start, end)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the work back for the next round
+            self.mark(cities, *marked)
+            raise
+        finally:
+            db.close()
+        return True
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='aggregate-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Region aggregate refresh failed")
+            self._stopped.wait(max(0.0, self.interval - (time.monotonic() - started)))
@@ -0,0 +1,307 @@
+import csv
+import importlib.util
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+REPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'excel': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'pdf': ('application/pdf', 'pdf'),
+}
+
+REPORT_COLUMNS = (
+    'city', 'date', 'overall_severity',
+    'aqi_forecast', 'cases_forecast', 'hosp_forecast',
+    'aqi_spike_ratio', 'case_spike_ratio', 'hosp_spike_ratio',
+    'nurses', 'doctors', 'support_staff',
+    'beds', 'oxygen_cylinders', 'ventilators', 'ppe_kits',
+    'staff_cost_inr', 'resource_cost_inr', 'total_estimated_cost_inr',
+)
+
+# Optional packages a format needs; install with the 'reports' extra
+FORMAT_DEPENDENCIES = {
+    'excel': 'openpyxl',
+    'pdf': 'reportlab',
+}
+
+CHUNK_SIZE = 64 * 1024
+JOB_TTL = 3600.0
+MAX_JOBS = 64
+
+
+def available_formats():
+    """Report formats whose optional dependencies are installed"""
+    return [
+        fmt for fmt in REPORT_FORMATS
+        if fmt not in FORMAT_DEPENDENCIES or importlib.util.find_spec(FORMAT_DEPENDENCIES[fmt]) is not None
+    ]
+
+
+def _city_rows(city, pipeline, forecast_days, forecast_mode='single'):
+    # Through the pipeline: shared result cache, and forecasts stay under its forecast lock
+    params = {'history_days': 14, 'forecast_days': forecast_days, 'forecast_mode': forecast_mode}
+    spike_info = pipeline.get('spike', city, **params)
+    forecast_df = pipeline.get('forecast', city, **params)['forecast']
+    plan = pipeline.get('plan', city, **params) or {}
+
+    staff = plan.get('staff_requirements', {})
+    resources = plan.get('resource_requirements', {})
+    costs = plan.get('estimated_costs', {})
+    city_fields = {
+        'city': city,
+        'overall_severity': spike_info['overall_severity'],
+        'aqi_spike_ratio': round(float(spike_info['aqi_spike']['ratio']), 2),
+        'case_spike_ratio': round(float(spike_info['case_spike']['ratio']), 2),
+        'hosp_spike_ratio': round(float(spike_info['hospitalization_spike']['ratio']), 2),
+        'nurses': staff.get('nurses'),
+        'doctors': staff.get('doctors'),
+        'support_staff': staff.get('support_staff'),
+        'beds': resources.get('beds'),
+        'oxygen_cylinders': resources.get('oxygen_cylinders'),
+        'ventilators': resources.get('ventilators'),
+        'ppe_kits': resources.get('ppe_kits'),
+        'staff_cost_inr': costs.get('staff_cost_inr'),
+        'resource_cost_inr': costs.get('resource_cost_inr'),
+        'total_estimated_cost_inr': costs.get('total_estimated_cost_inr'),
+    }
+
+    if forecast_df is None or forecast_df.empty:
+        yield dict(city_fields, date=None, aqi_forecast=None, cases_forecast=None, hosp_forecast=None)
+        return
+    for record in forecast_df.itertuples(index=False):
+        yield dict(
+            city_fields,
+            date=record.date.strftime('%Y-%m-%d'),
+            aqi_forecast=round(float(record.aqi_forecast)),
+            cases_forecast=round(float(record.cases_forecast)),
+            hosp_forecast=round(float(record.hosp_forecast))
+        )
+
+
+def iter_report_rows(cities, pipeline, forecast_days=7, forecast_mode='single', on_progress=None):
+    """Yield report rows one city at a time.
+
+    pipeline: the RecomputePipeline the dashboards read from.
+    on_progress(done, total) is called after each city.
+    """
+    total = len(cities)
+    for done, city in enumerate(cities, 1):
+        yield from _city_rows(city, pipeline, forecast_days, forecast_mode)
+        if on_progress:
+            on_progress(done, total)
+
+
+def _cell(value):
+    return '' if value is None else value
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_cell(row.get(column)) for column in REPORT_COLUMNS])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _stream_file(path):
+    with open(path, 'rb') as handle:
+        while True:
+            chunk = handle.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_excel(rows):
+    # openpyxl is optional; write-only mode keeps memory flat while rows stream in
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Excel reports require openpyxl (pip install openpyxl)")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Report')
+    sheet.append(list(REPORT_COLUMNS))
+    for row in rows:
+        sheet.append([row.get(column) for column in REPORT_COLUMNS])
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+        yield from _stream_file(path)
+    finally:
+        os.remove(path)
+
+
+def stream_pdf(rows, title="Health Risk Report"):
+    try:
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        raise RuntimeError("PDF reports require reportlab (pip install reportlab)")
+
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        width, height = landscape(A4)
+        pdf = canvas.Canvas(path, pagesize=(width, height))
+        columns = ('city', 'date', 'overall_severity', 'aqi_forecast', 'cases_forecast',
+                   'hosp_forecast', 'beds', 'nurses', 'total_estimated_cost_inr')
+        col_width = (width - 60) / len(columns)
+
+        def header(y):
+            pdf.setFont('Helvetica-Bold', 14)
+            pdf.drawString(30, y, f"{title} - {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+            y -= 24
+            pdf.setFont('Helvetica-Bold', 8)
+            for i, column in enumerate(columns):
+                pdf.drawString(30 + i * col_width, y, column.replace('_', ' ')[:22])
+            pdf.setFont('Helvetica', 8)
+            return y - 14
+
+        y = header(height - 40)
+        for row in rows:
+            if y < 40:
+                pdf.showPage()
+                y = header(height - 40)
+            for i, column in enumerate(columns):
+                pdf.drawString(30 + i * col_width, y, str(_cell(row.get(column)))[:22])
+            y -= 12
+        pdf.save()
+        yield from _stream_file(path)
+    finally:
+        os.remove(path)
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'excel': stream_excel,
+    'pdf': stream_pdf,
+}
+
+
+def stream_report(fmt, rows):
+    """Yield the report as byte chunks in the requested format"""
+    if fmt not in STREAMERS:
+        raise ValueError(f"Unsupported report format: {fmt}")
+    return STREAMERS[fmt](rows)
+
+
+class ReportJob:
+    def __init__(self, cities, fmt):
+        self.id = uuid.uuid4().hex
+        self.cities = list(cities)
+        self.format = fmt
+        self.status = 'queued'
+        self.done = 0
+        self.total = len(self.cities)
+        self.error = None
+        self.path = None
+        self.bytes_written = 0
+        self.finished = threading.Event()
+        self.finished_at = None
+        self.discarded = False
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    @property
+    def mime_type(self):
+        return REPORT_FORMATS[self.format][0]
+
+    @property
+    def file_name(self):
+        scope = self.cities[0] if len(self.cities) == 1 else 'all_cities'
+        return f"health_report_{scope}_{datetime.now().strftime('%Y%m%d')}.{REPORT_FORMATS[self.format][1]}"
+
+    def _on_progress(self, done, total):
+        self.done = done
+
+    def iter_chunks(self):
+        return _stream_file(self.path)
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def cleanup(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ReportWorker:
+    """Runs report jobs in background threads and writes output to temp files"""
+
+    def __init__(self, pipeline, max_workers=2):
+        self.pipeline = pipeline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report')
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def discard(self, job_id):
+        """Forget a job and delete its output; a running job deletes it when it finishes"""
+        with self._lock:
+            job = self.jobs.pop(job_id, None)
+        if job is not None and job.finished.is_set():
+            job.cleanup()
+        elif job is not None:
+            job.discarded = True
+
+    def prune(self, ttl=JOB_TTL, max_jobs=MAX_JOBS):
+        """Drop finished jobs older than ttl, then the oldest finished ones beyond max_jobs"""
+        now = time.monotonic()
+        with self._lock:
+            finished = sorted(
+                (job for job in self.jobs.values() if job.finished.is_set()),
+                key=lambda job: job.finished_at
+            )
+            expired = [job for job in finished if now - job.finished_at > ttl]
+            excess = len(self.jobs) - len(expired) - max_jobs
+            if excess > 0:
+                expired += [job for job in finished if job not in expired][:excess]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            job.cleanup()
+
+    def submit(self, cities, fmt='csv', forecast_days=7, forecast_mode='single'):
+        if fmt not in available_formats():
+            raise ValueError(f"Unsupported report format: {fmt}")
+        self.prune()
+        job = ReportJob(cities, fmt)
+        with self._lock:
+            self.jobs[job.id] = job
+        self._executor.submit(self._run, job, forecast_days, forecast_mode)
+        return job
+
+    def _run(self, job, forecast_days, forecast_mode):
+        job.status = 'running'
+        fd, path = tempfile.mkstemp(suffix='.' + REPORT_FORMATS[job.format][1])
+        job.path = path
+        try:
+            rows = iter_report_rows(job.cities, self.pipeline, forecast_days, forecast_mode, on_progress=job._on_progress)
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in stream_report(job.format, rows):
+                    out.write(chunk)
+                    job.bytes_written += len(chunk)
+            job.status = 'done'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = time.monotonic()
+            job.finished.set()
+            if job.discarded:
+                job.cleanup()
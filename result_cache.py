@@ -0,0 +1,354 @@
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from pipeline import VersionedResultCache
+
+logger = logging.getLogger(__name__)
+
+# Pipeline nodes whose results are shared between sessions and replicas
+SHARED_NODES = ('spike', 'risk', 'forecast', 'plan')
+
+DEFAULT_TTL = 6 * 3600
+LOCK_LEASE = 60.0
+LOCK_WAIT = 60.0
+LOCK_POLL = 0.05
+# Seconds a generation read from the backend is reused before asking again
+GENERATION_TTL = 1.0
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+class MemoryBackend:
+    """Bounded in-process LRU; shares results between sessions of one process"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+            return self._counters[name]
+
+    def acquire(self, name, lease):
+        token = uuid.uuid4().hex
+        with self._lock:
+            holder = self._locks.get(name)
+            if holder is not None and holder[1] > time.time():
+                return None
+            self._locks[name] = (token, time.time() + lease)
+        return token
+
+    def release(self, name, token):
+        with self._lock:
+            if self._locks.get(name, (None,))[0] == token:
+                del self._locks[name]
+
+
+class SQLiteBackend:
+    """Disk store shared by every process on one host (WAL mode)"""
+
+    def __init__(self, path='.result_cache.sqlite3', max_entries=20000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_expires_at ON entries (expires_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, token TEXT, expires_at REAL)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(value), now + ttl)
+        )
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def counter(self, name):
+        row = self._connect().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, name):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+        return self.counter(name)
+
+    def acquire(self, name, lease):
+        conn = self._connect()
+        token = uuid.uuid4().hex
+        now = time.time()
+        conn.execute("DELETE FROM locks WHERE name = ? AND expires_at < ?", (name, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO locks (name, token, expires_at) VALUES (?, ?, ?)",
+            (name, token, now + lease)
+        )
+        return token if cursor.rowcount == 1 else None
+
+    def release(self, name, token):
+        self._connect().execute("DELETE FROM locks WHERE name = ? AND token = ?", (name, token))
+
+
+class RedisBackend:
+    """Redis (or any Redis-compatible server) shared by all replicas"""
+
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url='redis://localhost:6379/0'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The Redis result cache requires redis (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self._release = self.client.register_script(self._RELEASE)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=int(ttl))
+
+    def counter(self, name):
+        return int(self.client.get(name) or 0)
+
+    def incr(self, name):
+        return self.client.incr(name)
+
+    def acquire(self, name, lease):
+        token = uuid.uuid4().hex
+        if self.client.set(name, token, nx=True, px=int(lease * 1000)):
+            return token
+        return None
+
+    def release(self, name, token):
+        self._release(keys=[name], args=[token])
+
+
+class SharedResultCache(VersionedResultCache):
+    """Two-tier pipeline cache: the in-process dict, then a shared backend.
+
+    Only SHARED_NODES go to the backend. Shared entries are keyed by a per-city
+    generation stored in the backend, which discard_city() bumps, so an
+    invalidation on one replica is seen by all of them. The pipeline's key also
+    carries its source fingerprint, so replicas that read different data do not
+    share results. The generation tracks invalidations, not the data itself: a
+    change that no replica has invalidated yet is served from cache until one does.
+
+    In-process copies of shared results carry the generation they were read at
+    and are only served while it is current. Each lookup reads the generation
+    from the backend (one round trip) unless it was read within generation_ttl
+    seconds, so another replica's invalidation can take that long to show up
+    here; this process's own invalidations apply at once. lock() gives
+    single-flight across processes: the first caller computes while the others
+    wait and then read its result.
+
+    Payloads are pickles signed with HMAC-SHA256 under secret. Anything
+    unsigned or signed with another key is never unpickled.
+    """
+
+    def __init__(self, backend, namespace='vedya', ttl=DEFAULT_TTL, shared_nodes=SHARED_NODES,
+                 lock_lease=LOCK_LEASE, lock_wait=LOCK_WAIT, secret=None, generation_ttl=GENERATION_TTL):
+        super().__init__()
+        self.backend = backend
+        self.generation_ttl = generation_ttl
+        self._generations = {}
+        # Without a configured secret only this process can read what it wrote
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret or secrets.token_bytes(32)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.shared_nodes = frozenset(shared_nodes)
+        self.lock_lease = lock_lease
+        self.lock_wait = lock_wait
+        self.stats = {'shared_hits': 0, 'shared_misses': 0, 'shared_errors': 0, 'lock_waits': 0}
+        # key -> generation seen at the miss, so put() files the result under the
+        # generation it was computed from even if another replica bumped it since
+        self._miss_generations = {}
+
+    def _generation(self, city):
+        cached = self._generations.get(city)
+        if cached is not None and time.monotonic() - cached[1] < self.generation_ttl:
+            return cached[0]
+        generation = self.backend.counter(f"{self.namespace}:gen:{city}")
+        self._generations[city] = (generation, time.monotonic())
+        return generation
+
+    def _shared_key(self, key, generation):
+        city, node, params = key
+        digest = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:16]
+        return f"{self.namespace}:result:{city}:{generation}:{node}:{digest}"
+
+    def _dumps(self, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return hmac.new(self.secret, payload, hashlib.sha256).digest() + payload
+
+    def _loads(self, raw):
+        raw = bytes(raw)
+        signature, payload = raw[:SIGNATURE_SIZE], raw[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, hmac.new(self.secret, payload, hashlib.sha256).digest()):
+            raise ValueError("Shared result cache entry has a bad signature")
+        return pickle.loads(payload)
+
+    def get(self, key, version):
+        hit, value = super().get(key, version)
+        if key[1] not in self.shared_nodes:
+            return hit, value
+        try:
+            generation = self._generation(key[0])
+        except Exception:
+            self.stats['shared_errors'] += 1
+            logger.warning("Shared result cache generation read failed", exc_info=True)
+            # Backend unreachable: local invalidation still applies to the in-process copy
+            return (True, value[1]) if hit else (False, None)
+        if hit and value[0] == generation:
+            return True, value[1]
+        try:
+            raw = self.backend.get(self._shared_key(key, generation))
+            if raw is None:
+                self.stats['shared_misses'] += 1
+                with self._lock:
+                    self._miss_generations[key] = generation
+                return False, None
+            value = self._loads(raw)
+        except Exception:
+            self.stats['shared_errors'] += 1
+            logger.warning("Shared result cache read failed", exc_info=True)
+            return False, None
+        self.stats['shared_hits'] += 1
+        super().put(key, version, (generation, value))
+        return True, value
+
+    def put(self, key, version, value):
+        if key[1] not in self.shared_nodes:
+            super().put(key, version, value)
+            return
+        with self._lock:
+            generation = self._miss_generations.pop(key, None)
+        try:
+            if generation is None:
+                generation = self._generation(key[0])
+            self.backend.set(self._shared_key(key, generation), self._dumps(value), self.ttl)
+        except Exception:
+            self.stats['shared_errors'] += 1
+            logger.warning("Shared result cache write failed", exc_info=True)
+        # A generation of None (backend unreachable) is replaced on the next successful read
+        super().put(key, version, (generation, value))
+
+    def discard_city(self, city):
+        super().discard_city(city)
+        try:
+            self.backend.incr(f"{self.namespace}:gen:{city}")
+        except Exception:
+            self.stats['shared_errors'] += 1
+            logger.warning("Shared result cache invalidation failed", exc_info=True)
+        self._generations.pop(city, None)
+
+    @contextmanager
+    def lock(self, key):
+        if key[1] not in self.shared_nodes:
+            yield
+            return
+        name = f"{self.namespace}:lock:{key[0]}:{key[1]}:{hashlib.sha1(repr(key[2]).encode('utf-8')).hexdigest()[:16]}"
+        deadline = time.monotonic() + self.lock_wait
+        token = None
+        try:
+            while True:
+                token = self.backend.acquire(name, self.lock_lease)
+                if token is not None or time.monotonic() >= deadline:
+                    break
+                self.stats['lock_waits'] += 1
+                time.sleep(LOCK_POLL)
+        except Exception:
+            self.stats['shared_errors'] += 1
+            logger.warning("Shared result cache lock failed", exc_info=True)
+        try:
+            # Without the lock after lock_wait, compute anyway rather than stall the page
+            yield
+        finally:
+            if token is not None:
+                try:
+                    self.backend.release(name, token)
+                except Exception:
+                    logger.warning("Shared result cache unlock failed", exc_info=True)
+
+
+def result_cache_from_env():
+    """RESULT_CACHE_BACKEND=memory|sqlite|redis; defaults to the plain in-process cache.
+
+    sqlite and redis share payloads between processes, so they need
+    RESULT_CACHE_SECRET (or AUTH_SECRET_KEY) to sign them.
+    """
+    kind = os.environ.get('RESULT_CACHE_BACKEND', '').lower()
+    secret = os.environ.get('RESULT_CACHE_SECRET') or os.environ.get('AUTH_SECRET_KEY')
+    if kind in ('sqlite', 'redis') and not secret:
+        raise RuntimeError(f"RESULT_CACHE_BACKEND={kind} requires RESULT_CACHE_SECRET to sign cached results")
+    ttl = float(os.environ.get('RESULT_CACHE_TTL', DEFAULT_TTL))
+    if kind == 'memory':
+        backend = MemoryBackend(int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 2048)))
+    elif kind == 'sqlite':
+        backend = SQLiteBackend(os.environ.get('RESULT_CACHE_PATH', '.result_cache.sqlite3'))
+    elif kind == 'redis':
+        backend = RedisBackend(os.environ.get('RESULT_CACHE_URL') or os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    else:
+        return VersionedResultCache()
+    generation_ttl = float(os.environ.get('RESULT_CACHE_GENERATION_TTL', GENERATION_TTL))
+    return SharedResultCache(backend, ttl=ttl, secret=secret, generation_ttl=generation_ttl)
@@ -0,0 +1,69 @@
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class CityIndex:
+    """Ball-tree index over city coordinates for radius queries"""
+
+    def __init__(self, cities, latitudes, longitudes):
+        from sklearn.neighbors import BallTree
+
+        self.cities = np.asarray(cities, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self._positions = {city: i for i, city in enumerate(self.cities)}
+
+        self._tree = BallTree(
+            np.radians(np.column_stack([self.latitudes, self.longitudes])),
+            metric='haversine'
+        ) if len(self.cities) else None
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from dicts carrying city plus latitude/longitude (or lat/lon)"""
+        cities, lats, lons = [], [], []
+        for record in records:
+            lat = record.get('latitude', record.get('lat'))
+            lon = record.get('longitude', record.get('lon'))
+            if lat is None or lon is None:
+                continue
+            cities.append(record['city'])
+            lats.append(float(lat))
+            lons.append(float(lon))
+        return cls(cities, lats, lons)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __contains__(self, city):
+        return city in self._positions
+
+    def location(self, city):
+        i = self._positions[city]
+        return float(self.latitudes[i]), float(self.longitudes[i])
+
+    def _point(self, lat, lon):
+        return np.radians([[lat, lon]])
+
+    def within_radius(self, lat, lon, radius_km):
+        """Cities within radius_km as (city, distance_km), closest first"""
+        if self._tree is None:
+            return []
+        indices, distances = self._tree.query_radius(
+            self._point(lat, lon),
+            r=radius_km / EARTH_RADIUS_KM,
+            return_distance=True,
+            sort_results=True
+        )
+        return [
+            (self.cities[i], float(d * EARTH_RADIUS_KM))
+            for d, i in zip(distances[0], indices[0])
+        ]
+
+    def near_city(self, city, radius_km):
+        lat, lon = self.location(city)
+        return self.within_radius(lat, lon, radius_km)
+
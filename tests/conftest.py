@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# database.py reads DATABASE_URL at import, so it must be set before any test module imports it
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='vedya-tests-'), 'test.db'))
+os.environ.setdefault('AUTH_SECRET_KEY', 'test-secret')
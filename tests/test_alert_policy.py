@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from alert_policy import AlertPolicy, _decide, city_signals, level_rank
+from database import get_db, get_db_session, init_db
+from models import AlertState
+
+NOW = datetime(2025, 1, 1, 12, 0)
+COOLDOWN = timedelta(hours=12)
+MIN_RANK = level_rank('Moderate')
+
+
+@pytest.fixture(autouse=True)
+def alert_states():
+    init_db()
+    with get_db() as db:
+        db.query(AlertState).delete()
+    yield
+    with get_db() as db:
+        db.query(AlertState).delete()
+
+
+@pytest.mark.parametrize('state, level, expected', [
+    (None, 'Low', ('below_threshold', False)),
+    (None, 'Moderate', ('new', True)),
+    (('Moderate', level_rank('Moderate'), NOW - timedelta(hours=1)), 'High', ('escalate', True)),
+    (('Low', level_rank('Low'), None), 'Low', ('below_threshold', False)),
+    (('High', level_rank('High'), NOW - timedelta(hours=1)), 'Moderate', ('deescalate', False)),
+    (('High', level_rank('High'), NOW - timedelta(hours=1)), 'High', ('suppressed', False)),
+    (('High', level_rank('High'), NOW - COOLDOWN), 'High', ('repeat', True)),
+    (('High', level_rank('High'), None), 'High', ('repeat', True)),
+])
+def test_decide(state, level, expected):
+    assert _decide(state, level_rank(level), NOW, COOLDOWN, MIN_RANK) == expected
+
+
+def test_decide_records_rise_below_threshold_without_sending():
+    state = ('Low', level_rank('Low'), None)
+    assert _decide(state, level_rank('Moderate'), NOW, COOLDOWN, level_rank('High')) == ('raised', False)
+
+
+def _sweep(policy, level, now):
+    with get_db() as db:
+        decisions = policy.evaluate(db, [('Pune', 'Citizen', level)], now=now)
+        return policy.claim(db, decisions, now=now)
+
+
+def test_claim_has_one_winner_when_sessions_race():
+    policy = AlertPolicy()
+    first, second = get_db_session(), get_db_session()
+    try:
+        # Both sessions see no state yet, so both decide to send
+        first_decisions = policy.evaluate(first, [('Pune', 'Citizen', 'High')], now=NOW)
+        second_decisions = policy.evaluate(second, [('Pune', 'Citizen', 'High')], now=NOW)
+        assert first_decisions[0]['send'] and second_decisions[0]['send']
+
+        assert len(policy.claim(first, first_decisions, now=NOW)) == 1
+        first.commit()
+        assert policy.claim(second, second_decisions, now=NOW) == []
+        second.commit()
+    finally:
+        first.close()
+        second.close()
+
+
+def test_claim_respects_cooldown_and_escalation():
+    policy = AlertPolicy()
+    assert len(_sweep(policy, 'High', NOW)) == 1
+    assert _sweep(policy, 'High', NOW + timedelta(hours=1)) == []
+    assert len(_sweep(policy, 'Severe', NOW + timedelta(hours=2))) == 1
+    assert _sweep(policy, 'Severe', NOW + timedelta(hours=3)) == []
+    assert len(_sweep(policy, 'Severe', NOW + timedelta(hours=2) + COOLDOWN)) == 1
+
+
+def test_falling_level_is_recorded_so_next_rise_escalates():
+    policy = AlertPolicy()
+    assert len(_sweep(policy, 'Severe', NOW)) == 1
+    assert _sweep(policy, 'Moderate', NOW + timedelta(hours=1)) == []
+    with get_db() as db:
+        state = db.query(AlertState).one()
+        assert state.level == 'Moderate'
+        assert state.last_sent_at == NOW
+    assert len(_sweep(policy, 'High', NOW + timedelta(hours=2))) == 1
+
+
+def test_unknown_level_labels_raise():
+    with pytest.raises(ValueError):
+        level_rank('Elevated')
+
+
+def test_hospital_signal_is_ranked_on_the_numeric_spike_level():
+    assert city_signals('Pune', None, {'overall_severity': 'Elevated', 'overall_level': 2}) == [
+        ('Pune', 'Hospital', 'Elevated', 2)
+    ]
+    with get_db() as db:
+        decisions = AlertPolicy().evaluate(db, [('Pune', 'Hospital', 'Elevated', 2)], now=NOW)
+    assert decisions[0]['level_rank'] == 2
+    assert decisions[0]['action'] == 'new'
+
+
+def test_manual_send_skips_the_threshold_but_not_the_cooldown():
+    policy = AlertPolicy()
+    with get_db() as db:
+        decisions = policy.evaluate(db, [('Pune', 'Citizen', 'Low')], now=NOW, min_rank=0)
+        assert len(policy.claim(db, decisions, now=NOW)) == 1
+    with get_db() as db:
+        decisions = policy.evaluate(db, [('Pune', 'Citizen', 'Low')], now=NOW + timedelta(hours=1), min_rank=0)
+    assert decisions[0]['action'] == 'suppressed'
+
+
+def test_stale_deescalation_does_not_undo_a_concurrent_escalation():
+    policy = AlertPolicy()
+    assert len(_sweep(policy, 'High', NOW)) == 1
+    stale, racing = get_db_session(), get_db_session()
+    try:
+        lowered = policy.evaluate(stale, [('Pune', 'Citizen', 'Moderate')], now=NOW + timedelta(hours=1))
+        raised = policy.evaluate(racing, [('Pune', 'Citizen', 'Severe')], now=NOW + timedelta(hours=1))
+        assert len(policy.claim(racing, raised, now=NOW + timedelta(hours=1))) == 1
+        racing.commit()
+        policy.claim(stale, lowered, now=NOW + timedelta(hours=1))
+        stale.commit()
+    finally:
+        stale.close()
+        racing.close()
+    with get_db() as db:
+        assert db.query(AlertState).one().level == 'Severe'
@@ -0,0 +1,62 @@
+import pytest
+
+import auth
+from database import get_db, init_db
+from models import User
+
+PROFILE = {'id': 7, 'username': 'asha', 'role': 'hospital_admin', 'city': 'Pune'}
+
+
+@pytest.fixture
+def db():
+    init_db()
+    with get_db() as session:
+        session.query(User).delete()
+        yield session
+        session.query(User).delete()
+
+
+def test_token_round_trips_its_claims():
+    claims = auth.verify_token(auth.issue_token(PROFILE))
+    assert {k: claims[k] for k in ('uid', 'usr', 'role', 'city')} == {'uid': 7, 'usr': 'asha', 'role': 'hospital_admin', 'city': 'Pune'}
+
+
+def test_expired_and_tampered_tokens_are_rejected(monkeypatch):
+    expired = auth.issue_token(PROFILE, ttl=-1)
+    assert auth.verify_token(expired) is None
+
+    payload, signature = auth.issue_token(PROFILE).split('.')
+    forged = auth._b64encode(auth._b64decode(payload).replace(b'hospital_admin', b'admin')) + '.' + signature
+    assert auth.verify_token(forged) is None
+    assert auth.verify_token('not-a-token') is None
+    assert auth.verify_token(None) is None
+
+
+def test_login_upgrades_an_outdated_hash(db):
+    db.add(User(username='asha', email='asha@example.org', role='hospital_admin', city='Pune',
+                password_hash=auth.hash_password('s3cret', algorithm='pbkdf2_sha256')))
+    db.flush()
+
+    assert auth.authenticate(db, 'asha', 'wrong') is None
+    assert auth.authenticate(db, 'asha', 's3cret')['username'] == 'asha'
+    stored = db.query(User).filter(User.username == 'asha').one().password_hash
+    assert stored.startswith('scrypt$') and not auth.needs_rehash(stored)
+    assert auth.authenticate(db, 'asha', 's3cret') is not None
+
+
+def test_unknown_and_disabled_users_are_refused(db):
+    auth.create_user(db, 'ravi', 'ravi@example.org', 'pw')
+    db.query(User).filter(User.username == 'ravi').update({'is_active': False})
+    assert auth.authenticate(db, 'ravi', 'pw') is None
+    assert auth.authenticate(db, 'nobody', 'pw') is None
+
+
+def test_missing_secret_fails_when_signing(monkeypatch):
+    monkeypatch.delenv('AUTH_SECRET_KEY')
+    auth._secret_key.cache_clear()
+    try:
+        with pytest.raises(ValueError, match='AUTH_SECRET_KEY'):
+            auth.issue_token(PROFILE)
+    finally:
+        monkeypatch.undo()
+        auth._secret_key.cache_clear()
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from database import upgrade_schema
+
+
+def test_upgrade_relaxes_not_null_on_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE accepted_plans (id INTEGER PRIMARY KEY, city VARCHAR(100) NOT NULL, "
+            "severity VARCHAR(50) NOT NULL, timestamp DATETIME NOT NULL, plan_data JSON NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO accepted_plans (city, severity, timestamp, plan_data) "
+            "VALUES ('Pune', 'High', '2025-01-01 00:00:00', '{}')"
+        ))
+
+    upgrade_schema(engine)
+
+    columns = {c['name']: c for c in inspect(engine).get_columns('accepted_plans')}
+    assert columns['plan_data']['nullable']
+    assert 'plan_hash' in columns
+    assert 'ix_accepted_plans_city_timestamp' in {i['name'] for i in inspect(engine).get_indexes('accepted_plans')}
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO accepted_plans (city, severity, timestamp) VALUES ('Delhi', 'Low', '2025-01-02 00:00:00')"
+        ))
+        assert conn.execute(text("SELECT city FROM accepted_plans ORDER BY id")).scalars().all() == ['Pune', 'Delhi']
+
+
+def _legacy_snapshots(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'snapshots.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE data_snapshots (id INTEGER PRIMARY KEY, city VARCHAR(100) NOT NULL, "
+                          "date DATETIME NOT NULL, aqi FLOAT)"))
+        conn.execute(text("INSERT INTO data_snapshots (city, date, aqi) VALUES "
+                          "('Pune', '2025-01-01 00:00:00', 1), ('Pune', '2025-01-01 00:00:00', 2), "
+                          "('Delhi', '2025-01-01 00:00:00', 3)"))
+    return engine
+
+
+def test_upgrade_refuses_a_unique_index_over_duplicates(tmp_path):
+    engine = _legacy_snapshots(tmp_path)
+    with pytest.raises(RuntimeError, match='Pune'):
+        upgrade_schema(engine, dedupe=False)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM data_snapshots")).scalar() == 3
+
+
+def test_upgrade_dedupe_keeps_the_latest_row(tmp_path):
+    engine = _legacy_snapshots(tmp_path)
+    upgrade_schema(engine, dedupe=True)
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT city, aqi FROM data_snapshots ORDER BY city")).all()
+    assert [tuple(row) for row in rows] == [('Delhi', 3.0), ('Pune', 2.0)]
+    assert 'ux_data_snapshots_city_date' in {i['name'] for i in inspect(engine).get_indexes('data_snapshots')}
@@ -0,0 +1,62 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import get_db, init_db
+from history import alert_history, iter_history, stream_csv
+from models import AlertSent
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def alerts():
+    init_db()
+    with get_db() as db:
+        db.query(AlertSent).delete()
+        # Pairs share a timestamp so the id tie-breaker decides their order
+        db.add_all(
+            AlertSent(alert_type='Citizen' if i % 3 else 'Hospital', city='Pune' if i % 2 else 'Delhi',
+                      severity='High', message='m', timestamp=START + timedelta(hours=i // 2))
+            for i in range(11)
+        )
+    with get_db() as db:
+        yield [(row.timestamp, row.id) for row in
+               db.query(AlertSent).order_by(AlertSent.timestamp.desc(), AlertSent.id.desc())]
+    with get_db() as db:
+        db.query(AlertSent).delete()
+
+
+def test_pages_walk_every_row_once_newest_first(alerts):
+    seen, cursor = [], None
+    with get_db() as db:
+        while True:
+            rows, cursor = alert_history(db, limit=3, cursor=cursor)
+            seen.extend((row.timestamp, row.id) for row in rows)
+            if cursor is None:
+                break
+    assert seen == alerts
+
+
+def test_last_full_page_has_no_next_cursor(alerts):
+    with get_db() as db:
+        rows, cursor = alert_history(db, limit=len(alerts))
+    assert len(rows) == len(alerts) and cursor is None
+
+
+def test_filters_apply_across_pages(alerts):
+    with get_db() as db:
+        rows = list(iter_history(db, 'alerts', batch_size=2, city='Pune', alert_type='Citizen'))
+    assert rows and all(row.city == 'Pune' and row.alert_type == 'Citizen' for row in rows)
+    assert [row.id for row in rows] == sorted((row.id for row in rows), reverse=True)
+
+
+def test_csv_export_streams_header_and_every_row(alerts):
+    with get_db() as db:
+        chunks = list(stream_csv(db, 'alerts', batch_size=4))
+    assert len(chunks) > 1
+    lines = list(csv.reader(io.StringIO(''.join(chunks))))
+    assert lines[0][:2] == ['id', 'timestamp']
+    assert [int(line[0]) for line in lines[1:]] == [row_id for _, row_id in alerts]
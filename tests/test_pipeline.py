@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import get_db, get_db_session, init_db
+from models import DataSnapshot
+from pipeline import PollingChangeSource
+
+NOW = datetime(2025, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def snapshots():
+    init_db()
+    with get_db() as db:
+        db.query(DataSnapshot).delete()
+
+    def add(city, created_at):
+        with get_db() as db:
+            db.add(DataSnapshot(city=city, date=created_at, created_at=created_at))
+
+    yield add
+    with get_db() as db:
+        db.query(DataSnapshot).delete()
+
+
+def test_polling_reports_each_new_row_once(snapshots):
+    source = PollingChangeSource(get_db_session, since=NOW, lookback=60)
+    assert source.poll() == set()
+
+    snapshots('Pune', NOW + timedelta(seconds=1))
+    snapshots('Delhi', NOW + timedelta(seconds=2))
+    assert source.poll() == {'Pune', 'Delhi'}
+    assert source.poll() == set()
+    assert source.high_water == NOW + timedelta(seconds=2)
+
+
+def test_polling_sees_late_commits_inside_the_lookback(snapshots):
+    source = PollingChangeSource(get_db_session, since=NOW, lookback=60)
+    snapshots('Pune', NOW + timedelta(seconds=30))
+    assert source.poll() == {'Pune'}
+    source.poll()
+
+    # Inserted earlier than the high-water row but committed after it was seen
+    snapshots('Delhi', NOW + timedelta(seconds=10))
+    assert source.poll() == {'Delhi'}
+    assert source.poll() == set()
+
+
+def test_polling_ignores_rows_aging_out_of_the_window(snapshots):
+    source = PollingChangeSource(get_db_session, since=NOW, lookback=60)
+    snapshots('Pune', NOW + timedelta(seconds=1))
+    assert source.poll() == {'Pune'}
+    snapshots('Delhi', NOW + timedelta(minutes=10))
+    assert source.poll() == {'Delhi'}
+    assert source.poll() == set()
+    snapshots('Pune', NOW + timedelta(minutes=10, seconds=5))
+    assert source.poll() == {'Pune'}
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from database import get_db, init_db
+from models import AcceptedPlan, PlanBlob
+from plan_store import load_plan, save_accepted_plan
+from planning import BatchPlan
+
+
+@pytest.fixture
+def db():
+    init_db()
+    with get_db() as session:
+        yield session
+        session.query(AcceptedPlan).delete()
+        session.query(PlanBlob).delete()
+
+
+def test_plans_of_one_severity_share_a_blob_and_round_trip(db):
+    short = BatchPlan(['Pune'], ['High'], np.full((1, 3), 40.0), np.full((1, 3), 12.0)).plan('Pune')
+    long = BatchPlan(['Delhi'], ['High'], np.full((1, 7), 90.0), np.full((1, 7), 30.0)).plan('Delhi')
+    assert short['resource_requirements']['medicines'] != long['resource_requirements']['medicines']
+
+    first = save_accepted_plan(db, 'Pune', short)
+    second = save_accepted_plan(db, 'Delhi', long)
+    db.flush()
+
+    assert first.plan_hash == second.plan_hash
+    assert db.query(PlanBlob).count() == 1
+    assert load_plan(db, first) == short
+    assert load_plan(db, second) == long
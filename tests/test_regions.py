@@ -0,0 +1,46 @@
+import numpy as np
+
+from regions import reconcile_forecasts, summing_matrix
+
+HIERARCHY = {
+    'Pune': ('Pune', 'Maharashtra'),
+    'Mumbai': ('Mumbai', 'Maharashtra'),
+    'Delhi': ('New Delhi', 'Delhi'),
+}
+CITIES = {'Pune': [10.0, 12.0], 'Mumbai': [20.0, 22.0], 'Delhi': [5.0, 6.0]}
+
+
+def _assert_coherent(result, cities):
+    nodes, S = summing_matrix(list(cities), HIERARCHY)
+    bottom = np.vstack([result[('city', city)] for city in cities])
+    for row, key in enumerate(nodes):
+        np.testing.assert_allclose(result[key], S[row] @ bottom)
+
+
+def test_without_region_forecasts_the_bottom_up_sums_are_kept():
+    result = reconcile_forecasts(CITIES, hierarchy=HIERARCHY)
+    np.testing.assert_allclose(result[('state', 'Maharashtra')], [30.0, 34.0])
+    np.testing.assert_allclose(result[('country', 'India')], [35.0, 40.0])
+    np.testing.assert_allclose(result[('city', 'Pune')], CITIES['Pune'])
+
+
+def test_region_forecasts_are_reconciled_by_ols_and_stay_coherent():
+    region = {('state', 'Maharashtra'): [36.0, 40.0], ('country', 'India'): [44.0, 48.0]}
+    result = reconcile_forecasts(CITIES, hierarchy=HIERARCHY, region_forecasts=region)
+    _assert_coherent(result, CITIES)
+
+    nodes, S = summing_matrix(list(CITIES), HIERARCHY)
+    base = S @ np.vstack(list(CITIES.values()))
+    for row, key in enumerate(nodes):
+        if key in region:
+            base[row] = region[key]
+    expected = S @ np.linalg.solve(S.T @ S, S.T @ base)
+    for row, key in enumerate(nodes):
+        np.testing.assert_allclose(result[key], expected[row])
+    # The higher state forecast pulls the Maharashtra cities up, not Delhi alone
+    assert result[('city', 'Pune')][0] > CITIES['Pune'][0]
+    assert result[('city', 'Mumbai')][0] > CITIES['Mumbai'][0]
+
+
+def test_no_cities_reconciles_to_nothing():
+    assert reconcile_forecasts({}, hierarchy=HIERARCHY) == {}
@@ -0,0 +1,59 @@
+import pytest
+
+from result_cache import MemoryBackend, SharedResultCache
+
+KEY = ('Pune', 'forecast', (('forecast_days', 7), ('source', 'abc')))
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend()
+
+
+def _replica(backend, **kwargs):
+    return SharedResultCache(backend, secret='test-secret', generation_ttl=0, **kwargs)
+
+
+def test_results_are_shared_until_another_replica_invalidates(backend):
+    first, second = _replica(backend), _replica(backend)
+    assert first.get(KEY, 0) == (False, None)
+    first.put(KEY, 0, 'computed')
+    assert second.get(KEY, 0) == (True, 'computed')
+
+    second.discard_city('Pune')
+    assert first.get(KEY, 0) == (False, None)
+    assert second.get(KEY, 0) == (False, None)
+    assert second.get(('Delhi',) + KEY[1:], 0) == (False, None)
+
+
+def test_result_computed_before_an_invalidation_is_filed_under_the_old_generation(backend):
+    first, second = _replica(backend), _replica(backend)
+    first.get(KEY, 0)
+    second.discard_city('Pune')
+    first.put(KEY, 0, 'stale')
+    assert second.get(KEY, 0) == (False, None)
+
+
+def test_a_different_source_fingerprint_is_a_different_entry(backend):
+    first, second = _replica(backend), _replica(backend)
+    first.put(KEY, 0, 'computed')
+    assert second.get(KEY[:2] + ((('forecast_days', 7), ('source', 'def')),), 0) == (False, None)
+
+
+def test_generation_is_reused_within_its_ttl(backend):
+    first = _replica(backend)
+    cached = SharedResultCache(backend, secret='test-secret', generation_ttl=60)
+    cached.put(KEY, 0, 'computed')
+    assert cached.get(KEY, 0) == (True, 'computed')
+    first.discard_city('Pune')
+    # Another replica's bump is not seen until the cached generation expires
+    assert cached.get(KEY, 0) == (True, 'computed')
+    cached.discard_city('Pune')
+    assert cached.get(KEY, 0) == (False, None)
+
+
+def test_entries_signed_with_another_secret_are_not_loaded(backend):
+    SharedResultCache(backend, secret='one', generation_ttl=0).put(KEY, 0, 'computed')
+    other = SharedResultCache(backend, secret='two', generation_ttl=0)
+    assert other.get(KEY, 0) == (False, None)
+    assert other.stats['shared_errors'] == 1
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from database import get_db, get_db_session, init_db
+from models import DataSnapshot
+from timeseries import SnapshotHistory, TimeSeriesStore
+
+START = datetime(2025, 1, 1)
+
+
+def _fill(store, city, count):
+    for i in range(count):
+        store.append(city, START + timedelta(days=i), {'aqi': float(i), 'total_cases': float(10 * i)})
+
+
+@pytest.mark.parametrize('count', [2, 3, 4, 7, 9])
+def test_window_is_last_readings_oldest_first_across_wraparound(count):
+    store = TimeSeriesStore(capacity=3, metrics=('aqi', 'total_cases'))
+    _fill(store, 'Pune', count)
+
+    expected = [float(i) for i in range(max(0, count - 3), count)]
+    assert store.size('Pune') == len(expected)
+    assert store.window('Pune', 'aqi').tolist() == expected
+    assert store.window('Pune', 'total_cases').tolist() == [10 * v for v in expected]
+    assert store.window('Pune', 'aqi', 2).tolist() == expected[-2:]
+    assert [ts.astype(datetime) for ts in store.timestamps('Pune')] == [
+        START + timedelta(days=int(v)) for v in expected
+    ]
+    assert store.latest('Pune')['aqi'] == expected[-1]
+
+
+def test_window_is_a_read_only_view_of_the_buffer():
+    store = TimeSeriesStore(capacity=3, metrics=('aqi',))
+    _fill(store, 'Pune', 5)
+    view = store.window('Pune', 'aqi')
+    assert np.shares_memory(view, store._values['aqi'])
+    with pytest.raises(ValueError):
+        view[0] = 1.0
+
+
+def test_cities_are_independent_and_grow_past_initial_rows():
+    store = TimeSeriesStore(capacity=2, metrics=('aqi',), initial_cities=1)
+    _fill(store, 'Pune', 3)
+    _fill(store, 'Mumbai', 1)
+    assert store.cities == ['Pune', 'Mumbai']
+    assert store.window('Pune', 'aqi').tolist() == [1.0, 2.0]
+    assert store.window('Mumbai', 'aqi').tolist() == [0.0]
+    assert store.size('Delhi') == 0
+
+
+@pytest.fixture
+def snapshots():
+    init_db()
+    with get_db() as db:
+        db.query(DataSnapshot).delete()
+
+    def add(city, dates):
+        with get_db() as db:
+            db.add_all(DataSnapshot(city=city, date=d, aqi=float(i)) for i, d in enumerate(dates))
+
+    yield add
+    with get_db() as db:
+        db.query(DataSnapshot).delete()
+
+
+def test_history_holds_sub_daily_readings_for_the_whole_window(snapshots):
+    end = START + timedelta(days=6)
+    snapshots('Pune', [START + timedelta(hours=6 * i) for i in range(28)])
+    history = SnapshotHistory(get_db_session, days=7, readings_per_day=4, metrics=('aqi',))
+
+    frame = history.history('Pune', days=7, end=end)
+    assert len(frame) == 28
+    assert frame['date'].iloc[0] == START
+
+
+def test_history_drains_a_backlog_larger_than_one_batch(snapshots):
+    snapshots('Pune', [START])
+    history = SnapshotHistory(get_db_session, days=2, readings_per_day=2, metrics=('aqi',))
+    assert history.history('Pune', days=1, end=START) is not None
+
+    snapshots('Pune', [START + timedelta(hours=i) for i in range(1, 10)])
+    history.history('Pune', days=1, end=START)
+    assert history.store.latest('Pune')['date'] == START + timedelta(hours=9)
+    assert history.store.window('Pune', 'aqi').tolist() == [5.0, 6.0, 7.0, 8.0]
+
+
+def test_history_reads_daily_buckets_when_readings_outrun_the_buffer(snapshots):
+    end = START + timedelta(days=2, hours=23)
+    snapshots('Pune', [START + timedelta(hours=6 * i) for i in range(12)])
+    history = SnapshotHistory(get_db_session, days=1, readings_per_day=4, metrics=('aqi',))
+
+    frame = history.history('Pune', days=3, end=end)
+    assert frame['date'].tolist() == [START + timedelta(days=i) for i in range(3)]
+    assert frame['aqi'].tolist() == [1.5, 5.5, 9.5]
+
+
+def test_history_is_none_without_readings_in_the_window(snapshots):
+    snapshots('Pune', [START - timedelta(days=30)])
+    history = SnapshotHistory(get_db_session, days=2, readings_per_day=1, metrics=('aqi',))
+    assert history.history('Pune', days=2, end=START) is None
+    assert history.history('Delhi', days=2, end=START) is None
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from database import get_db, init_db
+from models import RejectedPlan
+from write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    init_db()
+    with get_db() as db:
+        db.query(RejectedPlan).delete()
+    yield WriteBehindQueue(journal_path=str(tmp_path / 'journal'), max_batch=10)
+    with get_db() as db:
+        db.query(RejectedPlan).delete()
+
+
+def _journal(path):
+    with open(path, encoding='utf-8') as journal:
+        return [json.loads(line) for line in journal if line.strip()]
+
+
+def test_bad_record_is_dead_lettered_and_the_rest_commit(queue):
+    queue.enqueue_rejected_plan('Pune', 'High', reason='staffing')
+    queue.enqueue_rejected_plan('Delhi', None, reason='missing severity')
+    queue.enqueue_rejected_plan('Mumbai', 'Low')
+
+    assert queue.flush() == 2
+    with get_db() as db:
+        assert sorted(city for (city,) in db.query(RejectedPlan.city)) == ['Mumbai', 'Pune']
+    dead = _journal(queue.dead_letter_path)
+    assert [entry['fields']['city'] for entry in dead] == ['Delhi']
+    assert dead[0]['error']
+    assert _journal(queue.journal_path) == []
+    metrics = queue.metrics()
+    assert (metrics['flushed'], metrics['dead_lettered'], metrics['pending']) == (2, 1, 0)
+
+
+def test_unflushed_records_are_replayed_from_the_journal(queue):
+    queue.enqueue_rejected_plan('Pune', 'High')
+    restarted = WriteBehindQueue(journal_path=queue.journal_path, max_batch=10)
+    assert restarted.metrics()['replayed'] == 1
+    assert restarted.flush() == 1
+    with get_db() as db:
+        assert db.query(RejectedPlan).count() == 1
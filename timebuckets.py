@@ -0,0 +1,325 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, cast, func, inspect, literal_column, select, text
+
+from models import DataSnapshot
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {
+    '15min': 15,
+    'hourly': 60,
+    'daily': 1440,
+}
+
+# How sub-daily readings roll up to one row per city per day. Case and
+# hospitalisation counts are stock figures reported cumulatively through the
+# day, so the bucket keeps the latest reading rather than summing repeats.
+DAILY_AGGREGATION = {
+    'aqi': 'mean',
+    'pm25': 'mean',
+    'pm10': 'mean',
+    'temperature': 'mean',
+    'humidity': 'mean',
+    'wind_speed': 'mean',
+    'total_cases': 'last',
+    'respiratory_cases': 'last',
+    'hospitalizations': 'last',
+    'weather_condition': 'last',
+}
+
+# Model indexes left off a partitioned data_snapshots: the BRIN index covers date,
+# and (city, date) covers city. The last two are what index=True used to create.
+PARTITIONED_SKIP_INDEXES = ('ix_data_snapshots_date', 'ix_data_snapshots_id', 'ix_data_snapshots_city')
+
+PARTITIONING_ENABLED = os.environ.get('SNAPSHOT_PARTITIONING', '').lower() in ('1', 'true', 'yes')
+PARTITION_MONTHS_AHEAD = 3
+PARTITION_CHECK_INTERVAL = 6 * 3600
+
+PARTITIONED_TABLE_DDL = """
+CREATE TABLE data_snapshots (
+    id BIGSERIAL,
+    city VARCHAR(100) NOT NULL,
+    date TIMESTAMP NOT NULL,
+    aqi DOUBLE PRECISION,
+    pm25 DOUBLE PRECISION,
+    pm10 DOUBLE PRECISION,
+    temperature DOUBLE PRECISION,
+    humidity DOUBLE PRECISION,
+    wind_speed DOUBLE PRECISION,
+    total_cases INTEGER,
+    respiratory_cases INTEGER,
+    hospitalizations INTEGER,
+    weather_condition VARCHAR(100),
+    data_source VARCHAR(50) DEFAULT 'csv',
+    resolution_minutes INTEGER DEFAULT 1440,
+    created_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc'),
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date)
+"""
+
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value):
+    return datetime(value.year + (value.month == 12), value.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"data_snapshots_{month:%Y_%m}"
+
+
+def create_partitioned_snapshots(engine):
+    """Create data_snapshots as a range-partitioned table, if it does not exist yet.
+
+    Call before create_all(); create_all() then leaves the table alone. The
+    indexes are declared on the parent so every monthly partition gets its own
+    small local copy. A BRIN index on date stays tiny however many rows land.
+    """
+    if engine.dialect.name != 'postgresql' or inspect(engine).has_table('data_snapshots'):
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(PARTITIONED_TABLE_DDL))
+        conn.execute(text("CREATE UNIQUE INDEX ux_data_snapshots_city_date ON data_snapshots (city, date)"))
+        conn.execute(text("CREATE INDEX ix_data_snapshots_date_brin ON data_snapshots USING brin (date)"))
+        conn.execute(text("CREATE INDEX ix_data_snapshots_created_at ON data_snapshots (created_at, id)"))
+        conn.execute(text(
+            "CREATE TABLE data_snapshots_default PARTITION OF data_snapshots DEFAULT"
+        ))
+    ensure_partitions(engine)
+    return True
+
+
+def is_partitioned(engine):
+    if engine.dialect.name != 'postgresql':
+        return False
+    with engine.connect() as conn:
+        return bool(conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'data_snapshots'"
+        )).scalar())
+
+
+def drop_skipped_indexes(engine):
+    """Remove per-partition btree indexes that earlier schema upgrades created"""
+    if not is_partitioned(engine):
+        return
+    with engine.begin() as conn:
+        for name in PARTITIONED_SKIP_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _months(start, end):
+    month = _month_start(start)
+    while month <= end:
+        yield month
+        month = _next_month(month)
+
+
+def _attached_partitions(conn):
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'data_snapshots'"
+    )).scalars())
+
+
+def _default_months(conn):
+    """Months with rows stranded in the DEFAULT partition (backfills, missed schedules)"""
+    return {_month_start(month) for month in conn.execute(text(
+        "SELECT DISTINCT date_trunc('month', date) FROM data_snapshots_default"
+    )).scalars()}
+
+
+def _create_partition(conn, month, has_default_rows):
+    name = partition_name(month)
+    bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    if not has_default_rows:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF data_snapshots {bounds}"))
+        return
+    # PARTITION OF refuses a range the DEFAULT partition already holds rows for,
+    # so build the table, move those rows into it, then attach it
+    conn.execute(text(f"CREATE TABLE {name} (LIKE data_snapshots INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM data_snapshots_default WHERE date >= :start AND date < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {'start': month, 'end': _next_month(month)})
+    conn.execute(text(f"ALTER TABLE data_snapshots ATTACH PARTITION {name} {bounds}"))
+
+
+_covered = set()
+_covered_lock = threading.Lock()
+
+
+def ensure_partitions(engine, start=None, end=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Create the monthly partitions that are missing; returns their names.
+
+    Covers start through max(end, months_ahead months from now), plus every
+    month that has rows sitting in the DEFAULT partition, which are moved into
+    the new partition.
+    """
+    if not is_partitioned(engine):
+        return []
+    now = datetime.utcnow()
+    last = _month_start(now)
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    if end is not None:
+        last = max(last, _month_start(end))
+    created = []
+    with engine.begin() as conn:
+        attached = _attached_partitions(conn)
+        stranded = _default_months(conn)
+        wanted = set(_months(start or now, last)) | stranded
+        for month in sorted(wanted):
+            if partition_name(month) not in attached:
+                _create_partition(conn, month, month in stranded)
+                created.append(partition_name(month))
+    with _covered_lock:
+        _covered.update(wanted)
+    if created:
+        logger.info("Created snapshot partitions: %s", ", ".join(created))
+    return created
+
+
+def cover_range(engine, start, end):
+    """ensure_partitions() for a write spanning start..end, skipped when already covered"""
+    with _covered_lock:
+        missing = any(month not in _covered for month in _months(start, end))
+    if missing:
+        ensure_partitions(engine, start=start, end=end)
+
+
+class PartitionMaintainer:
+    """Background thread that keeps monthly partitions created ahead of time"""
+
+    def __init__(self, engine, interval=PARTITION_CHECK_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='partition-maintainer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            try:
+                ensure_partitions(self.engine)
+            except Exception:
+                logger.exception("Partition maintenance failed")
+            self._stopped.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+def bucket(column, minutes, dialect_name):
+    """SQL expression truncating a timestamp to a bucket of the given width"""
+    if dialect_name == 'postgresql':
+        if minutes == 1440:
+            return func.date_trunc(literal_column("'day'"), column)
+        if minutes == 60:
+            return func.date_trunc(literal_column("'hour'"), column)
+        return func.date_bin(
+            literal_column(f"interval '{int(minutes)} minutes'"),
+            column,
+            literal_column("timestamp '2000-01-01'")
+        )
+    # SQLite fallback: bucket on seconds since the epoch
+    seconds = int(minutes) * 60
+    epoch = cast(func.strftime('%s', column), Integer)
+    return func.datetime((epoch // seconds) * seconds, 'unixepoch')
+
+
+def query_buckets(db, city, start, end, minutes=1440):
+    """Rows of (bucket, metrics...) for one city, aggregated in the database.
+
+    'last' takes the whole latest row in each bucket (ordered by date, then id),
+    the same row resample_daily() keeps, so both paths agree.
+    """
+    width = bucket(DataSnapshot.date, minutes, db.get_bind().dialect.name)
+    columns = [width.label('date')]
+    for field, how in DAILY_AGGREGATION.items():
+        column = getattr(DataSnapshot, field)
+        if how == 'mean':
+            columns.append(func.avg(column).over(partition_by=width).label(field))
+        elif how == 'sum':
+            columns.append(func.sum(column).over(partition_by=width).label(field))
+        else:
+            columns.append(column.label(field))
+    columns.append(func.row_number().over(
+        partition_by=width, order_by=(DataSnapshot.date.desc(), DataSnapshot.id.desc())
+    ).label('bucket_rank'))
+    ranked = (
+        select(*columns)
+        .where(DataSnapshot.city == city, DataSnapshot.date >= start, DataSnapshot.date < end)
+        .subquery()
+    )
+    return db.execute(
+        select(ranked.c.date, *[ranked.c[field] for field in DAILY_AGGREGATION])
+        .where(ranked.c.bucket_rank == 1)
+        .order_by(ranked.c.date)
+    ).all()
+
+
+def daily_history(db, city, days=14, end=None):
+    """historical_df-shaped daily frame for a city, whatever resolution was stored"""
+    import pandas as pd
+
+    end = end or datetime.utcnow()
+    start = datetime(end.year, end.month, end.day) - timedelta(days=days - 1)
+    rows = query_buckets(db, city, start, end, minutes=1440)
+    frame = pd.DataFrame([row._asdict() for row in rows], columns=['date'] + list(DAILY_AGGREGATION))
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame['city'] = city
+    return frame
+
+
+def _last_value(series):
+    # The latest reading's value, null or not, like the SQL path; pandas 'last' skips NaN
+    return series.iloc[-1]
+
+
+def resample_daily(df):
+    """Resample a sub-daily frame (city, date, metrics) to one row per city per day"""
+    import pandas as pd
+
+    if df.empty:
+        return df
+    frame = df.copy()
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame = frame.sort_values('date', kind='stable')
+    frame['date'] = frame['date'].dt.floor('D')
+    keys = ['city', 'date'] if 'city' in frame.columns else ['date']
+    aggregation = {
+        field: (_last_value if how == 'last' else how)
+        for field, how in DAILY_AGGREGATION.items() if field in frame.columns
+    }
+    daily = frame.groupby(keys, sort=True).agg(aggregation).reset_index()
+    return daily
+
+
+def ensure_daily(df):
+    """resample_daily() a history frame that holds more than one reading per city per day"""
+    import pandas as pd
+
+    if df is None or df.empty or 'date' not in df.columns:
+        return df
+    keys = pd.DataFrame({'date': pd.to_datetime(df['date']).dt.floor('D')})
+    if 'city' in df.columns:
+        keys['city'] = df['city'].values
+    if not keys.duplicated().any():
+        return df
+    return resample_daily(df)
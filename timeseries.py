@@ -0,0 +1,233 @@
+import threading
+from datetime import datetime, timedelta
+
+from ingestion import DEFAULT_RESOLUTION_MINUTES
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+DEFAULT_METRICS = (
+    'aqi', 'pm25', 'pm10', 'temperature', 'humidity', 'wind_speed',
+    'total_cases', 'respiratory_cases', 'hospitalizations'
+)
+
+# Sensor feeds report several times a day, so a window of days needs this many slots per day
+READINGS_PER_DAY = 24 * 60 // DEFAULT_RESOLUTION_MINUTES
+
+
+class TimeSeriesStore:
+    """Fixed-size per-city ring buffers for each metric.
+
+    Every slot is written twice (at ``i`` and ``i + capacity``) so the most
+    recent ``n`` readings are always one contiguous slice. ``window()``
+    therefore returns a read-only view instead of a copy.
+    """
+
+    def __init__(self, capacity=30, metrics=DEFAULT_METRICS, dtype='float32', initial_cities=64):
+        self.capacity = capacity
+        self.metrics = tuple(metrics)
+        self.dtype = dtype
+        self._city_ids = {}
+        self._city_names = []
+        rows = max(1, initial_cities)
+        self._values = {m: np.full((rows, 2 * capacity), np.nan, dtype=dtype) for m in self.metrics}
+        self._timestamps = np.zeros((rows, 2 * capacity), dtype='datetime64[s]')
+        self._counts = np.zeros(rows, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._city_names)
+
+    def __contains__(self, city):
+        return city in self._city_ids
+
+    @property
+    def cities(self):
+        return list(self._city_names)
+
+    @property
+    def nbytes(self):
+        total = self._timestamps.nbytes + self._counts.nbytes
+        return total + sum(arr.nbytes for arr in self._values.values())
+
+    def _grow(self):
+        rows = self._counts.shape[0] * 2
+        for metric, arr in self._values.items():
+            grown = np.full((rows, arr.shape[1]), np.nan, dtype=self.dtype)
+            grown[:arr.shape[0]] = arr
+            self._values[metric] = grown
+        timestamps = np.zeros((rows, self._timestamps.shape[1]), dtype='datetime64[s]')
+        timestamps[:self._timestamps.shape[0]] = self._timestamps
+        self._timestamps = timestamps
+        counts = np.zeros(rows, dtype=np.int64)
+        counts[:self._counts.shape[0]] = self._counts
+        self._counts = counts
+
+    def city_id(self, city):
+        """Dense integer id for a city, assigned on first sight"""
+        cid = self._city_ids.get(city)
+        if cid is None:
+            cid = len(self._city_names)
+            if cid >= self._counts.shape[0]:
+                self._grow()
+            self._city_ids[city] = cid
+            self._city_names.append(city)
+        return cid
+
+    def append(self, city, timestamp, values):
+        cid = self.city_id(city)
+        slot = self._counts[cid] % self.capacity
+        mirror = slot + self.capacity
+        for metric in self.metrics:
+            value = values.get(metric)
+            value = np.nan if value is None else value
+            row = self._values[metric][cid]
+            row[slot] = value
+            row[mirror] = value
+        ts = np.datetime64(timestamp, 's')
+        self._timestamps[cid, slot] = ts
+        self._timestamps[cid, mirror] = ts
+        self._counts[cid] += 1
+
+    def extend(self, city, records):
+        for record in records:
+            self.append(city, record['date'], record)
+
+    def size(self, city):
+        cid = self._city_ids.get(city)
+        if cid is None:
+            return 0
+        return int(min(self._counts[cid], self.capacity))
+
+    def _bounds(self, cid, n):
+        available = min(self._counts[cid], self.capacity)
+        n = available if n is None else min(n, available)
+        end = self._counts[cid] % self.capacity + self.capacity
+        return end - n, end
+
+    def window(self, city, metric, n=None):
+        """Last n readings of a metric, oldest first, as a zero-copy view"""
+        cid = self._city_ids[city]
+        start, end = self._bounds(cid, n)
+        view = self._values[metric][cid, start:end]
+        view.flags.writeable = False
+        return view
+
+    def timestamps(self, city, n=None):
+        cid = self._city_ids[city]
+        start, end = self._bounds(cid, n)
+        view = self._timestamps[cid, start:end]
+        view.flags.writeable = False
+        return view
+
+    def latest(self, city):
+        if not self.size(city):
+            return None
+        record = {m: float(self.window(city, m, 1)[0]) for m in self.metrics}
+        record['city'] = city
+        record['date'] = self.timestamps(city, 1)[0].astype(datetime)
+        return record
+
+    def window_frame(self, city, n=None):
+        """DataFrame over the window for agents that expect a historical_df"""
+        import pandas as pd
+
+        data = {'date': pd.to_datetime(self.timestamps(city, n))}
+        for metric in self.metrics:
+            data[metric] = self.window(city, metric, n)
+        frame = pd.DataFrame(data, copy=False)
+        frame['city'] = city
+        return frame
+
+
+def load_recent_snapshots(store, db, since=None):
+    """Fill a store from data_snapshots using a column projection, not ORM objects"""
+    from models import DataSnapshot
+
+    columns = [DataSnapshot.city, DataSnapshot.date] + [getattr(DataSnapshot, m) for m in store.metrics]
+    query = db.query(*columns)
+    if since is not None:
+        query = query.filter(DataSnapshot.date >= since)
+    query = query.order_by(DataSnapshot.city, DataSnapshot.date)
+
+    loaded = 0
+    for row in query.yield_per(5000):
+        store.append(row.city, row.date, row._mapping)
+        loaded += 1
+    return loaded
+
+
+class SnapshotHistory:
+    """History node source backed by a TimeSeriesStore filled from data_snapshots.
+
+    The buffer holds ``days`` days of readings at ``readings_per_day``. Each
+    call first appends the city's snapshots newer than its last buffered
+    reading (one (city, date) index range scan). Rows that arrive with an older
+    date than that are not picked up. Frames are per reading; the history node
+    resamples them to days.
+
+    When a feed reports more often than readings_per_day and the buffer does
+    not reach back to the start of the window, the window is read as daily
+    buckets aggregated in the database instead. Returns None when neither
+    covers it, so the caller can fall back to the data agent.
+    """
+
+    def __init__(self, session_factory=None, days=14, readings_per_day=READINGS_PER_DAY, metrics=DEFAULT_METRICS):
+        if session_factory is None:
+            from database import get_db_session
+            session_factory = lambda: get_db_session('history')
+        self.session_factory = session_factory
+        self.store = TimeSeriesStore(capacity=days * readings_per_day, metrics=metrics)
+        self._lock = threading.Lock()
+
+    def _refresh(self, city):
+        from models import DataSnapshot
+
+        columns = [DataSnapshot.date] + [getattr(DataSnapshot, m) for m in self.store.metrics]
+        limit = self.store.capacity
+        loaded = 0
+        db = self.session_factory()
+        try:
+            query = db.query(*columns).filter(DataSnapshot.city == city)
+            if not self.store.size(city):
+                rows = list(reversed(query.order_by(DataSnapshot.date.desc()).limit(limit).all()))
+                self.store.extend(city, (row._mapping for row in rows))
+                return len(rows)
+            # Drained in capacity-sized batches so a backlog larger than one batch is not left behind
+            while True:
+                latest = self.store.timestamps(city, 1)[0].astype(datetime)
+                rows = query.filter(DataSnapshot.date > latest).order_by(DataSnapshot.date).limit(limit).all()
+                self.store.extend(city, (row._mapping for row in rows))
+                loaded += len(rows)
+                if len(rows) < limit:
+                    return loaded
+        finally:
+            db.close()
+
+    def history(self, city, days=14, end=None):
+        """historical_df-shaped frame for the last `days` days, or None if not covered"""
+        end = end or datetime.utcnow()
+        start = np.datetime64(datetime(end.year, end.month, end.day) - timedelta(days=days - 1), 's')
+        with self._lock:
+            self._refresh(city)
+            if not self.store.size(city):
+                return None
+            stamps = self.store.timestamps(city)
+            if stamps[0] > start:
+                return self._daily_history(city, days, end, start)
+            n = len(stamps) - int(np.searchsorted(stamps, start, side='left'))
+            if n == 0:
+                return None
+            # Copied: the cached result must not change when the ring wraps
+            return self.store.window_frame(city, n).copy()
+
+    def _daily_history(self, city, days, end, start):
+        from timebuckets import daily_history
+
+        db = self.session_factory()
+        try:
+            frame = daily_history(db, city, days=days, end=end)
+        finally:
+            db.close()
+        if frame.empty or frame['date'].iloc[0] > start:
+            return None
+        return frame
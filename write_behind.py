@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from database import get_db
+from models import AlertSent, ChatMessage, RejectedPlan
+from plan_store import json_default
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = os.environ.get('WRITE_BEHIND_JOURNAL', '.write_behind.journal')
+
+
+def _write_accepted_plans(db, payloads):
+    from plan_store import save_accepted_plan
+
+    for payload in payloads:
+        plan = save_accepted_plan(db, payload['city'], payload['plan'], user_id=payload.get('user_id'))
+        plan.timestamp = payload['timestamp']
+
+
+def _write_last_logins(db, payloads):
+    from auth import write_last_logins
+
+    write_last_logins(db, payloads)
+
+
+def _bulk_writer(model):
+    def write(db, payloads):
+        db.execute(insert(model), payloads)
+    return write
+
+
+WRITERS = {
+    'accepted_plan': _write_accepted_plans,
+    'rejected_plan': _bulk_writer(RejectedPlan),
+    'alert_sent': _bulk_writer(AlertSent),
+    'chat_message': _bulk_writer(ChatMessage),
+    'last_login': _write_last_logins,
+}
+
+
+class WriteBehindQueue:
+    """Buffers plan decisions and alert records and inserts them in batches.
+
+    Every record is appended to a local journal before enqueue() returns and the
+    journal is rewritten once the batch commits, so records survive a restart.
+    Delivery is at-least-once: a crash between commit and journal rewrite
+    replays that batch.
+
+    Batches are written max_batch records at a time. If a batch fails for a
+    reason other than a lost connection, each record is retried alone in a
+    savepoint and records that still fail go to the dead-letter journal, so one
+    bad record cannot hold up the rest.
+    """
+
+    def __init__(self, journal_path=DEFAULT_JOURNAL_PATH, max_batch=50, flush_interval=2.0, writers=None):
+        self.journal_path = journal_path
+        self.dead_letter_path = journal_path + '.dead'
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.writers = writers or WRITERS
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._metrics = {
+            'enqueued': 0,
+            'flushed': 0,
+            'batches': 0,
+            'failures': 0,
+            'dead_lettered': 0,
+            'replayed': 0,
+            'last_batch_size': 0,
+            'last_flush_seconds': 0.0,
+            'max_flush_seconds': 0.0,
+            'last_flush_at': None,
+            'last_error': None,
+        }
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._pending.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping corrupt write-behind journal line")
+        self._metrics['replayed'] = len(self._pending)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, flush=True):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 2)
+        if flush:
+            self.flush()
+
+    def enqueue(self, kind, **fields):
+        if kind not in self.writers:
+            raise ValueError(f"Unknown write-behind record type: {kind}")
+        fields.setdefault('timestamp', datetime.utcnow().isoformat())
+        entry = {'kind': kind, 'fields': fields}
+        line = json.dumps(entry, default=json_default)
+        with self._lock:
+            with open(self.journal_path, 'a', encoding='utf-8') as journal:
+                journal.write(line + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+            self._pending.append(entry)
+            self._metrics['enqueued'] += 1
+            pending = len(self._pending)
+        if pending >= self.max_batch:
+            self._wakeup.set()
+
+    def enqueue_accepted_plan(self, city, plan, user_id=None):
+        self.enqueue('accepted_plan', city=city, plan=plan, user_id=user_id)
+
+    def enqueue_rejected_plan(self, city, severity, reason=None, user_id=None):
+        self.enqueue('rejected_plan', city=city, severity=severity, reason=reason, user_id=user_id)
+
+    def enqueue_alert(self, alert_type, city, severity, message, recipients_count=0, delivery_status='simulated'):
+        self.enqueue(
+            'alert_sent',
+            alert_type=alert_type,
+            city=city,
+            severity=severity,
+            message=message,
+            recipients_count=recipients_count,
+            delivery_status=delivery_status
+        )
+
+    def enqueue_chat_message(self, session_id, seq, role, content):
+        self.enqueue('chat_message', session_id=session_id, seq=seq, role=role, content=content)
+
+    def enqueue_last_login(self, user_id):
+        self.enqueue('last_login', user_id=user_id)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    def _rewrite_journal(self):
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as journal:
+            for entry in self._pending:
+                journal.write(json.dumps(entry, default=json_default) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    @staticmethod
+    def _payload(entry):
+        fields = dict(entry['fields'])
+        if isinstance(fields.get('timestamp'), str):
+            fields['timestamp'] = datetime.fromisoformat(fields['timestamp'])
+        return fields
+
+    def _write_batch(self, batch):
+        grouped = {}
+        for entry in batch:
+            grouped.setdefault(entry['kind'], []).append(self._payload(entry))
+        with get_db() as db:
+            for kind, payloads in grouped.items():
+                self.writers[kind](db, payloads)
+
+    def _write_individually(self, batch):
+        """Write each record in its own savepoint; returns [(entry, error)] for the failures"""
+        failed = []
+        with get_db() as db:
+            for entry in batch:
+                try:
+                    with db.begin_nested():
+                        self.writers[entry['kind']](db, [self._payload(entry)])
+                except (OperationalError, InterfaceError):
+                    raise
+                except Exception as e:
+                    failed.append((entry, e))
+        return failed
+
+    def _dead_letter(self, failed):
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as journal:
+            for entry, error in failed:
+                logger.error("Write-behind %s record moved to dead-letter journal: %s", entry['kind'], error)
+                record = dict(entry, error=str(error), failed_at=datetime.utcnow().isoformat())
+                journal.write(json.dumps(record, default=json_default) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def _flush_chunk(self, batch):
+        failed = []
+        start = time.perf_counter()
+        try:
+            self._write_batch(batch)
+        except Exception as e:
+            transient = isinstance(e, (OperationalError, InterfaceError)) or (
+                isinstance(e, DBAPIError) and e.connection_invalidated
+            )
+            if transient:
+                raise
+            logger.warning("Write-behind batch of %d failed (%s); retrying records one by one", len(batch), e)
+            failed = self._write_individually(batch)
+            if failed:
+                self._dead_letter(failed)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            del self._pending[:len(batch)]
+            self._rewrite_journal()
+            self._metrics['flushed'] += len(batch) - len(failed)
+            self._metrics['dead_lettered'] += len(failed)
+            self._metrics['batches'] += 1
+            self._metrics['last_batch_size'] = len(batch)
+            self._metrics['last_flush_seconds'] = elapsed
+            self._metrics['max_flush_seconds'] = max(self._metrics['max_flush_seconds'], elapsed)
+            self._metrics['last_flush_at'] = datetime.utcnow()
+            self._metrics['last_error'] = str(failed[-1][1]) if failed else None
+        return len(batch) - len(failed)
+
+    def flush(self):
+        """Write everything pending in max_batch chunks; returns the number of records written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.max_batch]
+                if not batch:
+                    return written
+                try:
+                    written += self._flush_chunk(batch)
+                except Exception as e:
+                    with self._lock:
+                        self._metrics['failures'] += 1
+                        self._metrics['last_error'] = str(e)
+                    raise
+
+    def metrics(self):
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot['pending'] = len(self._pending)
+        return snapshot